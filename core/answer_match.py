@@ -0,0 +1,258 @@
+"""
+Compiled matching of answer expressions against predictions.
+
+An answer is either a plain term, matched as a substring of the prediction, or
+an expression combining terms with ``&``, ``|`` and parentheses, e.g.
+``(北京|beijing)&上海``. Each distinct expression is parsed once into a tree of
+closures and cached; evaluation short-circuits ``&`` and ``|``.
+
+The parser reproduces the original `checkanswer_acc` evaluator exactly,
+including its handling of malformed expressions: whitespace-only terms match
+everything, an unmatched ``(`` is treated as a literal term, an unmatched
+``)`` is ignored, surplus operands leave the first one as the result, and an
+operator missing an operand raises IndexError when matched.
+
+`AutomatonScorer` evaluates the same expressions over the set of terms found
+in a prediction by one Aho-Corasick pass (``pyahocorasick``) instead of one
+substring scan per term, which pays off on long reasoning outputs.
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Set
+
+try:
+    import ahocorasick
+
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+Matcher = Callable[[str], bool]
+
+OPERATORS = ("&", "|", "(", ")")
+
+NORMALIZERS: Dict[str, Callable[[str], str]] = {
+    "lower": str.lower,
+    "none": lambda text: text,
+    "nfkc_lower": lambda text: unicodedata.normalize("NFKC", text).lower(),
+}
+
+
+def get_normalizer(normalize: str) -> Callable[[str], str]:
+    """Return the text normalization applied to answers and predictions."""
+    if normalize not in NORMALIZERS:
+        raise ValueError(
+            f"Unknown normalize: {normalize}, expected one of {list(NORMALIZERS)}"
+        )
+    return NORMALIZERS[normalize]
+
+
+def tokenize(expr: str) -> List[str]:
+    """Split an expression into operators and stripped terms."""
+    tokens = []
+    current = ""
+    for char in expr:
+        if char in OPERATORS:
+            if current:
+                tokens.append(current.strip())
+                current = ""
+            tokens.append(char)
+        else:
+            current += char
+    if current:
+        tokens.append(current.strip())
+    return tokens
+
+
+def to_postfix(tokens: List[str]) -> List[str]:
+    """Convert tokens to postfix notation, ``&`` binding tighter than ``|``."""
+    precedence = {"&": 2, "|": 1}
+    output = []
+    operators = []
+    for token in tokens:
+        if token in ("&", "|"):
+            while (
+                operators
+                and operators[-1] != "("
+                and precedence[operators[-1]] >= precedence[token]
+            ):
+                output.append(operators.pop())
+            operators.append(token)
+        elif token == "(":
+            operators.append(token)
+        elif token == ")":
+            while operators and operators[-1] != "(":
+                output.append(operators.pop())
+            if operators and operators[-1] == "(":
+                operators.pop()
+        else:
+            output.append(token)
+    while operators:
+        output.append(operators.pop())
+    return output
+
+
+def _missing_operand(prediction: str) -> bool:
+    raise IndexError("pop from empty list")
+
+
+def expression_terms(expr: str) -> List[str]:
+    """Non-empty terms tested by a normalized answer expression."""
+    if not any(op in expr for op in OPERATORS):
+        terms = [expr.strip()]
+    else:
+        terms = [t for t in to_postfix(tokenize(expr)) if t not in ("&", "|")]
+    return [t for t in terms if t]
+
+
+def _and(a: Matcher, b: Matcher) -> Matcher:
+    return lambda arg: a(arg) and b(arg)
+
+
+def _or(a: Matcher, b: Matcher) -> Matcher:
+    return lambda arg: a(arg) or b(arg)
+
+
+def _always(arg) -> bool:
+    return True
+
+
+def _never(arg) -> bool:
+    return False
+
+
+def _build_matcher(expr: str, leaf: Callable[[str], Matcher]) -> Matcher:
+    """
+    Compile an expression into a tree of closures over term tests.
+
+    Args:
+        expr: normalized answer expression
+        leaf: returns the test of a non-empty term
+    """
+    if not any(op in expr for op in OPERATORS):
+        term = expr.strip()
+        return leaf(term) if term else _always
+
+    stack: List[Matcher] = []
+    for token in to_postfix(tokenize(expr)):
+        if token in ("&", "|"):
+            if len(stack) < 2:
+                return _missing_operand
+            b = stack.pop()
+            a = stack.pop()
+            stack.append(_and(a, b) if token == "&" else _or(a, b))
+        else:
+            stack.append(leaf(token) if token else _always)
+    return stack[0] if stack else _never
+
+
+def _substring_test(term: str) -> Matcher:
+    return lambda prediction: term in prediction
+
+
+@lru_cache(maxsize=1 << 16)
+def compile_expression(expr: str) -> Matcher:
+    """
+    Compile a normalized answer expression into a matcher.
+
+    Args:
+        expr: answer expression, already normalized like the predictions
+    Returns:
+        matcher: callable taking a normalized prediction and returning whether it matches
+    """
+    return _build_matcher(expr, _substring_test)
+
+
+class TermAutomaton:
+    """Every answer term in one automaton, found in a single pass over a prediction.
+
+    Without ``pyahocorasick``, a lookahead regex alternation (longest term
+    first) finds the longest term starting at each position; every term that
+    is a prefix of a found term is then marked too, which keeps the result exact.
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        self.term_ids: Dict[str, int] = {}
+        for term in terms:
+            if term and term not in self.term_ids:
+                self.term_ids[term] = len(self.term_ids)
+
+        self._automaton = None
+        self._pattern = None
+        if not self.term_ids:
+            return
+        if AHOCORASICK_AVAILABLE:
+            self._automaton = ahocorasick.Automaton()
+            for term, term_id in self.term_ids.items():
+                self._automaton.add_word(term, term_id)
+            self._automaton.make_automaton()
+        else:
+            by_length = sorted(self.term_ids, key=len, reverse=True)
+            self._pattern = re.compile(
+                "(?=(" + "|".join(map(re.escape, by_length)) + "))"
+            )
+            self._prefix_ids = {
+                term: [
+                    self.term_ids[term[:i]]
+                    for i in range(1, len(term) + 1)
+                    if term[:i] in self.term_ids
+                ]
+                for term in self.term_ids
+            }
+
+    def find(self, text: str) -> Set[int]:
+        """Ids of the terms occurring in `text`."""
+        if self._automaton is not None:
+            return {term_id for _, term_id in self._automaton.iter(text)}
+        found: Set[int] = set()
+        if self._pattern is not None:
+            for match in self._pattern.finditer(text):
+                found.update(self._prefix_ids[match.group(1)])
+        return found
+
+
+class AutomatonScorer:
+    """Scores predictions against a fixed set of answer expressions.
+
+    All terms of all answers go into one `TermAutomaton`; each prediction is
+    scanned once and its answer expression is evaluated over the found terms.
+    Labels are identical to `checkanswer_acc` with the substring engine.
+    """
+
+    def __init__(self, answers: Iterable[str], normalize: str = "lower"):
+        self.normalizer = get_normalizer(normalize)
+        expressions = {answer: self.normalizer(answer) for answer in set(answers)}
+        self.automaton = TermAutomaton(
+            term for expr in expressions.values() for term in expression_terms(expr)
+        )
+        term_ids = self.automaton.term_ids
+
+        def found_test(term: str) -> Matcher:
+            term_id = term_ids[term]
+            return lambda found: term_id in found
+
+        self.matchers: Dict[str, Matcher] = {
+            answer: _build_matcher(expr, found_test)
+            for answer, expr in expressions.items()
+        }
+
+    def match(self, answer: str, prediction: str) -> bool:
+        """Whether `prediction` satisfies `answer`, which must be one of the scorer's answers."""
+        return self.matchers[answer](self.automaton.find(self.normalizer(prediction)))
+
+    def labels(self, predictions: List[str], answers: List[str]) -> List[int]:
+        """1 for each prediction satisfying its answer, 0 otherwise."""
+        find = self.automaton.find
+        normalizer = self.normalizer
+        return [
+            1 if self.matchers[answer](find(normalizer(predict))) else 0
+            for predict, answer in zip(predictions, answers)
+        ]
+
+
+def match_answer(answer: str, prediction: str, normalize: str = "lower") -> bool:
+    """Whether `prediction` satisfies the answer expression `answer`."""
+    normalizer = get_normalizer(normalize)
+    return compile_expression(normalizer(answer))(normalizer(prediction))
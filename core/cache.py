@@ -0,0 +1,205 @@
+"""
+Persistent response cache for model calls.
+
+Re-running an evaluation after a crash, a scoring change or a config tweak
+sends the same prompts again. `ResponseCache` stores each response in an
+SQLite file under the SHA-256 of (model, messages, temperature, top_p,
+backend), so both the API and the vLLM backends can look a prompt up before
+dispatching it. Only deterministic (temperature 0) calls are cached unless
+`all_temperatures` is set, and the least recently used entries are evicted
+once the stored responses exceed `max_bytes`.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .logger import get_logger
+
+logger = get_logger()
+
+CACHE_VERSION = 1
+
+# Eviction removes entries until the cache is this fraction of max_bytes,
+# so that it does not run again on every insert
+EVICTION_TARGET = 0.9
+
+
+def cache_key(
+    model: str, messages: Any, temperature: float, top_p: float, backend: str
+) -> str:
+    """Hex SHA-256 of a model call; `messages` is a chat message list or a prompt string."""
+    payload = json.dumps(
+        [CACHE_VERSION, model, messages, float(temperature), float(top_p), backend],
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Content-addressed model responses in an SQLite file, with LRU eviction by size.
+
+    Thread-safe; one connection is shared by the worker threads of a backend.
+    Several processes (e.g. shards) may use the same file.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: Optional[int] = None,
+        all_temperatures: bool = False,
+    ):
+        """
+        Args:
+            path: SQLite file, created if missing
+            max_bytes: size of the stored keys and responses above which the
+                       least recently used entries are evicted (None: unbounded)
+            all_temperatures: also cache sampled (temperature > 0) calls
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.all_temperatures = all_temperatures
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+            "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)"
+        )
+        self.conn.commit()
+        self.total_bytes = self._stored_bytes()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evicted = 0
+
+    def cacheable(self, temperature: float) -> bool:
+        """Whether calls at `temperature` are looked up and stored."""
+        return self.all_temperatures or temperature == 0
+
+    def _stored_bytes(self) -> int:
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached response for `key`, or None."""
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        """Cached responses for `keys`, None where missing; marks the hits as used."""
+        found: Dict[str, str] = {}
+        with self.lock:
+            # SQLite limits the number of bound parameters per statement
+            for start in range(0, len(keys), 500):
+                chunk = keys[start : start + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, response FROM responses WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE responses SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self.conn.commit()
+            results = [found.get(key) for key in keys]
+            hits = sum(result is not None for result in results)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return results
+
+    def put(self, key: str, response: str):
+        """Store `response` under `key`."""
+        self.put_many([(key, response)])
+
+    def put_many(self, items: Iterable[Tuple[str, str]]):
+        """Store (key, response) pairs, then evict if the cache grew beyond `max_bytes`."""
+        now = time.time()
+        # The last response of a repeated key wins, as with INSERT OR REPLACE
+        rows = list(
+            {
+                key: (key, response, len(key) + len(response.encode("utf-8")), now)
+                for key, response in items
+            }.values()
+        )
+        if not rows:
+            return
+        with self.lock:
+            # Replaced entries no longer count towards the stored size
+            replaced = 0
+            for start in range(0, len(rows), 500):
+                chunk = [row[0] for row in rows[start : start + 500]]
+                replaced += self.conn.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM responses WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchone()[0]
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO responses (key, response, size, last_used) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self.conn.commit()
+            self.stores += len(rows)
+            self.total_bytes += sum(row[2] for row in rows) - replaced
+            if self.max_bytes is not None and self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Other processes may have written or evicted since the last count
+        self.total_bytes = self._stored_bytes()
+        excess = self.total_bytes - int(self.max_bytes * EVICTION_TARGET)
+        if self.total_bytes <= self.max_bytes or excess <= 0:
+            return
+        victims = []
+        freed = 0
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        self.conn.commit()
+        self.total_bytes -= freed
+        self.evicted += len(victims)
+        logger.debug(f"Response cache evicted {len(victims)} entries ({freed} bytes)")
+
+    def stats(self) -> Dict[str, int]:
+        """Hits, misses, stores and evictions of this process, and the entries and bytes stored."""
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evicted": self.evicted,
+                "entries": entries,
+                "bytes": self.total_bytes,
+            }
+
+    def log_stats(self):
+        """Log the hit rate and size of the cache."""
+        stats = self.stats()
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = stats["hits"] / lookups if lookups else 0.0
+        logger.info(
+            f"Response cache: \033[34m{stats['hits']} hits\033[0m, {stats['misses']} misses "
+            f"({hit_rate:.1%}), {stats['entries']} entries, "
+            f"{stats['bytes'] / 2**20:.1f} MiB, {stats['evicted']} evicted"
+        )
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -1,15 +1,31 @@
+import copy
+import hashlib
 import json
+import os
 import random
+import sys
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import asdict, dataclass
-from typing import Dict, List, Literal, Tuple
+from typing import Dict, Iterator, List, Literal, Optional, Tuple, Union
 
+from .docstore import DocStore, PromptDescriptor
 from .logger import get_logger
+from .templates import GoldenDocTemplate
 
 logger = get_logger()
 
+NOISE_LEVELS = ("noise_doc_level1", "noise_doc_level2", "noise_doc_level3")
+
+
+def _intern_docs(docs: List[str]) -> List[str]:
+    return [sys.intern(doc) for doc in docs]
+
 
 @dataclass
 class PlaceholderItem:
+    __slots__ = ("placeholders", "answer")
+
     placeholders: List[Dict[str, str]]
     answer: List[str]
 
@@ -42,6 +58,24 @@ class PlaceholderItem:
 
 @dataclass
 class RagData:
+    """A benchmark sample.
+
+    Instances use ``__slots__`` and doc strings are interned with
+    ``sys.intern``, so docs repeated across samples share one string object.
+    Field access through ``__call__`` returns the stored objects without
+    copying; callers must not mutate them.
+    """
+
+    __slots__ = (
+        "id",
+        "query",
+        "golden_doc",
+        "noise_doc_level1",
+        "noise_doc_level2",
+        "noise_doc_level3",
+        "placeholder_item",
+    )
+
     id: str
     query: str
     golden_doc: List[str]
@@ -62,17 +96,17 @@ class RagData:
             "placeholder_item",
         ],
     ):
-        return asdict(self).get(st)
+        return getattr(self, st, None)
 
     @classmethod
     def from_dict(cls, data: Dict) -> "RagData":
         return cls(
             id=data["id"],
             query=data["query"],
-            golden_doc=data["golden_doc"],
-            noise_doc_level1=data["noise_doc_level1"],
-            noise_doc_level2=data["noise_doc_level2"],
-            noise_doc_level3=data["noise_doc_level3"],
+            golden_doc=_intern_docs(data["golden_doc"]),
+            noise_doc_level1=_intern_docs(data["noise_doc_level1"]),
+            noise_doc_level2=_intern_docs(data["noise_doc_level2"]),
+            noise_doc_level3=_intern_docs(data["noise_doc_level3"]),
             placeholder_item=PlaceholderItem.from_dict(
                 data["placeholder_item"]
             ),
@@ -120,22 +154,213 @@ class RagData:
         return data_list
 
 
+class LazyRagDataset:
+    """Random-access view over a RagData JSONL file.
+
+    A byte-offset index is built once and stored in a sidecar file next to the
+    dataset (``<data_path>.idx``). Records are parsed on access only, so memory
+    and startup time no longer grow with the size of the corpus.
+    """
+
+    INDEX_VERSION = 1
+
+    def __init__(self, file_path: str, index_path: Optional[str] = None):
+        self.file_path = file_path
+        self.index_path = index_path or f"{file_path}.idx"
+        self.ids, self.offsets = self._load_or_build_index()
+        self.idx_hash = {idx: i for i, idx in enumerate(self.ids)}
+        self._file = None
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[RagData, List[RagData]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self._read_record(self.offsets[i])
+
+    def __iter__(self) -> Iterator[RagData]:
+        for offset in self.offsets:
+            yield self._read_record(offset)
+
+    def get(self, idx: str) -> RagData:
+        """Get a record by its sample id."""
+        return self[self.idx_hash[idx]]
+
+    def subset(self, positions: List[int]) -> "LazyRagDataset":
+        """Return a view over the records at `positions`, sharing the same index file."""
+        view = copy.copy(self)
+        view.ids = [self.ids[i] for i in positions]
+        view.offsets = [self.offsets[i] for i in positions]
+        view.idx_hash = {idx: i for i, idx in enumerate(view.ids)}
+        view._file = None
+        return view
+
+    def _read_record(self, offset: int) -> RagData:
+        if self._file is None:
+            self._file = open(self.file_path, "rb")
+        self._file.seek(offset)
+        line = self._file.readline()
+        try:
+            return RagData.from_dict(json.loads(line))
+        except Exception as e:
+            raise ValueError(
+                f"Error parsing record at byte {offset} of {self.file_path}: {type(e)}:{str(e)}"
+            )
+
+    def _source_signature(self) -> Dict[str, int]:
+        stat = os.stat(self.file_path)
+        return {
+            "version": self.INDEX_VERSION,
+            "source_size": stat.st_size,
+            "source_mtime_ns": stat.st_mtime_ns,
+        }
+
+    def _load_or_build_index(self) -> Tuple[List[str], List[int]]:
+        signature = self._source_signature()
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                header = json.loads(f.readline())
+                if header == signature:
+                    ids, offsets = [], []
+                    for line in f:
+                        offset, idx = line.rstrip("\n").split("\t", 1)
+                        offsets.append(int(offset))
+                        ids.append(idx)
+                    logger.info(
+                        f"Loaded offset index of \033[34m{len(offsets)} benchmark items\033[0m from \033[31m{self.index_path}\033[0m"
+                    )
+                    return ids, offsets
+            logger.info(f"Offset index {self.index_path} is stale, rebuilding")
+
+        ids, offsets = [], []
+        with open(self.file_path, "rb") as f:
+            offset = 0
+            for line_num, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        ids.append(json.loads(line)["id"])
+                    except Exception as e:
+                        raise ValueError(
+                            f"Error indexing line {line_num} of {self.file_path}: {type(e)}:{str(e)}"
+                        )
+                    offsets.append(offset)
+                offset += len(line)
+
+        # A unique temp file per writer, so concurrent indexers do not interleave
+        tmp_path = f"{self.index_path}.tmp{os.getpid()}.{uuid.uuid4().hex}"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(json.dumps(signature) + "\n")
+                for idx, offset in zip(ids, offsets):
+                    f.write(f"{offset}\t{idx}\n")
+            os.replace(tmp_path, self.index_path)
+            logger.info(
+                f"Successfully \033[35mindexed {len(offsets)} benchmark items\033[0m to \033[32m{self.index_path}\033[0m"
+            )
+        except OSError as e:
+            logger.warning(f"Could not write offset index {self.index_path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        return ids, offsets
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
 class DataPreprocess:
     def __init__(
         self,
         data_path: str,
         prompt_config_path: str = "config/default_prompt_config.json",
+        lazy: bool = False,
+        use_snapshot: bool = False,
+        rng_mode: Literal["legacy", "per_sample"] = "legacy",
+        layout: Literal["shuffled", "prefix_shared"] = "shuffled",
     ):
-        self.data: List[RagData] = RagData.from_jsonl(data_path)
-        self.idx_hash = {}
-        for i, dt in enumerate(self.data):
-            self.idx_hash[dt.id] = i
-
+        """
+        Args:
+            data_path: path of the benchmark JSONL file
+            prompt_config_path: path of the prompt config
+            lazy: if True, records are read on demand through a byte-offset index
+                  instead of being parsed into memory up front
+            use_snapshot: if True, load through the columnar snapshot cache
+                          (``<data_path>.snapshot``), rebuilding it when stale
+            rng_mode: "legacy" draws placeholders, noise docs and doc order from two
+                      generators shared by all samples, as in published results.
+                      "per_sample" seeds a generator from (random_seed, sample id,
+                      placeholder index), so prompts do not depend on which samples
+                      are generated, in which order, or in which process.
+            layout: "shuffled" mixes golden and noise docs in one random order.
+                    "prefix_shared" picks a sample's noise docs once, puts them
+                    first and the golden docs after, so every placeholder variant
+                    of a sample shares the prompt prefix up to the golden docs.
+        """
+        if rng_mode not in ("legacy", "per_sample"):
+            raise ValueError(f"Unknown rng_mode: {rng_mode}")
+        if layout not in ("shuffled", "prefix_shared"):
+            raise ValueError(f"Unknown layout: {layout}")
+        self.rng_mode = rng_mode
+        self.layout = layout
+        self.data_path = data_path
+        if lazy:
+            self.data: Union[List[RagData], LazyRagDataset] = LazyRagDataset(data_path)
+            self.idx_hash = self.data.idx_hash
+        else:
+            if use_snapshot:
+                from .snapshot import load_with_snapshot
+
+                self.data = load_with_snapshot(data_path)
+            else:
+                self.data = RagData.from_jsonl(data_path)
+            self.idx_hash = {}
+            for i, dt in enumerate(self.data):
+                self.idx_hash[dt.id] = i
+
+        self.doc_store = DocStore()
+        # Rendered golden docs by (sample id, placeholder index), see `enable_golden_doc_cache`
+        self.golden_doc_cache: Optional[Dict[Tuple[str, int], List[str]]] = None
         self.set_prompt_config(prompt_config_path)
 
     def __getitem__(self, i: int):
         return self.data[i]
 
+    def select_shard(self, num_shards: int, shard_index: int) -> None:
+        """Keep only the samples assigned to `shard_index` out of `num_shards`.
+
+        Samples are partitioned by a stable hash of their id, see `core.shards`.
+        """
+        from .shards import shard_of
+
+        if not 0 <= shard_index < num_shards:
+            raise ValueError(
+                f"shard_index must be in [0, {num_shards}), got {shard_index}"
+            )
+        if self.rng_mode != "per_sample":
+            logger.warning(
+                "Sharding with rng_mode='legacy' produces different prompts than a single-node run, use rng_mode='per_sample'"
+            )
+        if isinstance(self.data, LazyRagDataset):
+            ids = self.data.ids
+        else:
+            ids = [dt.id for dt in self.data]
+        positions = [
+            i for i, idx in enumerate(ids) if shard_of(idx, num_shards) == shard_index
+        ]
+        if isinstance(self.data, LazyRagDataset):
+            self.data = self.data.subset(positions)
+            self.idx_hash = self.data.idx_hash
+        else:
+            self.data = [self.data[i] for i in positions]
+            self.idx_hash = {dt.id: i for i, dt in enumerate(self.data)}
+        logger.info(
+            f"Selected shard {shard_index}/{num_shards}: \033[34m{len(positions)} of {len(ids)} benchmark items\033[0m"
+        )
+
     def __call__(self, idx: str):
         return self[self.idx_hash[idx]]
 
@@ -148,6 +373,8 @@ class DataPreprocess:
             "noise_doc_level3": 1,
         },
         shuffle: bool = True,
+        num_workers: int = 1,
+        deferred: bool = False,
     ) -> Tuple[List[str], List[str], List[str], List[str]]:
         """
         Generate input for the model.
@@ -158,6 +385,9 @@ class DataPreprocess:
                            different version of the same query with different variable substitutions.
             noise_config: noise configuration, it contains the number of noisy passages for each noise level
             shuffle: whether to shuffle the data
+            num_workers: number of processes rendering prompts, only used in "per_sample" rng mode
+            deferred: if True, return `PromptDescriptor`s referencing `self.doc_store`
+                      instead of rendered prompts, see `render`
         Returns:
             idxs: list of indices
             queries: list of queries
@@ -168,93 +398,358 @@ class DataPreprocess:
         prompts_final = []
         answers_final = []
         idxs_final = []
-        for sample in self.data:
-            idx = sample.id
-            query = sample.query
-            # Get total number of available placeholders
-            total_placeholders = len(sample.placeholder_item.placeholders)
-            # Check if num_iterations is valid
-            if num_iterations > total_placeholders:
-                # breakpoint()
-                # raise ValueError(
-                #     "`num_iterations` should be no more than the number of placeholders: "
-                #     f"{total_placeholders}"
-                # )
-                # num_iterations = total_placeholders
-                selected_indices = self.selection_rng.sample(
-                    range(total_placeholders), total_placeholders
-                )
-            # Randomly select iteration indices using selection_rng
-            else:
-                selected_indices = self.selection_rng.sample(
-                    range(total_placeholders), num_iterations
-                )
-
-            for cur_iter_idx in selected_indices:
-                answers, golden_docs_ready = self.generate_golden_docs(
-                    sample, cur_iter_idx
+        if num_workers > 1 and self.rng_mode == "per_sample" and not deferred:
+            records = self._iter_input_parallel(
+                num_iterations, noise_config, shuffle, num_workers
+            )
+        else:
+            if num_workers > 1 and deferred:
+                logger.warning(
+                    "Deferred prompts share one doc store, falling back to a single process"
                 )
-                noise_docs_ready = self.generate_noise_docs(
-                    sample, noise_config
+            elif num_workers > 1:
+                logger.warning(
+                    "Parallel prompt generation needs rng_mode='per_sample', falling back to a single process"
                 )
-                docs_ready = golden_docs_ready + noise_docs_ready
-                if shuffle:
-                    self.shuffle_rng.shuffle(docs_ready)
-                prompt = self.generate_prompt_cn(query, docs_ready)
-                prompts_final.append(prompt)
-                answers_final.append(answers)
-                queries_final.append(query)
-                idxs_final.append(idx)
+            records = self.iter_input(
+                num_iterations, noise_config, shuffle, deferred=deferred
+            )
+        for idx, query, prompt, answers in records:
+            prompts_final.append(prompt)
+            answers_final.append(answers)
+            queries_final.append(query)
+            idxs_final.append(idx)
 
         return idxs_final, queries_final, prompts_final, answers_final
 
+    def iter_input(
+        self,
+        num_iterations: int,
+        noise_config: Dict[str, int] = {
+            "noise_doc_level1": 1,
+            "noise_doc_level2": 1,
+            "noise_doc_level3": 1,
+        },
+        shuffle: bool = True,
+        deferred: bool = False,
+    ) -> Iterator[Tuple[str, str, List[Dict[str, str]], str]]:
+        """
+        Lazily generate input for the model, one record at a time.
+
+        Takes the same arguments as `generate_input` and consumes the random
+        generators in the same order, so the records are identical; prompts are
+        only rendered when the consumer asks for the next one.
+        Yields:
+            (idx, query, prompt, answer), with a `PromptDescriptor` as prompt if deferred
+        """
+        iter_sample = self.iter_sample_descriptors if deferred else self.iter_sample_input
+        for sample in self.data:
+            yield from iter_sample(sample, num_iterations, noise_config, shuffle)
+
+    def iter_sample_input(
+        self,
+        sample: RagData,
+        num_iterations: int,
+        noise_config: Dict[str, int],
+        shuffle: bool = True,
+    ) -> Iterator[Tuple[str, str, List[Dict[str, str]], str]]:
+        """Generate the input records of a single sample, see `iter_input`."""
+        for cur_iter_idx, answers, docs_ready in self.iter_sample_docs(
+            sample, num_iterations, noise_config, shuffle
+        ):
+            prompt = self.generate_prompt_cn(sample.query, docs_ready)
+            yield sample.id, sample.query, prompt, answers
+
+    def iter_sample_descriptors(
+        self,
+        sample: RagData,
+        num_iterations: int,
+        noise_config: Dict[str, int],
+        shuffle: bool = True,
+    ) -> Iterator[Tuple[str, str, PromptDescriptor, str]]:
+        """Like `iter_sample_input`, with docs added to `self.doc_store` and prompts left unrendered."""
+        for cur_iter_idx, answers, docs_ready in self.iter_sample_docs(
+            sample, num_iterations, noise_config, shuffle
+        ):
+            descriptor = PromptDescriptor(
+                sample_id=sample.id,
+                placeholder_index=cur_iter_idx,
+                query=sample.query,
+                doc_ids=tuple(self.doc_store.add(doc) for doc in docs_ready),
+            )
+            yield sample.id, sample.query, descriptor, answers
+
+    def iter_sample_docs(
+        self,
+        sample: RagData,
+        num_iterations: int,
+        noise_config: Dict[str, int],
+        shuffle: bool = True,
+    ) -> Iterator[Tuple[int, str, List[str]]]:
+        """
+        Select the placeholders, noise docs and doc order of a single sample.
+        Yields:
+            (placeholder index, answer, docs in prompt order)
+        """
+        idx = sample.id
+        if self.rng_mode == "per_sample":
+            selection_rng = self.sample_rng(idx, "placeholders")
+        else:
+            selection_rng = self.selection_rng
+        # Get total number of available placeholders
+        total_placeholders = len(sample.placeholder_item.placeholders)
+        # Check if num_iterations is valid
+        if num_iterations > total_placeholders:
+            # breakpoint()
+            # raise ValueError(
+            #     "`num_iterations` should be no more than the number of placeholders: "
+            #     f"{total_placeholders}"
+            # )
+            # num_iterations = total_placeholders
+            selected_indices = selection_rng.sample(
+                range(total_placeholders), total_placeholders
+            )
+        # Randomly select iteration indices using selection_rng
+        else:
+            selected_indices = selection_rng.sample(
+                range(total_placeholders), num_iterations
+            )
+
+        if self.golden_doc_cache is not None and all(
+            (idx, i) in self.golden_doc_cache for i in selected_indices
+        ):
+            template = None
+        else:
+            template = self.compile_golden_docs(sample)
+        if self.layout == "prefix_shared":
+            yield from self._iter_prefix_shared_docs(
+                sample, selected_indices, template, noise_config, shuffle
+            )
+            return
+        for cur_iter_idx in selected_indices:
+            if self.rng_mode == "per_sample":
+                noise_rng = shuffle_rng = self.sample_rng(idx, cur_iter_idx)
+            else:
+                noise_rng, shuffle_rng = self.selection_rng, self.shuffle_rng
+            answers, golden_docs_ready = self.generate_golden_docs(
+                sample, cur_iter_idx, template
+            )
+            noise_docs_ready = self.generate_noise_docs(
+                sample, noise_config, noise_rng
+            )
+            docs_ready = golden_docs_ready + noise_docs_ready
+            if shuffle:
+                shuffle_rng.shuffle(docs_ready)
+            yield cur_iter_idx, answers, docs_ready
+
+    def _iter_prefix_shared_docs(
+        self,
+        sample: RagData,
+        selected_indices: List[int],
+        template: GoldenDocTemplate,
+        noise_config: Dict[str, int],
+        shuffle: bool,
+    ) -> Iterator[Tuple[int, str, List[str]]]:
+        """Docs of the "prefix_shared" layout: shared noise docs first, golden docs last."""
+        if self.rng_mode == "per_sample":
+            noise_rng = self.sample_rng(sample.id, "noise")
+        else:
+            noise_rng = self.selection_rng
+        noise_docs_ready = self.generate_noise_docs(sample, noise_config, noise_rng)
+        if shuffle:
+            noise_rng.shuffle(noise_docs_ready)
+        for cur_iter_idx in selected_indices:
+            answers, golden_docs_ready = self.generate_golden_docs(
+                sample, cur_iter_idx, template
+            )
+            if shuffle:
+                if self.rng_mode == "per_sample":
+                    shuffle_rng = self.sample_rng(sample.id, cur_iter_idx)
+                else:
+                    shuffle_rng = self.shuffle_rng
+                shuffle_rng.shuffle(golden_docs_ready)
+            yield cur_iter_idx, answers, noise_docs_ready + golden_docs_ready
+
+    def _iter_input_parallel(
+        self,
+        num_iterations: int,
+        noise_config: Dict[str, int],
+        shuffle: bool,
+        num_workers: int,
+    ) -> Iterator[Tuple[str, str, List[Dict[str, str]], str]]:
+        # Workers receive the preprocessor once through the pool initializer
+        # (inherited without pickling under fork) and render contiguous index
+        # ranges, so only the rendered records cross process boundaries.
+        num_samples = len(self.data)
+        chunk_size = max(16, min(1024, num_samples // (num_workers * 4) or 1))
+        with ProcessPoolExecutor(
+            max_workers=num_workers,
+            initializer=_init_input_worker,
+            initargs=(self, num_iterations, noise_config, shuffle),
+        ) as executor:
+            for records in executor.map(
+                _generate_input_range,
+                range(0, num_samples, chunk_size),
+                [chunk_size] * ((num_samples + chunk_size - 1) // chunk_size),
+            ):
+                yield from records
+
+    def sample_rng(self, sample_id: str, iteration) -> random.Random:
+        """Deterministic generator for one (sample id, iteration) pair in "per_sample" rng mode."""
+        seed = self.random_seed if self.random_seed is not None else 0
+        digest = hashlib.sha256(f"{seed}:{sample_id}:{iteration}".encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
     def set_prompt_config(self, prompt_config_path: str):
+        self.prompt_config_path = prompt_config_path
         with open(prompt_config_path, "r", encoding="utf-8") as f:
             config = json.load(f)
             self.prompt_config = config
-            # Initialize random number generators with seed from config
-            random_seed = config.get("random_seed")
-            self.selection_rng = random.Random(random_seed)
-            self.shuffle_rng = random.Random(random_seed)
+            self.random_seed = config.get("random_seed")
+            self.reset_rngs()
+
+    def reset_rngs(self) -> None:
+        """Reseed the random number generators from the prompt config's seed.
+
+        Generating input after a reset gives the same prompts as a freshly
+        constructed DataPreprocess.
+        """
+        self.selection_rng = random.Random(self.random_seed)
+        self.shuffle_rng = random.Random(self.random_seed)
+
+    def enable_golden_doc_cache(self) -> None:
+        """Render each (sample, placeholder) golden doc variant only once.
+
+        Useful when generating input several times, e.g. for a noise config sweep.
+        """
+        if self.golden_doc_cache is None:
+            self.golden_doc_cache = {}
+
+    def compile_golden_docs(self, sample: RagData) -> GoldenDocTemplate:
+        """Precompile the golden docs of a sample for placeholder substitution."""
+        return GoldenDocTemplate(
+            sample.golden_doc, sample.placeholder_item.placeholders
+        )
 
     def generate_golden_docs(
-        self, sample: RagData, cur_iter_idx: int
+        self,
+        sample: RagData,
+        cur_iter_idx: int,
+        template: Optional[GoldenDocTemplate] = None,
     ) -> Tuple[str, List[str]]:
         """
         Generate golden docs for the sample by replacing the placeholder.
         Args:
             sample: RagData, sample
             cur_iter_idx: int, current iteration index
+            template: precompiled golden docs of the sample, compiled on the fly if None
         Returns:
             answer: str, answer of the current iteration
             golden_docs_ready: List[str], golden docs of the current iteration
         """
-        golden_docs_ready = []
-
-        for gold_doc in sample.golden_doc:
-            gold_doc_res = gold_doc
-            for k, v in sample.placeholder_item.placeholders[
-                cur_iter_idx
-            ].items():
-                gold_doc_res = gold_doc_res.replace(k, v)
-            golden_docs_ready.append(gold_doc_res)
+        if self.golden_doc_cache is not None:
+            golden_docs_ready = self.golden_doc_cache.get((sample.id, cur_iter_idx))
+            if golden_docs_ready is not None:
+                # Callers may shuffle the list in place
+                return sample.placeholder_item.answer[cur_iter_idx], list(golden_docs_ready)
+        if template is None:
+            template = self.compile_golden_docs(sample)
+        golden_docs_ready = template.render(
+            sample.placeholder_item.placeholders[cur_iter_idx]
+        )
+        if self.golden_doc_cache is not None:
+            self.golden_doc_cache[(sample.id, cur_iter_idx)] = list(golden_docs_ready)
         return sample.placeholder_item.answer[cur_iter_idx], golden_docs_ready
 
     def generate_noise_docs(
-        self, sample: RagData, noise_config: Dict[str, int]
+        self,
+        sample: RagData,
+        noise_config: Dict[str, int],
+        rng: Optional[random.Random] = None,
     ) -> List[str]:
         """
         Generate noise docs for the sample.
+        Args:
+            sample: RagData, sample
+            noise_config: number of noisy passages for each noise level
+            rng: generator used to pick the noise docs, defaults to selection_rng
         """
+        if rng is None:
+            rng = self.selection_rng
         noise_docs_ready = []
         for k, v in noise_config.items():
             noise_docs = sample(k)
             max_nums = min(len(noise_docs), v)
             noise_docs_ready.extend(
-                self.selection_rng.sample(noise_docs, max_nums)
+                rng.sample(noise_docs, max_nums)
             )
         return noise_docs_ready
 
+    def render(self, descriptor: PromptDescriptor) -> List[Dict[str, str]]:
+        """Render a prompt returned by `generate_input(..., deferred=True)`."""
+        return self.generate_prompt_cn(
+            descriptor.query, [self.doc_store[i] for i in descriptor.doc_ids]
+        )
+
+    def compact_descriptor(self, descriptor: PromptDescriptor) -> Dict:
+        """
+        Describe a deferred prompt by indices into its sample, independent of the doc store.
+
+        Returns:
+            {"sample_id", "placeholder_index", "noise_doc_indices", "permutation"}:
+            the chosen docs of each noise level, and the prompt order as indices
+            into the golden docs followed by the chosen noise docs
+        """
+        sample = self(descriptor.sample_id)
+        _, golden_docs = self.generate_golden_docs(sample, descriptor.placeholder_index)
+        golden_positions: Dict[str, List[int]] = {}
+        for i, doc in enumerate(golden_docs):
+            golden_positions.setdefault(doc, []).append(i)
+        noise_refs: Dict[str, Tuple[str, int]] = {}
+        for level in NOISE_LEVELS:
+            for j, doc in enumerate(sample(level) or []):
+                noise_refs.setdefault(doc, (level, j))
+
+        refs = []
+        noise_doc_indices: Dict[str, List[int]] = {level: [] for level in NOISE_LEVELS}
+        for doc_id in descriptor.doc_ids:
+            doc = self.doc_store[doc_id]
+            positions = golden_positions.get(doc)
+            if positions:
+                refs.append((None, positions.pop(0)))
+            elif doc in noise_refs:
+                level, j = noise_refs[doc]
+                refs.append((level, len(noise_doc_indices[level])))
+                noise_doc_indices[level].append(j)
+            else:
+                raise ValueError(
+                    f"Doc {doc_id} of sample {descriptor.sample_id} is neither a golden nor a noise doc"
+                )
+
+        # Noise docs follow the golden docs, level by level
+        offsets, offset = {}, len(golden_docs)
+        for level in NOISE_LEVELS:
+            offsets[level] = offset
+            offset += len(noise_doc_indices[level])
+        return {
+            "sample_id": descriptor.sample_id,
+            "placeholder_index": descriptor.placeholder_index,
+            "noise_doc_indices": {k: v for k, v in noise_doc_indices.items() if v},
+            "permutation": [i if level is None else offsets[level] + i for level, i in refs],
+        }
+
+    def render_compact(self, descriptor: Dict) -> List[Dict[str, str]]:
+        """Render a prompt described by `compact_descriptor`."""
+        sample = self(descriptor["sample_id"])
+        _, docs = self.generate_golden_docs(sample, descriptor["placeholder_index"])
+        noise_doc_indices = descriptor["noise_doc_indices"]
+        for level in NOISE_LEVELS:
+            noise_docs = sample(level)
+            docs.extend(noise_docs[j] for j in noise_doc_indices.get(level, []))
+        return self.generate_prompt_cn(
+            sample.query, [docs[i] for i in descriptor["permutation"]]
+        )
+
     def generate_prompt_cn(
         self, query: str, docs: List[str]
     ) -> List[Dict[str, str]]:
@@ -276,9 +771,32 @@ class DataPreprocess:
         ]
 
 
+_input_worker_state = None
+
+
+def _init_input_worker(preprocess, num_iterations, noise_config, shuffle):
+    global _input_worker_state
+    if isinstance(preprocess.data, LazyRagDataset):
+        # Do not share the parent's file position with other workers.
+        preprocess.data._file = None
+    _input_worker_state = (preprocess, num_iterations, noise_config, shuffle)
+
+
+def _generate_input_range(start: int, size: int):
+    preprocess, num_iterations, noise_config, shuffle = _input_worker_state
+    records = []
+    for sample in preprocess.data[start : start + size]:
+        records.extend(
+            preprocess.iter_sample_input(
+                sample, num_iterations, noise_config, shuffle
+            )
+        )
+    return records
+
+
 class CustomDataPreprocess(DataPreprocess):
-    def __init__(self, data_path, prompt_config_path):
-        super().__init__(data_path, prompt_config_path)
+    def __init__(self, data_path, prompt_config_path, **kwargs):
+        super().__init__(data_path, prompt_config_path, **kwargs)
 
 
 # 使用示例
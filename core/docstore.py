@@ -0,0 +1,53 @@
+"""
+Dataset-wide doc store and deferred prompts.
+
+Every rendered prompt embeds full copies of its golden and noise docs, and the
+same noise docs reappear in each placeholder variant of a sample. `DocStore`
+keeps each distinct doc text once under an integer id, and a
+`PromptDescriptor` records which docs a prompt uses in which order, so the
+prompt text itself is only rendered when it is sent or saved.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+
+class DocStore:
+    """Doc texts deduplicated by content, addressed by integer ids."""
+
+    __slots__ = ("_docs", "_ids")
+
+    def __init__(self):
+        self._docs: List[str] = []
+        self._ids: Dict[str, int] = {}
+
+    def add(self, text: str) -> int:
+        """Return the id of `text`, storing it if it is new."""
+        doc_id = self._ids.get(text)
+        if doc_id is None:
+            doc_id = len(self._docs)
+            self._docs.append(text)
+            self._ids[text] = doc_id
+        return doc_id
+
+    def __getitem__(self, doc_id: int) -> str:
+        return self._docs[doc_id]
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def total_chars(self) -> int:
+        """Number of characters held by the store."""
+        return sum(len(doc) for doc in self._docs)
+
+
+@dataclass
+class PromptDescriptor:
+    """A prompt kept as references into a `DocStore` instead of text."""
+
+    __slots__ = ("sample_id", "placeholder_index", "query", "doc_ids")
+
+    sample_id: str
+    placeholder_index: int
+    query: str
+    doc_ids: Tuple[int, ...]
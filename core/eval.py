@@ -1,163 +1,327 @@
 import argparse
+import itertools
 import json
-from typing import List, Tuple
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
 
+from tqdm import tqdm
+
+from .answer_match import AutomatonScorer, compile_expression, get_normalizer
 from .data import DataPreprocess
-from .eval_types import EvalResult, EvalResults
+from .eval_types import EvalResult, EvalResults, ScoreAggregator
 from .logger import get_logger
+from .result_format import compact_header
+from .shards import shard_suffix
 
 logger = get_logger()
 
+THINK_PATTERN = re.compile(r"<think>.*</think>", flags=re.DOTALL)
+
+# Below this many rows, process start-up and pickling cost more than scoring
+PARALLEL_SCORING_MIN_ROWS = 20000
+
 
 def checkanswer_acc(
-    predictions: List[str], answers: List[str], is_infer_model: bool = False
+    predictions: List[str],
+    answers: List[str],
+    is_infer_model: bool = False,
+    normalize: str = "lower",
+    engine: str = "substring",
+    num_workers: int = 1,
 ) -> Tuple[List[int], List[int]]:
-    if is_infer_model:
-        import re
-        predictions = [re.sub(r"<think>.*</think>", "", answer, flags=re.DOTALL).strip() for answer in predictions]
-
-    labels = []
-
-    def evaluate_expression(expr: str, prediction: str) -> bool:
-        # If the expression doesn't contain any logical operators, do direct text matching
-        if not any(op in expr for op in ["&", "|", "(", ")"]):
-            return expr.strip() in prediction
-
-        # Tokenize the expression
-        tokens = []
-        current = ""
-        for char in expr:
-            if char in ["&", "|", "(", ")"]:
-                if current:
-                    tokens.append(current.strip())
-                    current = ""
-                tokens.append(char)
-            else:
-                current += char
-        if current:
-            tokens.append(current.strip())
-
-        # Convert to postfix notation (Reverse Polish Notation)
-        def precedence(op):
-            if op == "&":
-                return 2
-            if op == "|":
-                return 1
-            return 0
-
-        output = []
-        operators = []
-
-        for token in tokens:
-            if token in ["&", "|"]:
-                while (
-                    operators
-                    and operators[-1] != "("
-                    and precedence(operators[-1]) >= precedence(token)
-                ):
-                    output.append(operators.pop())
-                operators.append(token)
-            elif token == "(":
-                operators.append(token)
-            elif token == ")":
-                while operators and operators[-1] != "(":
-                    output.append(operators.pop())
-                if operators and operators[-1] == "(":
-                    operators.pop()
-            else:
-                output.append(token)
-
-        while operators:
-            output.append(operators.pop())
-
-        # Evaluate the postfix expression
-        stack = []
-        for token in output:
-            if token in ["&", "|"]:
-                b = stack.pop()
-                a = stack.pop()
-                if token == "&":
-                    stack.append(a and b)
-                else:  # token == '|'
-                    stack.append(a or b)
-            else:
-                # Check if the term exists in prediction
-                stack.append(token in prediction)
+    """
+    Score predictions against answer expressions, see `core.answer_match`.
 
-        return stack[0] if stack else False
+    Args:
+        predictions: model outputs
+        answers: answer expressions, one per prediction
+        is_infer_model: strip ``<think>...</think>`` blocks from predictions first
+        normalize: normalization applied to answers and predictions, a key of
+                   `NORMALIZERS`
+        engine: "substring" scans each prediction once per term; "automaton"
+                finds all terms in one Aho-Corasick pass, faster on long outputs.
+                Both give the same labels.
+        num_workers: number of processes scoring chunks of rows; inputs with
+                     fewer than PARALLEL_SCORING_MIN_ROWS rows are scored serially
+    Returns:
+        errors: indices of incorrect predictions
+        labels: 1 for a correct prediction, 0 otherwise
+    """
+    num_rows = min(len(predictions), len(answers))
+    if num_workers > 1 and num_rows >= PARALLEL_SCORING_MIN_ROWS:
+        chunk_size = max(1000, -(-num_rows // (num_workers * 4)))
+        chunks = [
+            (predictions[i : i + chunk_size], answers[i : i + chunk_size])
+            for i in range(0, num_rows, chunk_size)
+        ]
+        labels = []
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            for _, chunk_labels in executor.map(
+                _score_chunk,
+                chunks,
+                [is_infer_model] * len(chunks),
+                [normalize] * len(chunks),
+                [engine] * len(chunks),
+            ):
+                labels.extend(chunk_labels)
+        errors = [i for i, label in enumerate(labels) if not label]
+        return errors, labels
 
-    errors = []
-    for i, (predict, answer) in enumerate(zip(predictions, answers)):
-        label = 1
+    if is_infer_model:
+        predictions = [THINK_PATTERN.sub("", answer).strip() for answer in predictions]
 
-        if not evaluate_expression(answer.lower(), predict.lower()):
-            label = 0
-            errors.append(i)
-        labels.append(label)
+    if engine == "automaton":
+        labels = AutomatonScorer(answers, normalize).labels(predictions, answers)
+    elif engine == "substring":
+        normalizer = get_normalizer(normalize)
+        # Normalize and compile each distinct answer once
+        matchers = {
+            answer: compile_expression(normalizer(answer)) for answer in set(answers)
+        }
+        labels = [
+            1 if matchers[answer](normalizer(predict)) else 0
+            for predict, answer in zip(predictions, answers)
+        ]
+    else:
+        raise ValueError(f"Unknown scoring engine: {engine}")
+    errors = [i for i, label in enumerate(labels) if not label]
     return errors, labels
 
 
-def get_eval(args):
-    model_name = args.model_name
-    model_path = args.model_path
-    output_path = args.output_path
-    noise_config = json.loads(args.noise_config)
-    shuffle = args.shuffle
-    batch_size = args.batch_size
-    temperature = args.temperature
+def _score_chunk(chunk, is_infer_model, normalize, engine):
+    predictions, answers = chunk
+    return checkanswer_acc(
+        predictions, answers, is_infer_model=is_infer_model, normalize=normalize, engine=engine
+    )
+
+
+class LiveScores:
+    """Labels predictions as they complete and keeps running scores.
+
+    Each prediction is matched on its own with the substring engine, which is
+    the cheapest per row and gives the same labels as the automaton; labels are
+    kept by position so `final_labels` can reuse them. Thread-safe, so API
+    worker threads can report results directly. A log line with the running
+    scores is written every `log_interval` seconds.
+    """
+
+    def __init__(self, args, log_interval: float = 60.0):
+        self.aggregator = ScoreAggregator()
+        self.is_infer_model = args.inference_mode
+        self.normalize = getattr(args, "answer_normalize", "lower")
+        self.log_interval = log_interval
+        self.last_log = time.time()
+        self.lock = threading.Lock()
+        # position -> label of the predictions added with a position
+        self.labels: Dict[int, int] = {}
+
+    def add(self, idx: str, prediction: str, answer: str, position: Optional[int] = None) -> int:
+        """Label one prediction, update the running scores and return the label."""
+        _, labels = checkanswer_acc(
+            [prediction],
+            [answer],
+            is_infer_model=self.is_infer_model,
+            normalize=self.normalize,
+        )
+        with self.lock:
+            if position is not None:
+                self.labels[position] = labels[0]
+            self.aggregator.add(idx, labels[0])
+            now = time.time()
+            if self.log_interval > 0 and now - self.last_log >= self.log_interval:
+                self.last_log = now
+                logger.info(f"Running scores: {self.aggregator.summary()}")
+        return labels[0]
+
+    def summary(self) -> str:
+        with self.lock:
+            return self.aggregator.summary()
+
+
+def final_labels(args, live_scores: LiveScores, predictions: List[str], answers: List[str]) -> List[int]:
+    """
+    Labels of all predictions with the configured scoring engine and workers.
+
+    The live labels are reused when they are what a serial substring pass
+    would compute anyway; otherwise all rows are labelled in one batched
+    `checkanswer_acc` call, so `--scoring-engine automaton` and
+    `--score-workers` apply to the final labels.
+    """
+    engine = getattr(args, "scoring_engine", "substring")
+    num_workers = getattr(args, "score_workers", 1)
+    labels = [live_scores.labels.get(i) for i in range(len(predictions))]
+    if engine == "substring" and num_workers <= 1 and None not in labels:
+        return labels
+    _, labels = checkanswer_acc(
+        predictions,
+        answers,
+        is_infer_model=args.inference_mode,
+        normalize=getattr(args, "answer_normalize", "lower"),
+        engine=engine,
+        num_workers=num_workers,
+    )
+    return labels
+
+
+def load_dataset(args) -> DataPreprocess:
+    """Build the DataPreprocess for `args.data_path` with the matching prompt config."""
+    dataset_kwargs = {
+        "lazy": getattr(args, "lazy_load", False),
+        "use_snapshot": getattr(args, "snapshot_cache", False),
+        "rng_mode": getattr(args, "rng_mode", "legacy"),
+        "layout": getattr(args, "prompt_layout", "shuffled"),
+    }
 
     if args.custom_config:
             ragdata = DataPreprocess(
-                args.data_path, args.custom_config
+                args.data_path, args.custom_config, **dataset_kwargs
             )
     else:
         if "zh" in args.data_path:
             ragdata = DataPreprocess(
-                args.data_path, "config/api_prompt_config_ch.json"
+                args.data_path, "config/api_prompt_config_ch.json", **dataset_kwargs
             )
         elif "en" in args.data_path:
             ragdata = DataPreprocess(
-                args.data_path, "config/api_prompt_config_en.json"
+                args.data_path, "config/api_prompt_config_en.json", **dataset_kwargs
             )
 
     # 采样
     # ragdata.data = ragdata.data[:1]
-    if "http" in model_path:
+    return ragdata
+
+
+def http_timeouts(args) -> Dict[str, float]:
+    """Connect and read timeouts of the HTTP API backends."""
+    return {
+        "connect_timeout": getattr(args, "connect_timeout", 10.0),
+        "read_timeout": getattr(args, "read_timeout", 600.0),
+    }
+
+
+def request_limiter(args):
+    """Model-wide request limits from `args`, or None to limit each batch to `args.batch_size` QPS."""
+    max_concurrency = getattr(args, "max_concurrency", None)
+    requests_per_second = getattr(args, "requests_per_second", None) or args.batch_size
+    tokens_per_minute = getattr(args, "tokens_per_minute", None)
+    if getattr(args, "adaptive_rate", False):
+        from .models.rate_control import AIMDController
+
+        max_concurrency = max_concurrency or 256
+        return AIMDController(
+            initial_concurrency=min(10, max_concurrency),
+            initial_rate=requests_per_second,
+            max_concurrency=max_concurrency,
+            tokens_per_minute=tokens_per_minute,
+        )
+    if tokens_per_minute or getattr(args, "requests_per_second", None) or (
+        max_concurrency and getattr(args, "api_backend", "threads") == "threads"
+    ):
+        from .models.rate_control import RequestLimiter
+
+        return RequestLimiter(max_concurrency, requests_per_second, tokens_per_minute)
+    return None
+
+
+def response_cache(args):
+    """On-disk response cache at `args.cache_path`, or None when caching is off."""
+    cache_path = getattr(args, "cache_path", None)
+    if not cache_path:
+        return None
+    from .cache import ResponseCache
+
+    max_size_mb = getattr(args, "cache_max_size_mb", 1024)
+    return ResponseCache(
+        cache_path,
+        max_bytes=int(max_size_mb * 2**20) if max_size_mb else None,
+        all_temperatures=getattr(args, "cache_all_temperatures", False),
+    )
+
+
+def load_model(args):
+    """Build the API or vLLM backend selected by `args.model_path`."""
+    model_name = args.model_name
+    model_path = args.model_path
+    if "http" in model_path and getattr(args, "api_backend", "threads") == "async":
+        from .models.async_api_models import ASYNC_OPENAI_AVAILABLE
+        api_kwargs = {
+            "url": model_path,
+            "model": model_name,
+            "api_key": args.api_key,
+            "inference_mode": args.inference_mode,
+            "max_concurrency": getattr(args, "max_concurrency", None) or 256,
+        }
+        if ASYNC_OPENAI_AVAILABLE:
+            from .models import AsyncOpenAIModel
+            model = AsyncOpenAIModel(**api_kwargs, **http_timeouts(args))
+        else:
+            from .models import AsyncAPIModel
+            model = AsyncAPIModel(**api_kwargs, **http_timeouts(args))
+    elif "http" in model_path:
         import importlib.util
         if importlib.util.find_spec("openai") is None:
             from .models import APIModel
-            model = APIModel(url=model_path, model=model_name, api_key=args.api_key, inference_mode=args.inference_mode)
+            model = APIModel(url=model_path, model=model_name, api_key=args.api_key, inference_mode=args.inference_mode, **http_timeouts(args))
         else:
             from .models import OpenAIModel
             model = OpenAIModel(url=model_path, model=model_name, api_key=args.api_key, inference_mode=args.inference_mode)
 
     else:
+        batching_kwargs = {
+            "bucket_by_length": not getattr(args, "no_length_bucketing", False),
+            "group_by_prefix": getattr(args, "prompt_layout", "shuffled") == "prefix_shared",
+        }
         if not args.inference_mode:
             if "qwen3" in model_name.lower():
                 from .models import Qwen3Vllm
-                model = Qwen3Vllm(plm=model_path, think_mode=False)
+                model = Qwen3Vllm(plm=model_path, think_mode=False, **batching_kwargs)
             else:
                 from .models import CommonModelVllm
-                model = CommonModelVllm(plm=model_path)
+                model = CommonModelVllm(plm=model_path, **batching_kwargs)
         else:
             from .models import InferModelVllm
-            model = InferModelVllm(plm=model_path)
+            model = InferModelVllm(plm=model_path, **batching_kwargs)
+
+    if "http" in model_path:
+        model.rate_controller = request_limiter(args)
+    model.response_cache = response_cache(args)
+    return model
+
+
+def run_batch_eval(args, ragdata, model, noise_config) -> EvalResults:
+    """Render every prompt, generate all predictions, then score them.
 
+    With `args.deferred_prompts`, results keep `PromptDescriptor`s and prompt
+    text only exists for the duration of `batch_generate`.
+    """
+    deferred = getattr(args, "deferred_prompts", False)
     prompts = []
     answers = []
     queries = []
     idxs = []
     idx, query, prompt, answer = ragdata.generate_input(
-        args.num_iterations, shuffle=shuffle, noise_config=noise_config
+        args.num_iterations,
+        shuffle=args.shuffle,
+        noise_config=noise_config,
+        num_workers=getattr(args, "num_workers", 1),
+        deferred=deferred,
     )
     prompts.extend(prompt)
     answers.extend(answer)
     queries.extend(query)
     idxs.extend(idx)
+    live_scores = LiveScores(args, getattr(args, "score_log_interval", 60.0))
     predictions = model.batch_generate(
-        prompts, temperature, batch_size=batch_size
+        [ragdata.render(p) for p in prompts] if deferred else prompts,
+        args.temperature,
+        batch_size=args.batch_size,
+        on_result=lambda i, prediction: live_scores.add(idxs[i], prediction, answers[i], i),
     )
-    error, labels = checkanswer_acc(predictions, answers, is_infer_model=args.inference_mode)
+    labels = final_labels(args, live_scores, predictions, answers)
 
     eval_results = EvalResults()
     for i in range(len(idxs)):
@@ -170,18 +334,253 @@ def get_eval(args):
             label=labels[i],
         )
         eval_results.add_result(result)
+    return eval_results
 
+
+def run_streaming_eval(args, ragdata, model, noise_config) -> EvalResults:
+    """Stream prompts into the model and score each prediction as it returns.
+
+    Prompts are rendered lazily by `DataPreprocess.iter_input` and consumed by
+    the backend's `stream_generate` through bounded queues. Results are put back
+    in generation order, so the saved file matches `run_batch_eval`. With
+    `args.deferred_prompts`, each prompt is rendered just before it is queued.
+    """
+    deferred = getattr(args, "deferred_prompts", False)
+    records = ragdata.iter_input(
+        args.num_iterations,
+        shuffle=args.shuffle,
+        noise_config=noise_config,
+        deferred=deferred,
+    )
+    stream = model.stream_generate(
+        (
+            ((i, record), ragdata.render(record[2]) if deferred else record[2])
+            for i, record in enumerate(records)
+        ),
+        args.temperature,
+        batch_size=args.batch_size,
+    )
+
+    live_scores = LiveScores(args, getattr(args, "score_log_interval", 60.0))
+    ordered_results = []
+    progress = tqdm(stream, desc="Streaming evaluation")
+    for (i, (idx, query, prompt, answer)), prediction in progress:
+        label = live_scores.add(idx, prediction, answer, len(ordered_results))
+        progress.set_postfix_str(live_scores.summary(), refresh=False)
+        ordered_results.append(
+            (
+                i,
+                EvalResult(
+                    id=idx,
+                    query=query,
+                    prompt=prompt,
+                    answer=answer,
+                    prediction=prediction,
+                    label=label,
+                ),
+            )
+        )
+
+    labels = final_labels(
+        args,
+        live_scores,
+        [result.prediction for _, result in ordered_results],
+        [result.answer for _, result in ordered_results],
+    )
+    eval_results = EvalResults()
+    for (_, result), label in sorted(
+        zip(ordered_results, labels), key=lambda x: x[0][0]
+    ):
+        result.label = label
+        eval_results.add_result(result)
+    return eval_results
+
+
+def score_eval_results(eval_results: EvalResults, bootstrap_resamples: int = 1000) -> None:
+    """Compute the scores and, unless `bootstrap_resamples` is 0, their bootstrap confidence intervals."""
     eval_results.calculate_scores(True)
-    eval_results.save_to_jsonl(f"{output_path}/{model_name}_eval_result_{str(noise_config)}.jsonl")
+    if bootstrap_resamples > 0:
+        eval_results.bootstrap_scores(bootstrap_resamples)
+
+
+def result_save_options(args, ragdata: DataPreprocess) -> Dict:
+    """`prompt_renderer` and `header` of the result files for `--result-format`."""
+    if getattr(args, "result_format", "full") == "compact":
+        return {"prompt_renderer": ragdata.compact_descriptor, "header": compact_header(ragdata)}
+    deferred = getattr(args, "deferred_prompts", False)
+    return {"prompt_renderer": ragdata.render if deferred else None, "header": None}
+
+
+def save_eval_results(
+    eval_results: EvalResults,
+    output_path: str,
+    model_name: str,
+    noise_config,
+    suffix: str = "",
+    prompt_renderer=None,
+    per_config_scores: bool = False,
+    header: Optional[Dict[str, str]] = None,
+) -> None:
+    result_path, scores_path = eval_file_paths(
+        output_path, model_name, noise_config, suffix, per_config_scores
+    )
+    eval_results.save_to_jsonl(result_path, prompt_renderer=prompt_renderer, header=header)
+    save_scores(eval_results, scores_path)
+
+
+def eval_file_paths(
+    output_path: str,
+    model_name: str,
+    noise_config,
+    suffix: str = "",
+    per_config_scores: bool = False,
+) -> Tuple[str, str]:
+    """Paths of the result and scores files of one evaluation."""
+    result_path = f"{output_path}/{model_name}_eval_result_{str(noise_config)}{suffix}.jsonl"
+    # A sweep writes one score table per noise config next to its result file
+    scores_tag = f"_{str(noise_config)}" if per_config_scores else ""
+    scores_path = f"{output_path}/{model_name}_eval_scores{scores_tag}{suffix}.jsonl"
+    return result_path, scores_path
+
+
+def scores_path_of(result_path: str, per_config_scores: bool = False) -> str:
+    """Scores file `save_eval_results` writes next to `result_path`.
+
+    Falls back to ``<result file>_scores.json`` for files not named by eval.py.
+    """
+    output_path, name = os.path.split(result_path)
+    match = re.fullmatch(r"(.+?)_eval_result_(.*?)((?:\.shard\d+-of-\d+)?)\.jsonl", name)
+    if match is None:
+        return os.path.splitext(result_path)[0] + "_scores.json"
+    model_name, noise_config, suffix = match.groups()
+    return eval_file_paths(
+        output_path or ".", model_name, noise_config, suffix, per_config_scores
+    )[1]
+
 
-    with open(
-        f"{output_path}/{model_name}_eval_scores.jsonl", "w", encoding="utf-8"
-    ) as f:
+def save_scores(eval_results: EvalResults, scores_path: str) -> None:
+    """Write the scores (and confidence intervals, if computed) of `eval_results`."""
+    with open(scores_path, "w", encoding="utf-8") as f:
         json.dump(eval_results.to_dict(), f, ensure_ascii=False)
-    print(f"Saving to {output_path}/{model_name}_eval_scores.jsonl")
+    print(f"Saving to {scores_path}")
     print("acc_scores:", eval_results.acc_scores)
 
 
+def parse_noise_sweep(noise_sweep: str) -> List[Dict[str, int]]:
+    """Expand `--noise-sweep` into a list of noise configs.
+
+    Args:
+        noise_sweep: JSON list of noise configs, or JSON object mapping each
+                     noise level to a list of values, expanded as a grid
+    Returns:
+        noise_configs: List[Dict[str, int]], in sweep order
+    """
+    sweep: Union[List[Dict[str, int]], Dict[str, List[int]]] = json.loads(noise_sweep)
+    if isinstance(sweep, dict):
+        levels = list(sweep)
+        return [
+            dict(zip(levels, values))
+            for values in itertools.product(*(sweep[k] for k in levels))
+        ]
+    if isinstance(sweep, list) and all(isinstance(c, dict) for c in sweep):
+        return sweep
+    raise ValueError(
+        "--noise-sweep must be a JSON list of noise configs or an object of per-level value lists"
+    )
+
+
+def run_noise_sweep(args, ragdata, model, noise_configs, suffix: str = "") -> List[Dict]:
+    """Evaluate every noise config with the same loaded dataset and model.
+
+    Golden docs are rendered once per (sample, placeholder) and the random
+    generators are reseeded before each config, so every config gets the same
+    prompts as a standalone run with that `--noise-config`.
+    """
+    ragdata.enable_golden_doc_cache()
+    save_options = result_save_options(args, ragdata)
+    summary = []
+    for i, noise_config in enumerate(noise_configs):
+        logger.info(f"Noise sweep {i + 1}/{len(noise_configs)}: {noise_config}")
+        ragdata.reset_rngs()
+        if getattr(args, "streaming", False):
+            eval_results = run_streaming_eval(args, ragdata, model, noise_config)
+        else:
+            eval_results = run_batch_eval(args, ragdata, model, noise_config)
+        score_eval_results(eval_results, getattr(args, "bootstrap_resamples", 1000))
+        save_eval_results(
+            eval_results,
+            args.output_path,
+            args.model_name,
+            noise_config,
+            suffix=suffix,
+            per_config_scores=True,
+            **save_options,
+        )
+        summary.append(
+            {
+                "noise_config": noise_config,
+                "num_results": len(eval_results.results),
+                "acc_scores": eval_results.acc_scores,
+                "acc_scores_by_rag_class": eval_results.acc_scores_by_rag_class_all,
+                "confidence_intervals": eval_results.confidence_intervals,
+            }
+        )
+
+    summary_path = f"{args.output_path}/{args.model_name}_noise_sweep_summary{suffix}.json"
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    logger.info("\nNoise sweep summary:")
+    for row in summary:
+        logger.info(
+            f"\033[34m{row['noise_config']}:\033[0m \033[1m{row['acc_scores']:.4f}\033[0m"
+        )
+    print(f"Saving noise sweep summary to {summary_path}")
+    return summary
+
+
+def get_eval(args):
+    if getattr(args, "result_format", "full") == "compact" and not getattr(
+        args, "deferred_prompts", False
+    ):
+        # Compact descriptors are built from the deferred prompts' doc ids
+        logger.info("--result-format compact enables --deferred-prompts")
+        args.deferred_prompts = True
+    ragdata = load_dataset(args)
+    num_shards = getattr(args, "num_shards", 1)
+    shard_index = getattr(args, "shard_index", 0)
+    if num_shards > 1:
+        ragdata.select_shard(num_shards, shard_index)
+    model = load_model(args)
+
+    noise_sweep = getattr(args, "noise_sweep", None)
+    if noise_sweep:
+        run_noise_sweep(
+            args,
+            ragdata,
+            model,
+            parse_noise_sweep(noise_sweep),
+            suffix=shard_suffix(shard_index, num_shards),
+        )
+        return
+
+    noise_config = json.loads(args.noise_config)
+
+    if getattr(args, "streaming", False):
+        eval_results = run_streaming_eval(args, ragdata, model, noise_config)
+    else:
+        eval_results = run_batch_eval(args, ragdata, model, noise_config)
+
+    score_eval_results(eval_results, getattr(args, "bootstrap_resamples", 1000))
+    save_eval_results(
+        eval_results,
+        args.output_path,
+        args.model_name,
+        noise_config,
+        suffix=shard_suffix(shard_index, num_shards),
+        **result_save_options(args, ragdata),
+    )
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
 
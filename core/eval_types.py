@@ -1,30 +1,55 @@
 import json
+from array import array
 from dataclasses import dataclass, field
-from typing import Dict, List, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
 from .logger import get_logger
+from .result_format import (
+    CompactPromptRenderer,
+    LazyPrompt,
+    is_header_line,
+    split_result_line,
+)
+from .stats import bootstrap_confidence_intervals
 
 logger = get_logger()
 
+# Coarse class reported for each rag_class (the id prefix); others count as "infer"
+RAG_CLASS_ALL = {
+    "combination_v1": "combination",
+    "combination_v2": "combination",
+    "combination_v3": "combination",
+    "filter": "filter",
+}
+
+
+def rag_class_of(result_id: str) -> str:
+    """rag_class of a result id, its prefix before the first "-"."""
+    return result_id.split("-")[0]
+
 
 @dataclass
 class EvalResult:
     """Single evaluation result."""
 
+    __slots__ = ("id", "query", "prompt", "answer", "prediction", "label", "rag_class")
+
     id: str
     query: str
     prompt: str
     answer: str
     prediction: str
     label: int
-    rag_class: str = field(init=False)
+    # rag_class is a slot set in __post_init__ rather than a field(init=False):
+    # a dataclass field default would conflict with __slots__
 
     def __post_init__(self):
         """Initialize rag_class after other fields are set."""
-        self.rag_class = self.id.split("-")[0]
+        self.rag_class: str = rag_class_of(self.id)
 
     @classmethod
     def from_dict(cls, data: Dict) -> "EvalResult":
@@ -38,14 +63,199 @@ class EvalResult:
         )
 
 
+def _compensated_group_means(
+    values: np.ndarray, groups: np.ndarray, num_groups: int
+) -> np.ndarray:
+    """Group means with Kahan-compensated sums, in the order pandas' groupby mean adds them.
+
+    This loop is deliberately scalar: it reproduces pandas' groupby mean bit
+    for bit, so per-class scores match the published ones. `bincount` and
+    `np.add.reduceat` sums round differently, and even the exactly rounded
+    `math.fsum` differs from pandas in the last bit for some groups. It runs
+    once per id, not per result, so it is not the bottleneck.
+    """
+    order = np.argsort(groups, kind="stable")
+    bounds = np.searchsorted(groups[order], np.arange(num_groups + 1))
+    sorted_values = values[order].tolist()
+    means = np.empty(num_groups)
+    for group in range(num_groups):
+        total = compensation = 0.0
+        for value in sorted_values[bounds[group] : bounds[group + 1]]:
+            y = value - compensation
+            t = total + y
+            compensation = t - total - y
+            total = t
+        means[group] = total / (bounds[group + 1] - bounds[group])
+    return means
+
+
+class ResultColumns:
+    """Columnar scoring fields of a result set: categorical codes and labels.
+
+    Ids and rag_classes get integer codes in first-seen order; per-result id
+    codes, per-id class codes and labels are kept in compact arrays, so scores
+    are computed without touching prompt or prediction strings.
+    """
+
+    __slots__ = ("ids", "id_codes", "classes", "class_codes", "codes", "id_classes", "labels")
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.id_codes: Dict[str, int] = {}
+        self.classes: List[str] = []
+        self.class_codes: Dict[str, int] = {}
+        self.codes = array("q")
+        self.id_classes = array("q")
+        self.labels = array("q")
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def add(self, result_id: str, rag_class: str, label: int) -> None:
+        code = self.id_codes.get(result_id)
+        if code is None:
+            code = self.id_codes[result_id] = len(self.ids)
+            self.ids.append(result_id)
+            class_code = self.class_codes.get(rag_class)
+            if class_code is None:
+                class_code = self.class_codes[rag_class] = len(self.classes)
+                self.classes.append(rag_class)
+            self.id_classes.append(class_code)
+        self.codes.append(code)
+        self.labels.append(label)
+
+    def id_scores(self) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Sorted ids, the mean label of each and their class codes."""
+        codes = np.frombuffer(self.codes, dtype=np.int64)
+        labels = np.frombuffer(self.labels, dtype=np.int64)
+        num_ids = len(self.ids)
+        scores = np.bincount(codes, weights=labels, minlength=num_ids) / np.bincount(
+            codes, minlength=num_ids
+        )
+        # pandas groups by sorted id, and the per-class sums depend on that order
+        ids = np.array(self.ids)
+        order = np.argsort(ids, kind="stable")
+        id_classes = np.frombuffer(self.id_classes, dtype=np.int64)
+        return ids[order].tolist(), scores[order], id_classes[order]
+
+    def class_scores(
+        self, scores: np.ndarray, id_classes: np.ndarray, mapping: Optional[Dict[str, str]] = None
+    ) -> Dict[str, float]:
+        """Mean id score per class, optionally after mapping class names, sorted by name.
+
+        Args:
+            scores: id scores, as returned by `id_scores`
+            id_classes: class codes of the ids, as returned by `id_scores`
+            mapping: coarse class of each class name, e.g. `RAG_CLASS_ALL`;
+                     unmapped classes count as "infer"
+        """
+        names = self.classes
+        if mapping is not None:
+            names = [mapping.get(name, "infer") for name in self.classes]
+        group_codes: Dict[str, int] = {}
+        lookup = np.array(
+            [group_codes.setdefault(name, len(group_codes)) for name in names],
+            dtype=np.int64,
+        )
+        means = _compensated_group_means(scores, lookup[id_classes], len(group_codes))
+        return {name: float(means[code]) for name, code in sorted(group_codes.items())}
+
+
+class ScoreAggregator:
+    """Running scores updated one label at a time.
+
+    Follows `EvalResults.calculate_scores`: a sample id scores the mean of its
+    labels, and overall and per-class accuracies are means over sample ids.
+    Each update costs O(1).
+    """
+
+    def __init__(self):
+        # id -> [label sum, label count]
+        self.id_totals: Dict[str, List[int]] = {}
+        # class -> [sum of id scores, number of ids]
+        self.class_totals: Dict[str, List[float]] = {}
+        self.class_all_totals: Dict[str, List[float]] = {}
+        self.score_sum = 0.0
+        self.num_labels = 0
+
+    def add(self, result_id: str, label: int) -> None:
+        totals = self.id_totals.get(result_id)
+        if totals is None:
+            totals = self.id_totals[result_id] = [0, 0]
+            old_score = None
+        else:
+            old_score = totals[0] / totals[1]
+        totals[0] += label
+        totals[1] += 1
+        new_score = totals[0] / totals[1]
+        self.num_labels += 1
+
+        rag_class = rag_class_of(result_id)
+        for table, key in (
+            (self.class_totals, rag_class),
+            (self.class_all_totals, RAG_CLASS_ALL.get(rag_class, "infer")),
+        ):
+            class_total = table.setdefault(key, [0.0, 0])
+            if old_score is None:
+                class_total[0] += new_score
+                class_total[1] += 1
+            else:
+                class_total[0] += new_score - old_score
+        self.score_sum += new_score - (old_score or 0.0)
+
+    @property
+    def acc_scores(self) -> float:
+        return self.score_sum / len(self.id_totals) if self.id_totals else 0.0
+
+    def scores_by_rag_class(self) -> Dict[str, float]:
+        return {k: v[0] / v[1] for k, v in sorted(self.class_totals.items())}
+
+    def scores_by_rag_class_all(self) -> Dict[str, float]:
+        return {k: v[0] / v[1] for k, v in sorted(self.class_all_totals.items())}
+
+    def summary(self) -> str:
+        """One-line summary for progress bars and logs."""
+        by_class = " ".join(
+            f"{k}={v:.3f}" for k, v in self.scores_by_rag_class_all().items()
+        )
+        return f"acc={self.acc_scores:.3f} {by_class} (n={self.num_labels})"
+
+
 @dataclass
 class EvalResults:
-    """Collection of evaluation results."""
+    """Collection of evaluation results.
+
+    Results are indexed by id, rag_class and label as they are added, and a
+    `ScoreAggregator` keeps per-id and per-class label sums, so lookups cost
+    O(1) and `acc_scores` is current after every `add_result`. Results must be
+    added through `add_result` (or the constructor) to be indexed.
+    """
 
     results: List[EvalResult] = field(default_factory=list)
     acc_scores: float = 0.0
     acc_scores_by_rag_class: Dict[str, float] = field(default_factory=dict)
     error_ids: List[str] = field(default_factory=list)
+    confidence_intervals: Dict[str, Any] = field(default_factory=dict)
+    aggregator: ScoreAggregator = field(
+        default_factory=ScoreAggregator, init=False, repr=False, compare=False
+    )
+    columns: ResultColumns = field(
+        default_factory=ResultColumns, init=False, repr=False, compare=False
+    )
+    _by_id: Dict[str, List[EvalResult]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    _by_class: Dict[str, List[EvalResult]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    _by_label: Dict[int, List[EvalResult]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        """Index results passed to the constructor."""
+        for result in self.results:
+            self._index(result)
 
     def __getitem__(self, idx: int) -> EvalResult:
         return self.results[idx]
@@ -57,38 +267,106 @@ class EvalResults:
             result_id: ID of the result to find
 
         Returns:
-            EvalResult with matching id
+            First EvalResult added with a matching id
 
         Raises:
             KeyError: If no result found with given id
         """
-        for result in self.results:
-            if result.id == result_id:
-                return result
-        raise KeyError(f"No result found with id {result_id}")
+        results = self._by_id.get(result_id)
+        if not results:
+            raise KeyError(f"No result found with id {result_id}")
+        return results[0]
+
+    def _index(self, result: EvalResult) -> None:
+        self._by_id.setdefault(result.id, []).append(result)
+        self._by_class.setdefault(result.rag_class, []).append(result)
+        self._by_label.setdefault(result.label, []).append(result)
+        self.aggregator.add(result.id, result.label)
+        self.columns.add(result.id, result.rag_class, result.label)
+        self.acc_scores = self.aggregator.acc_scores
+
+    @property
+    def id_scores_df(self) -> pd.DataFrame:
+        """Per-id scores with their rag_class and rag_class_all, indexed by sorted id.
+
+        Built from `columns` on access, with the columns `calculate_scores`
+        used to produce.
+        """
+        ids, scores, id_classes = self.columns.id_scores()
+        rag_classes = [self.columns.classes[code] for code in id_classes]
+        id_scores_df = pd.DataFrame(
+            {"score": scores, "rag_class": rag_classes},
+            index=pd.Index(ids, name="id"),
+        )
+        id_scores_df["rag_class_all"] = [
+            RAG_CLASS_ALL.get(rag_class, "infer") for rag_class in rag_classes
+        ]
+        return id_scores_df
 
     def add_result(self, result: EvalResult) -> None:
         self.results.append(result)
+        self._index(result)
+
+    def get_results_by_id(self, result_id: str) -> List[EvalResult]:
+        """All results of a sample id, one per placeholder variant."""
+        return list(self._by_id.get(result_id, []))
+
+    def get_results_by_rag_class(self, rag_class: str) -> List[EvalResult]:
+        """All results of a rag_class, e.g. "filter"."""
+        return list(self._by_class.get(rag_class, []))
 
     @classmethod
-    def load_from_jsonl(cls, input_path: str) -> "EvalResults":
+    def load_from_jsonl(
+        cls,
+        input_path: str,
+        data_path: Optional[str] = None,
+        prompt_config_path: Optional[str] = None,
+    ) -> "EvalResults":
         """Load results from a JSONL file.
 
         Args:
             input_path: Path to the JSONL file to load from
+            data_path: Dataset of a compact result file, defaults to the path in its header
+            prompt_config_path: Prompt config of a compact result file, defaults to the path in its header
 
         Returns:
-            EvalResults object containing the loaded results
+            EvalResults object containing the loaded results; prompts of a
+            compact result file are `LazyPrompt`s rendered on first access
         """
         eval_results = cls()
+        renderer = None
 
         try:
             with open(input_path, "r", encoding="utf-8") as f:
                 # Use tqdm to show progress
                 for line in tqdm(f, desc="Loading from JSONL"):
                     try:
-                        data = json.loads(line.strip())
-                        result = EvalResult.from_dict(data)
+                        if is_header_line(line):
+                            renderer = CompactPromptRenderer(
+                                json.loads(line), data_path, prompt_config_path
+                            )
+                            continue
+                        fields = (
+                            split_result_line(line.rstrip("\n"))
+                            if renderer is not None
+                            else None
+                        )
+                        if fields is not None:
+                            # Compact row: the descriptor is decoded on first access
+                            result_id, query, prompt, answer, prediction, label = fields
+                            result = EvalResult(
+                                id=result_id,
+                                query=query,
+                                prompt=LazyPrompt(prompt, renderer),
+                                answer=answer,
+                                prediction=prediction,
+                                label=label,
+                            )
+                        else:
+                            data = json.loads(line.strip())
+                            result = EvalResult.from_dict(data)
+                            if renderer is not None:
+                                result.prompt = LazyPrompt(result.prompt, renderer)
                         eval_results.add_result(result)
                     except json.JSONDecodeError as e:
                         logger.error(f"Error decoding JSON line: {e}")
@@ -116,58 +394,78 @@ class EvalResults:
         if not self.results:
             return
 
-        # Calculate accuracy scores
-        df = pd.DataFrame([vars(r) for r in self.results])
+        # Mean label per id, from the columnar codes and labels
+        ids, scores, id_classes = self.columns.id_scores()
+        self.id_scores = pd.Series(scores, index=pd.Index(ids, name="id"), name="label")
 
         if by_rag_class:
-            # First calculate mean for each id
-            self.id_scores = df.groupby("id")["label"].mean()
-            # Convert to DataFrame with rag_class
-            class_hash = {
-                "combination_v1": "combination",
-                "combination_v2": "combination",
-                "combination_v3": "combination",
-                "filter": "filter",
-            }
-            self.id_scores_df = pd.DataFrame(
-                {
-                    "score": self.id_scores,
-                    "rag_class": df.groupby("id")["rag_class"].first(),
-                }
+            self.acc_scores_by_rag_class = self.columns.class_scores(scores, id_classes)
+            self.acc_scores_by_rag_class_all = self.columns.class_scores(
+                scores, id_classes, RAG_CLASS_ALL
             )
-            self.id_scores_df['rag_class_all'] = self.id_scores_df['rag_class'].apply(lambda x: class_hash.get(x, "infer"))
-            # Then group by rag_class and calculate mean
-            class_scores = self.id_scores_df.groupby("rag_class")["score"].mean()
-            class_scores_all = self.id_scores_df.groupby("rag_class_all")["score"].mean()
-            self.acc_scores_by_rag_class = class_scores.to_dict()
-            self.acc_scores_by_rag_class_all = class_scores_all.to_dict()
             logger.info("\nScores by RAG class:")
-            for rag_class, score in class_scores_all.items():
+            for rag_class, score in self.acc_scores_by_rag_class_all.items():
                 logger.info(
                     f"\033[34m{rag_class}:\033[0m \033[1m{score:.4f}\033[0m"
                 )
 
-        self.acc_scores = df.groupby("id")["label"].mean().mean()
+        self.acc_scores = scores.mean()
 
         # Get error IDs
-        self.error_ids = [r.id for r in self.results if r.label == 0]
+        self.error_ids = [r.id for r in self._by_label.get(0, [])]
         print(
             f"\033[41;37mOverall Acc_scores:\033[0m \033[1m{self.acc_scores:.4f}\033[0m"
         )
 
+    def bootstrap_scores(
+        self, num_resamples: int = 1000, confidence: float = 0.95, seed: int = 0
+    ) -> Dict[str, Any]:
+        """Bootstrap confidence intervals of the overall and per rag_class_all scores.
+
+        Sample ids are resampled with replacement, see `core/stats.py`. The
+        intervals are stored in `confidence_intervals` and saved by `to_dict`.
+        """
+        if not self.results:
+            return {}
+        _, scores, id_classes = self.columns.id_scores()
+        group_codes: Dict[str, int] = {}
+        class_groups = np.array(
+            [
+                group_codes.setdefault(RAG_CLASS_ALL.get(rag_class, "infer"), len(group_codes))
+                for rag_class in self.columns.classes
+            ],
+            dtype=np.int64,
+        )
+        self.confidence_intervals = bootstrap_confidence_intervals(
+            scores, class_groups[id_classes], list(group_codes), num_resamples, confidence, seed
+        )
+        low, high = self.confidence_intervals["overall"]
+        logger.info(
+            f"\033[34mAcc_scores {confidence:.0%} CI:\033[0m [{low:.4f}, {high:.4f}] ({num_resamples} bootstrap resamples)"
+        )
+        return self.confidence_intervals
+
     def to_dict(self) -> Dict:
-        return {"acc_scores": self.acc_scores, "error_ids": self.error_ids}
+        data = {"acc_scores": self.acc_scores, "error_ids": self.error_ids}
+        if self.confidence_intervals:
+            data["confidence_intervals"] = self.confidence_intervals
+        return data
 
     def get_correct_results(self) -> List[EvalResult]:
         """Get all results that were correctly predicted (label == 1)."""
-        return [r for r in self.results if r.label == 1]
+        return list(self._by_label.get(1, []))
 
     def get_incorrect_results(self) -> List[EvalResult]:
         """Get all results that were incorrectly predicted (label == 0)."""
-        return [r for r in self.results if r.label == 0]
+        return list(self._by_label.get(0, []))
 
     def save_to_jsonl(
-        self, output_path: str, append: bool = False, error_only: bool = False
+        self,
+        output_path: str,
+        append: bool = False,
+        error_only: bool = False,
+        prompt_renderer: Optional[Callable[[Any], Any]] = None,
+        header: Optional[Dict[str, str]] = None,
     ) -> None:
         """Save all results to a JSONL file.
 
@@ -175,6 +473,12 @@ class EvalResults:
             output_path: Path to save the JSONL file
             append: Whether to append to existing file or create new one
             error_only: If True, only save results with label == 0 (incorrect predictions)
+            prompt_renderer: Renders each result's prompt before writing, e.g.
+                `DataPreprocess.render` for results holding `PromptDescriptor`s
+            header: Header of a compact result file, see `core/result_format.py`,
+                written first unless appending to a non-empty file; prompts
+                should then be compact descriptors, e.g. with
+                `DataPreprocess.compact_descriptor` as `prompt_renderer`
         """
         if not self.results:
             logger.error("No results to save")
@@ -194,13 +498,20 @@ class EvalResults:
 
         try:
             with open(output_path, mode, encoding="utf-8") as f:
+                if header is not None and f.tell() == 0:
+                    f.write(json.dumps(header, ensure_ascii=False) + "\n")
                 # Use tqdm to show progress
                 for result in results_to_save:
+                    prompt = result.prompt
+                    if prompt_renderer is not None:
+                        prompt = prompt_renderer(prompt)
+                    elif isinstance(prompt, LazyPrompt):
+                        prompt = prompt.descriptor if header is not None else prompt.render()
                     # Create data dictionary
                     data = {
                         "id": result.id,
                         "query": result.query,
-                        "prompt": result.prompt,
+                        "prompt": prompt,
                         "answer": result.answer,
                         "prediction": result.prediction,
                         "label": result.label,
@@ -7,12 +7,15 @@ logger = get_logger()
 
 # Import API models directly
 from .api_models import APIModel, OpenAIModel, transfer_dict_conv
+from .async_api_models import AsyncAPIModel, AsyncOpenAIModel
 
 # Export API models for immediate access
 __all__ = [
     'transfer_dict_conv',
     'APIModel',
     'OpenAIModel',
+    'AsyncAPIModel',
+    'AsyncOpenAIModel',
     'CommonModelVllm',
     'InferModelVllm', 
     'Qwen3Vllm',
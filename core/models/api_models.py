@@ -5,13 +5,16 @@ import re
 import threading
 import time
 from concurrent.futures import ThreadPoolExecutor
-from queue import Queue
-from typing import Dict, List, Optional
+from queue import Empty, Full, Queue
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 
+from ..cache import cache_key
 from ..logger import get_logger
+from .rate_control import AIMDController, RequestLimiter, estimate_tokens, throttle_info
 
 logger = get_logger()
 
@@ -66,6 +69,12 @@ class APIInferenceBase:
         self.max_retries = max_retries
         self.retry_delay = retry_delay
         self.retry_backoff = retry_backoff
+        # Optional RequestLimiter (or adaptive AIMDController) shared by all
+        # batches; without one each batch is limited to batch_size requests per second
+        self.rate_controller = None
+        self.batch_limiter = None
+        # Optional ResponseCache consulted before each request
+        self.response_cache = None
 
     def _should_retry(self, exception, response=None):
         """
@@ -95,9 +104,11 @@ class APIInferenceBase:
         
         return False
 
-    def _retry_with_backoff(self, func, *args, **kwargs):
+    def _retry_with_backoff(self, func, *args, estimated_tokens=0, **kwargs):
         """
         带指数退避的重试机制
+
+        func 返回 (content, used_tokens)，used_tokens 为响应报告的 token 用量（未知时为 None）
         """
         last_exception = None
         delay = self.retry_delay
@@ -107,16 +118,23 @@ class APIInferenceBase:
                 if attempt == 0:
                     # 第一次尝试，直接调用
                     logger.debug(f"API调用第1次尝试")
-                    return func(*args, **kwargs)
+                    return self._controlled_call(func, *args, estimated_tokens=estimated_tokens, **kwargs)
                 else:
-                    # 重试前等待,增加延迟时间（指数退避）
+                    # 重试前等待,增加延迟时间（指数退避）；限流时遵循 Retry-After，
+                    # 启用自适应限速时由控制器降速，不再指数退避
+                    throttled, retry_after = throttle_info(last_exception)
+                    wait = delay
+                    if throttled and isinstance(self.rate_controller, AIMDController):
+                        wait = self.retry_delay
+                    else:
+                        delay *= self.retry_backoff
+                        delay += random.uniform(0, 0.1 * delay)
+                    wait = max(wait, retry_after or 0)
                     if attempt % 5 == 0:
-                        logger.info(f"API调用失败，等待 {delay:.2f}s 后进行第{attempt + 1}次重试")
-                    time.sleep(delay)
-                    delay *= self.retry_backoff
-                    delay += random.uniform(0, 0.1 * delay)
+                        logger.info(f"API调用失败，等待 {wait:.2f}s 后进行第{attempt + 1}次重试")
+                    time.sleep(wait)
                     logger.debug(f"API调用第{attempt + 1}次尝试")
-                    return func(*args, **kwargs)
+                    return self._controlled_call(func, *args, estimated_tokens=estimated_tokens, **kwargs)
                     
             except Exception as e:
                 last_exception = e
@@ -133,8 +151,110 @@ class APIInferenceBase:
         
         raise last_exception
 
+    @property
+    def limiter(self) -> Optional[RequestLimiter]:
+        """
+        当前生效的限流器：模型级限流器优先，否则为本批次按 batch_size 限速的限流器
+        """
+        return self.rate_controller or self.batch_limiter
+
+    def _estimate_tokens(self, messages) -> int:
+        """
+        仅在限流器限制每分钟 token 数时估算 prompt token 数
+        """
+        limiter = self.limiter
+        if limiter is None or not limiter.tokens_per_minute:
+            return 0
+        return estimate_tokens(messages)
+
+    def _acquire_slot(self, limiter, estimated_tokens=0) -> int:
+        """
+        等待限流器允许发送请求（在锁外等待）
+        """
+        while True:
+            ticket, wait = limiter.try_acquire(estimated_tokens)
+            if ticket is not None:
+                return ticket
+            time.sleep(wait)
+
+    def _controlled_call(self, func, *args, estimated_tokens=0, **kwargs):
+        """
+        单次请求；向限流器报告延迟、限流和实际 token 用量
+        """
+        limiter = self.limiter
+        if limiter is None:
+            return func(*args, **kwargs)[0]
+        ticket = self._acquire_slot(limiter, estimated_tokens)
+        start_time = time.time()
+        try:
+            content, used_tokens = func(*args, **kwargs)
+        except Exception as e:
+            throttled, retry_after = throttle_info(e)
+            limiter.release(ticket, throttled=throttled, retry_after=retry_after)
+            raise
+        limiter.release(ticket, latency=time.time() - start_time, used_tokens=used_tokens)
+        return content
+
+    def _num_workers(self, qps):
+        """
+        线程数：限流器设置了并发上限时取该上限，否则为 min(10, 每秒请求数 * 2)
+        """
+        limiter = self.rate_controller
+        if limiter is not None:
+            if limiter.max_concurrency:
+                return limiter.max_concurrency
+            if limiter.rate:
+                qps = limiter.rate
+        return max(1, min(10, int(qps * 2)))
+
+    def _start_limits(self, qps):
+        """
+        未设置模型级限流器时，本批次按 qps 限制每秒请求数
+        """
+        if self.rate_controller is None:
+            self.batch_limiter = RequestLimiter(requests_per_second=qps)
+
+    def _cache_key(self, messages, temperature, top_p) -> str:
+        return cache_key(self.model, messages, temperature, top_p, f"api {self.url}")
+
+    def _cached_generate(self, messages, temperature, top_p):
+        """
+        先查响应缓存，未命中时调用 generate 并写入缓存（失败的请求不写入）
+        """
+        cache = self.response_cache
+        if cache is None or not cache.cacheable(temperature):
+            return self.generate(messages, temperature, top_p)
+        key = self._cache_key(messages, temperature, top_p)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        result = self.generate(messages, temperature, top_p)
+        if isinstance(result, str):
+            cache.put(key, result)
+        return result
+
+    def _log_batch_stats(self):
+        """
+        输出连接复用、限流和响应缓存统计
+        """
+        self._log_connection_stats()
+        if self.rate_controller is not None:
+            self.rate_controller.log_limits()
+        if self.response_cache is not None:
+            self.response_cache.log_stats()
+
+    def _prepare_connections(self, pool_size):
+        """
+        为 pool_size 个并发请求准备连接池，子类按需实现
+        """
+
+    def _log_connection_stats(self):
+        """
+        输出连接复用统计，子类按需实现
+        """
+
     def batch_generate(
-        self, data, temperature=0.0, top_p=0.8, batch_size=10
+        self, data, temperature=0.0, top_p=0.8, batch_size=10, on_result=None
     ):
         """
         Batch generate responses with QPS control and threading
@@ -144,7 +264,10 @@ class APIInferenceBase:
             temperature: Sampling temperature
             top_p: Top-p sampling parameter
             batch_size: Batch size for processing
+            on_result: Optional callback `on_result(index, result)` run from the
+                       worker threads as soon as each request is final
         """
+        self.on_result = on_result
         self.queue = Queue()
         self.stats = {
             'total': len(data),
@@ -153,7 +276,6 @@ class APIInferenceBase:
             'total_time': 0.0,
             'lock': threading.Lock()
         }
-        self.session = requests.Session()
         self.results = {}
         self.results_lock = threading.Lock()
         self.pbar = tqdm(total=len(data), desc="Processing API Requests")
@@ -163,38 +285,14 @@ class APIInferenceBase:
         self.retry_counts = {}
         self.retry_counts_lock = threading.Lock()
         
-        self.qps = batch_size
-        self.tokens = batch_size  # 初始令牌数
-        self.last_refill = time.time()
-        self.token_lock = threading.Lock()
-        
+        self._start_limits(batch_size)
+
         # 将查询请求放入队列，同时保存索引
         for i, item in enumerate(data):
             self.queue.put((i, item))
 
         return self.run_batch(temperature, top_p, batch_size)  
 
-    def acquire_token(self):
-        """
-        使用令牌桶算法控制QPS
-        """
-        while True:
-            with self.token_lock:
-                now = time.time()
-                # 补充令牌
-                time_passed = now - self.last_refill
-                new_tokens = time_passed * self.qps
-                self.tokens = min(self.qps, self.tokens + new_tokens)
-                self.last_refill = now
-                
-                if self.tokens >= 1:
-                    self.tokens -= 1
-                    return  # 获得令牌，可以执行请求
-                else:
-                    # 没有令牌，等待
-                    wait_time = (1 - self.tokens) / self.qps
-                    time.sleep(wait_time)
-
     def worker(self, temperature, top_p):
         """
         工作线程，从队列中获取请求并处理
@@ -211,13 +309,11 @@ class APIInferenceBase:
                 index, messages = item
                 logger.debug(f"线程 {thread_id} 开始处理请求 {index}")
                 
-                # 获取令牌以控制QPS
-                self.acquire_token()
-                
+                # 限流在每次请求（包括重试）时由 _controlled_call 完成
                 start_time = time.time()
                 success = False
                 try:
-                    result = self.generate(messages, temperature, top_p)
+                    result = self._cached_generate(messages, temperature, top_p)
                     with self.results_lock:
                         self.results[index] = result
                     success = True
@@ -263,6 +359,11 @@ class APIInferenceBase:
 
                 # 只有在不重试的情况下才调用 task_done()
                 if not should_retry or (should_retry and current_retries >= self.max_retries):
+                    if self.on_result is not None:
+                        try:
+                            self.on_result(index, self.results[index])
+                        except Exception as e:
+                            logger.error(f"on_result 回调异常: {str(e)}")
                     self.queue.task_done()
             except Exception as e:
                 if not self.queue.empty():
@@ -278,9 +379,10 @@ class APIInferenceBase:
         start_time = time.time()
         
         data_size = self.stats['total']
-        max_workers = min(data_size, max(1, min(10, qps * 2)))
+        max_workers = min(data_size, self._num_workers(qps))
         
         logger.debug(f"启动批量处理: 数据量={data_size}, QPS={qps}, 线程数={max_workers}")
+        self._prepare_connections(max_workers)
 
         # 创建线程池
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
@@ -295,7 +397,9 @@ class APIInferenceBase:
             self.stop_event.set()
 
         self.pbar.close()
-        
+        self._log_batch_stats()
+        self.batch_limiter = None
+
         results = []
         for i in range(data_size):
             if i in self.results:
@@ -305,19 +409,189 @@ class APIInferenceBase:
         
         return results
 
+    def stream_generate(
+        self,
+        items: Iterable[Tuple[Any, List[Dict[str, str]]]],
+        temperature=0.0,
+        top_p=0.8,
+        batch_size=10,
+        max_pending: Optional[int] = None,
+    ) -> Iterator[Tuple[Any, str]]:
+        """
+        Generate responses for a stream of requests through bounded queues.
+
+        Requests are pulled from `items` only when there is room in the input
+        queue, so the first request is sent as soon as the first prompt is ready
+        and at most `max_pending` prompts are held in memory at a time.
+
+        Args:
+            items: iterable of (key, messages); keys are passed through untouched
+            temperature: Sampling temperature
+            top_p: Top-p sampling parameter
+            batch_size: QPS limit, also used to size the worker pool as in `run_batch`
+            max_pending: depth of the input and output queues, defaults to twice the worker count
+        Yields:
+            (key, prediction) in completion order
+        """
+        max_workers = self._num_workers(batch_size)
+        max_pending = max_pending or max_workers * 2
+        self._prepare_connections(max_workers)
+        in_queue: Queue = Queue(maxsize=max_pending)
+        out_queue: Queue = Queue(maxsize=max_pending)
+        stop_event = threading.Event()
+        done_marker = object()
+
+        self._start_limits(batch_size)
+
+        def put(queue, item):
+            while not stop_event.is_set():
+                try:
+                    queue.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    continue
+            return False
+
+        def feeder():
+            try:
+                for item in items:
+                    if not put(in_queue, item):
+                        return
+            except Exception as e:
+                put(out_queue, e)
+            finally:
+                for _ in range(max_workers):
+                    put(in_queue, None)
+
+        def stream_worker():
+            while not stop_event.is_set():
+                try:
+                    item = in_queue.get(timeout=0.1)
+                except Empty:
+                    continue
+                if item is None:
+                    break
+                key, messages = item
+                try:
+                    result = self._cached_generate(messages, temperature, top_p)
+                except Exception as e:
+                    logger.error(f"流式请求失败: {messages[-1]['content'][-20:]} - {str(e)}")
+                    result = f"Error: {str(e)}"
+                if not put(out_queue, (key, result)):
+                    return
+            put(out_queue, done_marker)
+
+        threads = [threading.Thread(target=feeder, daemon=True)]
+        threads += [
+            threading.Thread(target=stream_worker, daemon=True)
+            for _ in range(max_workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        finished = 0
+        try:
+            while finished < max_workers:
+                item = out_queue.get()
+                if item is done_marker:
+                    finished += 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            stop_event.set()
+            self._log_batch_stats()
+            self.batch_limiter = None
+
+
 class APIModel(APIInferenceBase):
+    """
+    OpenAI 兼容接口的 HTTP 实现。所有请求（包括重试）共用一个 keep-alive 的
+    requests.Session，连接池大小与并发线程数一致，避免每个请求重新建立 TCP/TLS 连接。
+    """
+
+    def __init__(
+        self,
+        url="https://api.openai.com/v1/chat/completions",
+        api_key=None,
+        model="gpt-3.5-turbo",
+        inference_mode=False,
+        max_retries=10,
+        retry_delay=1.0,
+        retry_backoff=2.0,
+        connect_timeout=10.0,
+        read_timeout=600.0,
+    ):
+        super().__init__(url, api_key, model, inference_mode, max_retries, retry_delay, retry_backoff)
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = None
+        self.pool_size = 0
+        self.session_lock = threading.Lock()
+        self._stats_baseline = (0, 0)
+
+    def _prepare_connections(self, pool_size):
+        with self.session_lock:
+            if self.session is None or self.pool_size < pool_size:
+                if self.session is not None:
+                    self.session.close()
+                adapter = HTTPAdapter(pool_maxsize=pool_size)
+                self.session = requests.Session()
+                self.session.headers.update(
+                    {
+                        "Authorization": f"Bearer {self.api_key}",
+                        "Content-Type": "application/json",
+                    }
+                )
+                self.session.mount("http://", adapter)
+                self.session.mount("https://", adapter)
+                self.pool_size = pool_size
+            stats = self.connection_stats()
+            self._stats_baseline = (stats["connections"], stats["requests"])
+
+    def connection_stats(self) -> Dict[str, int]:
+        """
+        Connections opened and requests sent over the current session.
+
+        Returns:
+            {"connections", "requests", "reused"}, where reused counts requests
+            sent over an already open keep-alive connection
+        """
+        connections = requests_sent = 0
+        if self.session is not None:
+            for adapter in set(self.session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools[key]
+                    connections += getattr(pool, "num_connections", 0)
+                    requests_sent += getattr(pool, "num_requests", 0)
+        return {
+            "connections": connections,
+            "requests": requests_sent,
+            "reused": max(0, requests_sent - connections),
+        }
+
+    def _log_connection_stats(self):
+        stats = self.connection_stats()
+        connections = stats["connections"] - self._stats_baseline[0]
+        requests_sent = stats["requests"] - self._stats_baseline[1]
+        if requests_sent:
+            reuse = 1 - connections / requests_sent
+            logger.info(
+                f"HTTP connections: {connections} opened for {requests_sent} requests "
+                f"(pool size {self.pool_size}, reuse {reuse:.1%})"
+            )
+
     def generate(
         self,
         messages: List[Dict[str, str]],
         temperature=0.7,
         top_p=1,
     ):
-        def _make_request():
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
+        if self.session is None:
+            self._prepare_connections(10)
 
+        def _make_request():
             query = {
                 "model": self.model,
                 "temperature": temperature,
@@ -325,11 +599,13 @@ class APIModel(APIInferenceBase):
                 "messages": messages,
                 "stream": False,
             }
-            response = requests.post(self.url, headers=headers, json=query)
+            response = self.session.post(self.url, json=query, timeout=self.timeout)
             
             # 检查HTTP状态码
             if response.status_code != 200:
-                raise requests.exceptions.HTTPError(f"HTTP {response.status_code}: {response.text}")
+                raise requests.exceptions.HTTPError(
+                    f"HTTP {response.status_code}: {response.text}", response=response
+                )
             
             response_json = response.json()
             if "choices" not in response_json:
@@ -337,9 +613,12 @@ class APIModel(APIInferenceBase):
                 logger.error(f"Response: {response_json}")
                 raise ValueError("Invalid response format: 'choices' not found")
             
-            return response_json["choices"][0]["message"]["content"]
+            usage = response_json.get("usage") or {}
+            return response_json["choices"][0]["message"]["content"], usage.get("total_tokens")
         
-        return self._retry_with_backoff(_make_request)
+        return self._retry_with_backoff(
+            _make_request, estimated_tokens=self._estimate_tokens(messages)
+        )
 
 
 class OpenAIModel(APIInferenceBase):
@@ -356,9 +635,11 @@ class OpenAIModel(APIInferenceBase):
         if not OPENAI_AVAILABLE:
             raise ImportError("OpenAI is not installed. Please install it with: pip install openai")
         super().__init__(url, api_key, model, inference_mode, max_retries, retry_delay, retry_backoff)
+        # Retries are left to _retry_with_backoff, so the rate limiter sees every 429
         self.client = openai.Client(
             api_key=self.api_key,
-            base_url=self.url
+            base_url=self.url,
+            max_retries=0,
         )
 
     def generate(
@@ -375,6 +656,9 @@ class OpenAIModel(APIInferenceBase):
                 messages=messages,
                 stream=False,
             )
-            return completion.choices[0].message.content
+            usage = completion.usage.total_tokens if completion.usage else None
+            return completion.choices[0].message.content, usage
         
-        return self._retry_with_backoff(_make_request) 
\ No newline at end of file
+        return self._retry_with_backoff(
+            _make_request, estimated_tokens=self._estimate_tokens(messages)
+        )
\ No newline at end of file
@@ -0,0 +1,461 @@
+"""
+asyncio API inference backends.
+
+`APIInferenceBase.run_batch` blocks one thread per request, so a batch never
+has more than ten requests in flight. These backends run every request as a
+coroutine on one event loop: `max_concurrency` worker coroutines pull
+requests and await the HTTP call, so hundreds of slow requests (reasoning
+models take 30-60 s) are in flight at once while the `RequestLimiter` (or
+`batch_size`) limits the request and token rates as in the threaded backends.
+
+`batch_generate` and `stream_generate` keep the threaded signatures and
+blocking behaviour; each call runs its own event loop, so they cannot be
+called from inside a running loop.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from queue import Queue
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from tqdm import tqdm
+
+from ..logger import get_logger
+from .api_models import APIInferenceBase
+from .rate_control import AIMDController, throttle_info
+
+logger = get_logger()
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+try:
+    import openai
+    ASYNC_OPENAI_AVAILABLE = hasattr(openai, "AsyncOpenAI")
+except ImportError:
+    ASYNC_OPENAI_AVAILABLE = False
+
+# HTTP status codes worth retrying besides 5xx
+RETRY_STATUS_CODES = (408, 429)
+
+
+class AsyncAPIInferenceBase(APIInferenceBase):
+    """Event-loop counterpart of `APIInferenceBase`.
+
+    Subclasses implement `_arequest`, returning the content and the total
+    tokens the response reports, and, if they hold a connection pool,
+    `_open_client` / `_close_client`, which run inside the event loop.
+    """
+
+    def __init__(
+        self,
+        url="https://api.openai.com/v1/chat/completions",
+        api_key=None,
+        model="gpt-3.5-turbo",
+        inference_mode=False,
+        max_retries=10,
+        retry_delay=1.0,
+        retry_backoff=2.0,
+        max_concurrency=256,
+    ):
+        super().__init__(url, api_key, model, inference_mode, max_retries, retry_delay, retry_backoff)
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _open_client(self):
+        pass
+
+    async def _close_client(self):
+        pass
+
+    async def _arequest(
+        self, messages: List[Dict[str, str]], temperature, top_p
+    ) -> Tuple[str, Optional[int]]:
+        raise NotImplementedError
+
+    async def agenerate(self, messages: List[Dict[str, str]], temperature=0.7, top_p=1) -> str:
+        """One request with retries and request limits; the client must be open."""
+        return await self._aretry_with_backoff(
+            self._arequest,
+            messages,
+            temperature,
+            top_p,
+            estimated_tokens=self._estimate_tokens(messages),
+        )
+
+    async def _aretry_with_backoff(self, func, *args, estimated_tokens=0, **kwargs):
+        """
+        带指数退避的重试机制（协程版本，等待时不占用线程）
+        """
+        delay = self.retry_delay
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._acontrolled_call(
+                    func, *args, estimated_tokens=estimated_tokens, **kwargs
+                )
+            except Exception as e:
+                if not self._should_retry(e) or attempt == self.max_retries:
+                    raise
+                logger.debug(f"API调用失败，第{attempt + 1}次重试: {type(e).__name__}: {str(e)}")
+                throttled, retry_after = throttle_info(e)
+                wait = delay
+                if throttled and isinstance(self.rate_controller, AIMDController):
+                    wait = self.retry_delay
+                else:
+                    delay *= self.retry_backoff
+                    delay += random.uniform(0, 0.1 * delay)
+                wait = max(wait, retry_after or 0)
+                if (attempt + 1) % 5 == 0:
+                    logger.info(f"API调用失败，等待 {wait:.2f}s 后进行第{attempt + 2}次重试")
+                await asyncio.sleep(wait)
+
+    async def _acontrolled_call(self, func, *args, estimated_tokens=0, **kwargs):
+        """
+        单次请求；向限流器报告延迟、限流和实际 token 用量（等待时不占用线程）
+        """
+        limiter = self.limiter
+        ticket = None
+        if limiter is not None:
+            while True:
+                ticket, wait = limiter.try_acquire(estimated_tokens)
+                if ticket is not None:
+                    break
+                await asyncio.sleep(wait)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        start_time = time.time()
+        try:
+            content, used_tokens = await func(*args, **kwargs)
+        except Exception as e:
+            if ticket is not None:
+                throttled, retry_after = throttle_info(e)
+                limiter.release(ticket, throttled=throttled, retry_after=retry_after)
+            raise
+        finally:
+            self.in_flight -= 1
+        if ticket is not None:
+            limiter.release(ticket, latency=time.time() - start_time, used_tokens=used_tokens)
+        return content
+
+    def _reset_rate_limit(self, qps):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._start_limits(qps)
+
+    async def _generate_one(self, messages, temperature, top_p) -> str:
+        """Send one request with retries; failures are returned as ``Error: ...`` strings."""
+        cache = self.response_cache
+        key = None
+        if cache is not None and cache.cacheable(temperature):
+            key = self._cache_key(messages, temperature, top_p)
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+        try:
+            result = await self.agenerate(messages, temperature, top_p)
+            if key is not None and isinstance(result, str):
+                cache.put(key, result)
+            return result
+        except Exception as e:
+            if self._should_retry(e):
+                logger.error(f"请求重试次数已达上限({self.max_retries})，放弃重试: {str(e)}")
+                return f"Error: Max retries exceeded - {str(e)}"
+            logger.error(f"请求遇到不可重试异常: {messages[-1]['content'][-20:]} - {str(e)}")
+            return f"Error: {str(e)}"
+
+    def _num_workers(self, qps):
+        if self.rate_controller is not None and self.rate_controller.max_concurrency:
+            return self.rate_controller.max_concurrency
+        return self.max_concurrency
+
+    def generate(self, messages: List[Dict[str, str]], temperature=0.7, top_p=1) -> str:
+        """Blocking single request, for callers of the threaded interface."""
+
+        async def _run():
+            await self._open_client()
+            try:
+                return await self.agenerate(messages, temperature, top_p)
+            finally:
+                await self._close_client()
+
+        return asyncio.run(_run())
+
+    def batch_generate(
+        self, data, temperature=0.0, top_p=0.8, batch_size=10, on_result=None
+    ):
+        """
+        Batch generate responses with QPS control on one event loop
+
+        Args:
+            data: List of input messages to process
+            temperature: Sampling temperature
+            top_p: Top-p sampling parameter
+            batch_size: QPS limit when no `rate_controller` is set, as in
+                        `APIInferenceBase.batch_generate`
+            on_result: Optional callback `on_result(index, result)` run on the
+                       event loop thread as soon as each request is final
+        Returns:
+            predictions in the order of `data`
+        """
+        return asyncio.run(self._run_batch(list(data), temperature, top_p, batch_size, on_result))
+
+    async def _run_batch(self, data, temperature, top_p, qps, on_result):
+        start_time = time.time()
+        self._reset_rate_limit(qps)
+        pending = deque(enumerate(data))
+        results: List[Optional[str]] = [None] * len(data)
+        pbar = tqdm(total=len(data), desc="Processing API Requests")
+        num_workers = min(len(data), self._num_workers(qps))
+        logger.debug(f"启动异步批量处理: 数据量={len(data)}, QPS={qps}, 并发数={num_workers}")
+
+        async def worker():
+            while pending:
+                index, messages = pending.popleft()
+                result = await self._generate_one(messages, temperature, top_p)
+                results[index] = result
+                pbar.update(1)
+                if on_result is not None:
+                    try:
+                        on_result(index, result)
+                    except Exception as e:
+                        logger.error(f"on_result 回调异常: {str(e)}")
+
+        await self._open_client()
+        try:
+            await asyncio.gather(*(worker() for _ in range(num_workers)))
+        finally:
+            await self._close_client()
+            pbar.close()
+            self.batch_limiter = None
+        self._log_batch_stats()
+
+        logger.info(
+            f"Async batch: \033[34m{len(data)} requests\033[0m in {time.time() - start_time:.1f}s, "
+            f"peak in-flight {self.max_in_flight}"
+        )
+        return ["Error: Result not found" if r is None else r for r in results]
+
+    def stream_generate(
+        self,
+        items: Iterable[Tuple[Any, List[Dict[str, str]]]],
+        temperature=0.0,
+        top_p=0.8,
+        batch_size=10,
+        max_pending: Optional[int] = None,
+    ) -> Iterator[Tuple[Any, str]]:
+        """
+        Generate responses for a stream of requests on an event loop thread.
+
+        `items` is pulled from an executor thread so that slow prompt rendering
+        does not stall requests in flight. At most `max_pending` requests are
+        taken from `items` and not yet consumed by the caller.
+
+        Args:
+            items: iterable of (key, messages); keys are passed through untouched
+            temperature: Sampling temperature
+            top_p: Top-p sampling parameter
+            batch_size: QPS limit
+            max_pending: bound on pulled but unconsumed requests, defaults to
+                         twice the number of worker coroutines
+        Yields:
+            (key, prediction) in completion order
+        """
+        num_workers = self._num_workers(batch_size)
+        max_pending = max_pending or num_workers * 2
+        out_queue: Queue = Queue()
+        done_marker = object()
+        loop = asyncio.new_event_loop()
+        state: Dict[str, Any] = {}
+
+        async def produce():
+            self._reset_rate_limit(batch_size)
+            slots = state["slots"] = asyncio.Semaphore(max_pending)
+            in_queue: asyncio.Queue = asyncio.Queue(maxsize=num_workers)
+            iterator = iter(items)
+
+            async def worker():
+                while True:
+                    item = await in_queue.get()
+                    if item is done_marker:
+                        return
+                    key, messages = item
+                    out_queue.put((key, await self._generate_one(messages, temperature, top_p)))
+
+            await self._open_client()
+            workers = [loop.create_task(worker()) for _ in range(num_workers)]
+            try:
+                while True:
+                    await slots.acquire()
+                    item = await loop.run_in_executor(None, next, iterator, done_marker)
+                    if item is done_marker:
+                        break
+                    await in_queue.put(item)
+                for _ in workers:
+                    await in_queue.put(done_marker)
+                await asyncio.gather(*workers)
+            finally:
+                for task in workers:
+                    task.cancel()
+                await self._close_client()
+                self.batch_limiter = None
+                self._log_batch_stats()
+
+        main = loop.create_task(produce())
+
+        def run_loop():
+            asyncio.set_event_loop(loop)
+            try:
+                loop.run_until_complete(main)
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                out_queue.put(e)
+            finally:
+                out_queue.put(done_marker)
+                loop.close()
+
+        def call_soon(callback):
+            try:
+                loop.call_soon_threadsafe(callback)
+            except RuntimeError:
+                pass  # loop already closed
+
+        thread = threading.Thread(target=run_loop, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = out_queue.get()
+                if item is done_marker:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+                call_soon(state["slots"].release)
+        finally:
+            call_soon(main.cancel)
+
+
+class AsyncAPIModel(AsyncAPIInferenceBase):
+    """OpenAI-compatible chat completions over an aiohttp connection pool."""
+
+    def __init__(self, *args, connect_timeout=10.0, read_timeout=600.0, **kwargs):
+        if not AIOHTTP_AVAILABLE:
+            raise ImportError("aiohttp is not installed. Please install it with: pip install aiohttp")
+        super().__init__(*args, **kwargs)
+        self.timeout = aiohttp.ClientTimeout(
+            total=None, sock_connect=connect_timeout, sock_read=read_timeout
+        )
+        self.session = None
+
+    def _should_retry(self, exception, response=None):
+        if isinstance(exception, aiohttp.ClientResponseError):
+            return exception.status >= 500 or exception.status in RETRY_STATUS_CODES
+        return isinstance(exception, (aiohttp.ClientError, asyncio.TimeoutError))
+
+    async def _open_client(self):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+            timeout=self.timeout,
+            headers={"Authorization": f"Bearer {self.api_key}"},
+        )
+
+    async def _close_client(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _arequest(self, messages, temperature, top_p):
+        query = {
+            "model": self.model,
+            "temperature": temperature,
+            "top_p": top_p,
+            "messages": messages,
+            "stream": False,
+        }
+        async with self.session.post(self.url, json=query) as response:
+            if response.status != 200:
+                raise aiohttp.ClientResponseError(
+                    response.request_info,
+                    response.history,
+                    status=response.status,
+                    message=f"HTTP {response.status}: {await response.text()}",
+                    headers=response.headers,
+                )
+            response_json = await response.json(content_type=None)
+
+        if "choices" not in response_json:
+            logger.error(f"Unexpected response format: {messages}")
+            logger.error(f"Response: {response_json}")
+            raise ValueError("Invalid response format: 'choices' not found")
+        usage = response_json.get("usage") or {}
+        return response_json["choices"][0]["message"]["content"], usage.get("total_tokens")
+
+
+class AsyncOpenAIModel(AsyncAPIInferenceBase):
+    """Chat completions through `openai.AsyncOpenAI`."""
+
+    def __init__(
+        self,
+        url="https://api.openai.com/v1/completions",
+        api_key=None,
+        model="gpt-3.5-turbo",
+        inference_mode=False,
+        max_retries=20,
+        retry_delay=1.0,
+        retry_backoff=2.0,
+        max_concurrency=256,
+        connect_timeout=10.0,
+        read_timeout=600.0,
+    ):
+        if not ASYNC_OPENAI_AVAILABLE:
+            raise ImportError("openai>=1.0 is not installed. Please install it with: pip install -U openai")
+        super().__init__(
+            url, api_key, model, inference_mode, max_retries, retry_delay, retry_backoff, max_concurrency
+        )
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.client = None
+
+    def _should_retry(self, exception, response=None):
+        return isinstance(
+            exception,
+            (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError),
+        )
+
+    async def _open_client(self):
+        import httpx
+
+        # The client's connection pool must be created on the running loop.
+        # Retries are left to _retry_with_backoff, so the rate limiter sees every 429
+        self.client = openai.AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.url,
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_concurrency),
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            ),
+        )
+
+    async def _close_client(self):
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+    async def _arequest(self, messages, temperature, top_p):
+        completion = await self.client.chat.completions.create(
+            model=self.model,
+            temperature=temperature,
+            top_p=top_p,
+            messages=messages,
+            stream=False,
+        )
+        usage = completion.usage.total_tokens if completion.usage else None
+        return completion.choices[0].message.content, usage
@@ -0,0 +1,157 @@
+import bisect
+import logging
+import time
+from collections import deque
+from typing import Callable, List, Optional, Sequence, TypeVar
+
+from tqdm import tqdm
+
+from ..logger import get_logger
+
+logger = get_logger()
+
+T = TypeVar("T")
+
+
+def length_bucketed_batches(
+    lengths: Sequence[int], batch_size: int
+) -> List[List[int]]:
+    """
+    Group prompt indices into batches of similar token length.
+
+    Indices are sorted by length, longest first, and cut into chunks of
+    `batch_size`, so no batch waits on a member much longer than the others and
+    out-of-memory errors surface on the first batch rather than the last.
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__, reverse=True)
+    return [order[i : i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def prefix_grouped_batches(texts: Sequence[str], batch_size: int) -> List[List[int]]:
+    """
+    Group prompt indices so that prompts sharing a prefix are dispatched back to back.
+
+    Sorting the prompts lexicographically puts every prompt next to the earlier
+    prompts it shares the longest prefix with, which is what a prefix cache
+    needs to reuse the blocks computed for them.
+    """
+    order = sorted(range(len(texts)), key=texts.__getitem__)
+    return [order[i : i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    """Length of the longest common prefix of two strings."""
+    lo, hi = 0, min(len(a), len(b))
+    # Binary search on slice equality keeps the comparisons in C.
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def estimate_prefix_hit_rate(
+    texts: Sequence[str], window: Optional[int] = None
+) -> float:
+    """
+    Estimate the share of prompt characters a prefix cache can reuse.
+
+    Each prompt is credited with its longest common prefix with any of the
+    `window` prompts dispatched before it (all of them if None). A small window
+    stands in for cache eviction, which is what makes dispatch order matter;
+    block granularity makes real hit rates somewhat lower.
+
+    Args:
+        texts: prompts in dispatch order
+        window: number of recently dispatched prompts the cache keeps
+    Returns:
+        hit_rate: reusable characters divided by total characters
+    """
+    seen: List[str] = []
+    recent: deque = deque()
+    reused = total = 0
+    for text in texts:
+        if window is not None and len(recent) >= window:
+            oldest = recent.popleft()
+            del seen[bisect.bisect_left(seen, oldest)]
+        pos = bisect.bisect_left(seen, text)
+        best = 0
+        # The earlier prompt with the longest common prefix is a sorted neighbour.
+        for neighbour in seen[max(pos - 1, 0) : pos + 1]:
+            best = max(best, common_prefix_length(neighbour, text))
+        reused += best
+        total += len(text)
+        seen.insert(pos, text)
+        recent.append(text)
+    return reused / total if total else 0.0
+
+
+def generate_in_batches(
+    generate_fn: Callable[[List[T]], List[str]],
+    inputs: Sequence[T],
+    batch_size: int,
+    lengths: Optional[Sequence[int]] = None,
+    after_batch: Optional[Callable[[], None]] = None,
+    group_by_prefix: bool = False,
+    on_result: Optional[Callable[[int, str], None]] = None,
+) -> List[str]:
+    """
+    Dispatch inputs to an engine in batches and return outputs in input order.
+
+    Args:
+        generate_fn: callable generating the outputs of one batch of inputs
+        inputs: model inputs, e.g. chat-template strings
+        batch_size: number of inputs per call to `generate_fn`
+        lengths: token length of each input; when given, batches are
+                 bucketed by length instead of following input order
+        after_batch: optional callback run after each batch
+        group_by_prefix: dispatch prompts sharing a prefix back to back,
+                         takes precedence over `lengths`; inputs must be strings
+        on_result: optional callback `on_result(index, output)` run for each
+                   output as soon as its batch completes
+    Returns:
+        outputs: List[str], one output per input, in input order
+    """
+    if group_by_prefix:
+        batches = prefix_grouped_batches(inputs, batch_size)
+    elif lengths is None:
+        batches = [
+            list(range(i, min(i + batch_size, len(inputs))))
+            for i in range(0, len(inputs), batch_size)
+        ]
+    else:
+        batches = length_bucketed_batches(lengths, batch_size)
+
+    # The estimate compares every prompt with a window of earlier ones, so it
+    # only runs when prefix grouping is on or debug logging asks for it
+    log_level = logging.INFO if group_by_prefix else logging.DEBUG
+    if inputs and isinstance(inputs[0], str) and logger.isEnabledFor(log_level):
+        hit_rate = estimate_prefix_hit_rate(
+            [inputs[i] for batch in batches for i in batch], window=batch_size
+        )
+        logger.log(
+            log_level,
+            f"Estimated prefix cache hit rate: {hit_rate:.1%} (cache of the last {batch_size} prompts)",
+        )
+
+    outputs: List[Optional[str]] = [None] * len(inputs)
+    start_time = time.time()
+    for batch_idx, batch in enumerate(tqdm(batches)):
+        results = generate_fn([inputs[i] for i in batch])
+        for i, result in zip(batch, results):
+            outputs[i] = result
+            if on_result is not None:
+                on_result(i, result)
+        if after_batch is not None:
+            after_batch()
+        if batch_idx == 0 and batch:
+            logger.info(f"First generated result: {outputs[batch[0]]}")
+
+    elapsed = max(time.time() - start_time, 1e-9)
+    message = f"Generated {len(inputs)} prompts in {elapsed:.1f}s ({len(inputs) / elapsed:.2f} prompts/s"
+    if lengths is not None:
+        message += f", {sum(lengths) / elapsed:.0f} prompt tokens/s, length-bucketed"
+    logger.info(message + ")")
+    return outputs
@@ -0,0 +1,418 @@
+"""
+Request limits for the API backends.
+
+`RequestLimiter` enforces three independent limits: requests in flight,
+requests per second and tokens per minute. The token limit charges each
+request an estimate of its prompt tokens (`estimate_tokens`) when it is
+sent and settles the difference with the usage the response reports, so a
+run of long prompts is slowed before the provider's quota is hit.
+
+`AIMDController` adapts two of them, requests in flight and requests per
+second, and adjusts them the way TCP adjusts its congestion window. Each
+round of successful requests (as many as the concurrency limit) raises the
+limit that held requests back during the round additively, or doubles it
+until the first congestion signal (slow start). A 429 or 5xx response cuts
+both limits multiplicatively; a smoothed latency above `latency_tolerance`
+times the lowest smoothed latency seen means requests queue at the endpoint
+and cuts the concurrency limit. Requests already in flight when a cut
+happens cannot cause another one, so a burst of 429s halves the limits once,
+not once per request. A ``Retry-After`` header pauses every new request
+until it expires.
+
+Neither sleeps: `try_acquire` returns a ticket or the time to wait, so the
+threaded backends sleep and the asyncio backends await outside the lock.
+"""
+
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+
+from ..logger import get_logger
+
+logger = get_logger()
+
+# Seconds between checks of the concurrency limit while it is reached
+CONCURRENCY_POLL_INTERVAL = 0.01
+
+# Upper bound on a honoured Retry-After, in seconds
+MAX_RETRY_AFTER = 300.0
+
+# Smoothing of the latency average and samples needed before it is trusted
+LATENCY_EWMA_ALPHA = 0.1
+LATENCY_MIN_SAMPLES = 10
+
+# Latency increase below which queueing is not assumed, in seconds; keeps
+# scheduling noise of millisecond-scale endpoints from cutting the limits
+LATENCY_MIN_INCREASE = 0.25
+
+
+# Tokens charged per chat message on top of its content
+TOKENS_PER_MESSAGE = 4
+
+_CJK_PATTERN = re.compile(r"[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+
+def estimate_tokens(messages: List[Dict[str, str]]) -> int:
+    """
+    Rough prompt token count of chat messages without a tokenizer.
+
+    Counts one token per CJK character and one per four other characters,
+    which errs on the high side for most BPE vocabularies.
+    """
+    total = 0
+    for message in messages:
+        text = message.get("content") or ""
+        cjk = len(_CJK_PATTERN.findall(text))
+        total += cjk + (len(text) - cjk + 3) // 4 + TOKENS_PER_MESSAGE
+    return total
+
+
+def parse_retry_after(value) -> Optional[float]:
+    """Seconds to wait from a ``Retry-After`` header (delay seconds or HTTP date)."""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def throttle_info(exception) -> Tuple[bool, Optional[float]]:
+    """
+    Whether an API exception signals an overloaded endpoint, and its Retry-After.
+
+    Understands `requests.HTTPError` (with a response), `aiohttp.ClientResponseError`
+    and `openai.APIStatusError` without importing them.
+
+    Returns:
+        (throttled, retry_after): throttled for 429 and 5xx responses
+    """
+    response = getattr(exception, "response", None)
+    status = getattr(exception, "status_code", None) or getattr(exception, "status", None)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None)
+    headers = getattr(exception, "headers", None)
+    if headers is None and response is not None:
+        headers = getattr(response, "headers", None)
+    throttled = isinstance(status, int) and (status == 429 or status >= 500)
+    retry_after = parse_retry_after(headers.get("Retry-After")) if headers else None
+    return throttled, retry_after
+
+
+class RequestLimiter:
+    """Independent limits on requests in flight, requests per second and tokens per minute.
+
+    A limit of None is not enforced. Thread-safe; shared by the worker
+    threads of `APIInferenceBase` or the coroutines of `AsyncAPIInferenceBase`.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        requests_per_second: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+    ):
+        """
+        Args:
+            max_concurrency: requests in flight
+            requests_per_second: request rate, with bursts of up to one second of requests
+            tokens_per_minute: prompt and completion tokens per minute, with
+                               bursts of up to one minute of tokens
+        """
+        self.max_concurrency = max_concurrency
+        self.concurrency: Optional[float] = (
+            float(max_concurrency) if max_concurrency is not None else None
+        )
+        self.rate: Optional[float] = (
+            float(requests_per_second) if requests_per_second is not None else None
+        )
+        self.tokens_per_minute = tokens_per_minute
+
+        self.lock = threading.Lock()
+        self.start_time = time.monotonic()
+        self.last_refill = self.start_time
+        self.request_tokens = max(self.rate or 1.0, 1.0)
+        self.token_budget = float(tokens_per_minute or 0)
+        self.pause_until = 0.0
+        self.in_flight = 0
+        self.issued = 0
+        # Estimated tokens charged to each request in flight, by ticket
+        self.estimates: Dict[int, int] = {}
+        # Limit that last made a request wait: "concurrency", "rate", "tokens" or None
+        self.bound: Optional[str] = None
+        self.num_success = 0
+        self.num_throttled = 0
+        self.estimated_tokens = 0
+        self.used_tokens = 0
+
+    def _refill(self, now: float):
+        elapsed = now - self.last_refill
+        self.last_refill = now
+        if self.rate:
+            self.request_tokens = min(max(self.rate, 1.0), self.request_tokens + elapsed * self.rate)
+        if self.tokens_per_minute:
+            self.token_budget = min(
+                self.tokens_per_minute, self.token_budget + elapsed * self.tokens_per_minute / 60
+            )
+
+    def try_acquire(self, estimated_tokens: int = 0) -> Tuple[Optional[int], float]:
+        """
+        Start a request if the limits allow it.
+
+        Args:
+            estimated_tokens: tokens charged to the tokens-per-minute limit
+        Returns:
+            (ticket, 0.0) if the request may be sent now, to be passed to
+            `release`; else (None, seconds to wait before trying again)
+        """
+        with self.lock:
+            now = time.monotonic()
+            if now < self.pause_until:
+                return None, self.pause_until - now
+            if self.concurrency is not None and self.in_flight >= int(self.concurrency):
+                self.bound = "concurrency"
+                return None, CONCURRENCY_POLL_INTERVAL
+            self._refill(now)
+            if self.rate and self.request_tokens < 1:
+                self.bound = "rate"
+                return None, (1 - self.request_tokens) / self.rate
+            if self.tokens_per_minute:
+                # A prompt larger than the whole quota waits for a full minute's budget
+                needed = min(estimated_tokens, self.tokens_per_minute)
+                if self.token_budget < needed:
+                    self.bound = "tokens"
+                    return None, (needed - self.token_budget) * 60 / self.tokens_per_minute
+                self.token_budget -= estimated_tokens
+            if self.rate:
+                self.request_tokens -= 1
+            self.in_flight += 1
+            self.issued += 1
+            self.estimates[self.issued] = estimated_tokens
+            return self.issued, 0.0
+
+    def release(
+        self,
+        ticket: int,
+        latency: Optional[float] = None,
+        throttled: bool = False,
+        retry_after: Optional[float] = None,
+        used_tokens: Optional[int] = None,
+    ):
+        """
+        Report the outcome of a request started with `try_acquire`.
+
+        Args:
+            ticket: ticket returned by `try_acquire`
+            latency: seconds the request took, for successful requests
+            throttled: the endpoint answered 429 or 5xx
+            retry_after: the response's Retry-After, in seconds
+            used_tokens: total tokens the response reports; the difference to
+                         the estimate is settled with the tokens-per-minute budget
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.in_flight -= 1
+            estimate = self.estimates.pop(ticket, 0)
+            if throttled:
+                # Rejected requests do not count against the provider's quota
+                self.token_budget += estimate
+            elif latency is not None:
+                self.estimated_tokens += estimate
+                if used_tokens is not None:
+                    self.used_tokens += used_tokens
+                    self.token_budget -= used_tokens - estimate
+                else:
+                    self.used_tokens += estimate
+            if retry_after:
+                self.pause_until = max(self.pause_until, now + min(retry_after, MAX_RETRY_AFTER))
+            if throttled:
+                self.num_throttled += 1
+            elif latency is not None:
+                self.num_success += 1
+            self._on_outcome(ticket, now, latency, throttled)
+
+    def _on_outcome(self, ticket: int, now: float, latency: Optional[float], throttled: bool):
+        """Adjust the limits after a request; fixed limits are left unchanged."""
+
+    def _log_limits(self):
+        concurrency = "unlimited" if self.concurrency is None else int(self.concurrency)
+        rate = "unlimited" if self.rate is None else f"{self.rate:.1f}/s"
+        tokens = ""
+        if self.tokens_per_minute:
+            tokens = (
+                f", tokens used {self.used_tokens} (estimated {self.estimated_tokens}) "
+                f"of {self.tokens_per_minute:.0f}/min"
+            )
+        logger.info(
+            f"Request limits: concurrency \033[34m{concurrency}\033[0m, "
+            f"rate \033[34m{rate}\033[0m, throttled {self.num_throttled}{tokens}"
+        )
+
+    def log_limits(self):
+        """Log the current limits and counters."""
+        with self.lock:
+            self._log_limits()
+
+    def summary(self) -> Dict:
+        """Current limits and counters."""
+        with self.lock:
+            return {
+                "concurrency": None if self.concurrency is None else int(self.concurrency),
+                "rate": self.rate,
+                "tokens_per_minute": self.tokens_per_minute,
+                "success": self.num_success,
+                "throttled": self.num_throttled,
+                "estimated_tokens": self.estimated_tokens,
+                "used_tokens": self.used_tokens,
+            }
+
+
+class AIMDController(RequestLimiter):
+    """Additive-increase / multiplicative-decrease concurrency and rate limits.
+
+    The tokens-per-minute limit, if any, stays fixed.
+    """
+
+    def __init__(
+        self,
+        initial_concurrency: int = 10,
+        initial_rate: float = 10.0,
+        min_concurrency: int = 1,
+        max_concurrency: int = 256,
+        min_rate: float = 0.5,
+        max_rate: float = 1000.0,
+        rate_step: float = 1.0,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 2.0,
+        log_interval: float = 30.0,
+        tokens_per_minute: Optional[float] = None,
+    ):
+        """
+        Args:
+            initial_concurrency: requests in flight at the start
+            initial_rate: requests per second at the start
+            min_concurrency, max_concurrency: bounds of the concurrency limit
+            min_rate, max_rate: bounds of the rate limit
+            rate_step: rate added per round of successful requests
+            decrease_factor: factor applied to the limits on congestion
+            latency_tolerance: cut when the smoothed latency exceeds this multiple
+                               of the lowest smoothed latency seen (0 disables)
+            log_interval: seconds between log lines with the current limits
+            tokens_per_minute: fixed token limit, see `RequestLimiter`
+        """
+        super().__init__(max_concurrency, initial_rate, tokens_per_minute)
+        self.min_concurrency = min_concurrency
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.concurrency = float(min(max(initial_concurrency, min_concurrency), max_concurrency))
+        self.rate = float(min(max(initial_rate, min_rate), max_rate))
+        self.request_tokens = 1.0
+        self.rate_step = rate_step
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.log_interval = log_interval
+
+        self.last_log = self.start_time
+        self.slow_start = True
+        self.cut_at = 0
+        self.round_successes = 0
+        self.latency_ewma: Optional[float] = None
+        self.latency_samples = 0
+        self.latency_baseline: Optional[float] = None
+        self.num_decreases = 0
+        # (seconds since start, concurrency limit, rate limit) after every change
+        self.history: List[Tuple[float, int, float]] = [(0.0, int(self.concurrency), self.rate)]
+
+    def _on_outcome(self, ticket: int, now: float, latency: Optional[float], throttled: bool):
+        # Requests that failed otherwise (e.g. a 400) leave the limits unchanged
+        if throttled:
+            self._decrease(ticket, now, "throttled")
+        elif latency is not None:
+            if self._latency_rising(latency):
+                self._decrease(ticket, now, "latency")
+            else:
+                self._increase(now)
+        if now - self.last_log >= self.log_interval:
+            self.last_log = now
+            self._log_limits()
+
+    def _latency_rising(self, latency: float) -> bool:
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += LATENCY_EWMA_ALPHA * (latency - self.latency_ewma)
+        self.latency_samples += 1
+        if not self.latency_tolerance or self.latency_samples < LATENCY_MIN_SAMPLES:
+            return False
+        if self.latency_baseline is None or self.latency_ewma < self.latency_baseline:
+            self.latency_baseline = self.latency_ewma
+        return (
+            self.latency_ewma > self.latency_tolerance * self.latency_baseline
+            and self.latency_ewma - self.latency_baseline > LATENCY_MIN_INCREASE
+        )
+
+    def _increase(self, now: float):
+        self.round_successes += 1
+        if self.round_successes < int(self.concurrency):
+            return
+        self.round_successes = 0
+        # Only raise the limit that held requests back during the round
+        bound, self.bound = self.bound, None
+        if bound not in ("concurrency", "rate"):
+            # Nothing held requests back, or the fixed token limit did
+            return
+        concurrency, rate = self.concurrency, self.rate
+        if bound == "concurrency":
+            concurrency = concurrency * 2 if self.slow_start else concurrency + 1
+        else:
+            rate = rate * 2 if self.slow_start else rate + self.rate_step
+        self._set_limits(now, concurrency, rate)
+
+    def _decrease(self, ticket: int, now: float, reason: str):
+        # Requests sent before the last cut reflect the old limits
+        if ticket <= self.cut_at:
+            return
+        self.cut_at = self.issued
+        self.slow_start = False
+        self.round_successes = 0
+        self.num_decreases += 1
+        rate = self.rate * self.decrease_factor
+        if reason == "latency":
+            # Queueing at the endpoint: fewer requests in flight, same rate.
+            # Judge the new limit on fresh samples
+            rate = self.rate
+            self.latency_ewma = None
+            self.latency_samples = 0
+        self._set_limits(now, self.concurrency * self.decrease_factor, rate)
+        logger.debug(
+            f"Adaptive limits cut ({reason}): concurrency {int(self.concurrency)}, rate {self.rate:.1f}/s"
+        )
+
+    def _set_limits(self, now: float, concurrency: float, rate: float):
+        self.concurrency = min(max(concurrency, self.min_concurrency), self.max_concurrency)
+        self.rate = min(max(rate, self.min_rate), self.max_rate)
+        self.history.append((now - self.start_time, int(self.concurrency), self.rate))
+
+    def _log_limits(self):
+        latency = f"{self.latency_ewma:.2f}s" if self.latency_ewma is not None else "n/a"
+        tokens = ""
+        if self.tokens_per_minute:
+            tokens = f", tokens used {self.used_tokens} (estimated {self.estimated_tokens})"
+        logger.info(
+            f"Adaptive limits: concurrency \033[34m{int(self.concurrency)}\033[0m, "
+            f"rate \033[34m{self.rate:.1f}/s\033[0m, in flight {self.in_flight}, "
+            f"latency {latency}, throttled {self.num_throttled}, cuts {self.num_decreases}{tokens}"
+        )
+
+    def summary(self) -> Dict:
+        """Current limits and counters."""
+        summary = super().summary()
+        with self.lock:
+            summary.update({"decreases": self.num_decreases, "latency": self.latency_ewma})
+        return summary
@@ -1,10 +1,13 @@
+import json
 import re
-from typing import Dict, List, Optional
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import torch
-from tqdm import tqdm
 
+from ..cache import cache_key
 from ..logger import get_logger
+from .batching import generate_in_batches
 
 logger = get_logger()
 
@@ -35,8 +38,20 @@ def transfer_dict_conv(
 
 class CommonModelVllm:
     def __init__(
-        self, plm="/mntnlp/common_base_model/Qwen__Qwen2.5-7B-Instruct"
+        self,
+        plm="/mntnlp/common_base_model/Qwen__Qwen2.5-7B-Instruct",
+        bucket_by_length=True,
+        group_by_prefix=False,
     ):
+        """
+        Args:
+            plm: local model path
+            bucket_by_length: pre-tokenize the templated prompts and dispatch
+                              batches of similar length, restoring input order
+                              in the outputs
+            group_by_prefix: dispatch prompts sharing a prefix back to back so
+                             the prefix cache gets hits, overrides bucket_by_length
+        """
         if not VLLM_AVAILABLE:
             raise ImportError("vLLM is not installed. Please install it with: pip install vllm")
         
@@ -50,36 +65,149 @@ class CommonModelVllm:
             gpu_memory_utilization=0.9,
         )
         self.tokenizer = self.model.get_tokenizer()
+        self.plm = plm
+        self.bucket_by_length = bucket_by_length
+        self.group_by_prefix = group_by_prefix
+        # Optional ResponseCache consulted before each batch is dispatched
+        self.response_cache = None
 
-    def batch_generate(
-        self, data, temperature=0.0, system="", top_p=0.8, batch_size=16
-    ):
-        sampling_params = SamplingParams(
-            temperature=temperature, top_p=top_p, max_tokens=800
-        )
+    def chat_template_kwargs(self) -> Dict[str, Any]:
+        """Extra keyword arguments passed to `apply_chat_template`."""
+        return {}
+
+    def apply_chat_template(self, data):
         if isinstance(data[0], str):
-            data = list(map(self.process_special_token, range(len(data))))
+            return list(map(self.process_special_token, range(len(data))))
         elif isinstance(data[0], list):
-            data = self.tokenizer.apply_chat_template(
-                data, tokenize=False, add_generation_prompt=True
+            return self.tokenizer.apply_chat_template(
+                data,
+                tokenize=False,
+                add_generation_prompt=True,
+                **self.chat_template_kwargs(),
             )
         else:
             raise ValueError(
                 "data must be a list of strings or a list of lists"
             )
 
-        generate_result = []
+    def _cache_key(self, messages, temperature, top_p) -> str:
+        backend = f"vllm {json.dumps(self.chat_template_kwargs(), sort_keys=True)}"
+        return cache_key(self.plm, messages, temperature, top_p, backend)
 
-        for i in tqdm(range(0, len(data), batch_size)):
-            model_inputs = data[i : i + batch_size]
-            generated_ids = self.model.generate(model_inputs, sampling_params)
+    def _cache_lookup(self, data, temperature, top_p) -> Tuple[Optional[List[str]], List[Optional[str]]]:
+        """Cache keys of `data` (None when not cached) and the cached outputs, None where missing."""
+        cache = self.response_cache
+        if cache is None or not cache.cacheable(temperature):
+            return None, [None] * len(data)
+        keys = [self._cache_key(messages, temperature, top_p) for messages in data]
+        return keys, cache.get_many(keys)
 
-            for output in generated_ids:
-                generate_result.append(output.outputs[0].text)
+    def batch_generate(
+        self, data, temperature=0.0, system="", top_p=0.8, batch_size=16, on_result=None
+    ):
+        sampling_params = SamplingParams(
+            temperature=temperature, top_p=top_p, max_tokens=800
+        )
+        keys, outputs = self._cache_lookup(data, temperature, top_p)
+        missing = [i for i, output in enumerate(outputs) if output is None]
+        if on_result is not None and len(missing) < len(data):
+            for i, output in enumerate(outputs):
+                if output is not None:
+                    on_result(i, output)
+        if not missing:
+            if keys is not None:
+                self.response_cache.log_stats()
+            return outputs
+
+        model_inputs = self.apply_chat_template([data[i] for i in missing])
+        pending = []
+
+        def generate_fn(batch):
+            generated_ids = self.model.generate(batch, sampling_params)
+            return [output.outputs[0].text for output in generated_ids]
+
+        def record(j, output):
+            i = missing[j]
+            outputs[i] = output
+            if keys is not None:
+                pending.append((keys[i], output))
+            if on_result is not None:
+                on_result(i, output)
+
+        def after_batch():
+            # Store each batch as it completes so a crash keeps finished batches
+            if pending:
+                self.response_cache.put_many(pending)
+                pending.clear()
             torch.cuda.empty_cache()
-            if i == 0:
-                logger.info(f"First generated result: {generate_result[0]}")
-        return generate_result
+
+        generate_in_batches(
+            generate_fn,
+            model_inputs,
+            batch_size,
+            lengths=(
+                self.prompt_lengths(model_inputs)
+                if self.bucket_by_length and not self.group_by_prefix
+                else None
+            ),
+            after_batch=after_batch,
+            group_by_prefix=self.group_by_prefix,
+            on_result=record,
+        )
+        if keys is not None:
+            self.response_cache.log_stats()
+        return outputs
+
+    def prompt_lengths(self, data: List[str]) -> List[int]:
+        """Token length of each templated prompt."""
+        encoded = self.tokenizer(data, add_special_tokens=False)["input_ids"]
+        return [len(ids) for ids in encoded]
+
+    def stream_generate(
+        self,
+        items: Iterable[Tuple[Any, List[Dict[str, str]]]],
+        temperature=0.0,
+        system="",
+        top_p=0.8,
+        batch_size=16,
+    ) -> Iterator[Tuple[Any, str]]:
+        """
+        Generate responses for a stream of requests, one batch at a time.
+
+        Only `batch_size` prompts are pulled from `items` and templated before
+        each call to the engine, so generation starts after the first batch is
+        rendered and memory is bounded by the batch size. Prompts found in the
+        response cache are not sent to the engine.
+
+        Args:
+            items: iterable of (key, messages); keys are passed through untouched
+        Yields:
+            (key, prediction) in input order
+        """
+        sampling_params = SamplingParams(
+            temperature=temperature, top_p=top_p, max_tokens=800
+        )
+        items = iter(items)
+        while True:
+            chunk = list(islice(items, batch_size))
+            if not chunk:
+                break
+            cache_keys, outputs = self._cache_lookup(
+                [messages for _, messages in chunk], temperature, top_p
+            )
+            missing = [i for i, output in enumerate(outputs) if output is None]
+            if missing:
+                model_inputs = self.apply_chat_template([chunk[i][1] for i in missing])
+                generated_ids = self.model.generate(model_inputs, sampling_params)
+                for i, output in zip(missing, generated_ids):
+                    outputs[i] = output.outputs[0].text
+                if cache_keys is not None:
+                    self.response_cache.put_many((cache_keys[i], outputs[i]) for i in missing)
+                torch.cuda.empty_cache()
+            for (key, _), output in zip(chunk, outputs):
+                yield key, output
+        if self.response_cache is not None:
+            self.response_cache.log_stats()
 
     def single_generate(self, prompt):
         model_inputs = self.tokenizer.apply_chat_template(
@@ -101,107 +229,23 @@ class CommonModelVllm:
 
 
 class InferModelVllm(CommonModelVllm):
-    def batch_generate(
-        self, data, temperature=0.0, system="", top_p=0.8, batch_size=16
-    ):
-        sampling_params = SamplingParams(
-            temperature=temperature, top_p=top_p, max_tokens=800
-        )
-        if isinstance(data[0], str):
-            data = list(map(self.process_special_token, range(len(data))))
-        elif isinstance(data[0], list):
-            data = self.tokenizer.apply_chat_template(
-                data, tokenize=False, add_generation_prompt=True
-            )
-        else:
-            raise ValueError(
-                "data must be a list of strings or a list of lists"
-            )
-
-        generate_result = []
-
-        for i in tqdm(range(0, len(data), batch_size)):
-            model_inputs = data[i : i + batch_size]
-            generated_ids = self.model.generate(model_inputs, sampling_params)
-
-            for output in generated_ids:
-                generate_result.append(output.outputs[0].text)
-            torch.cuda.empty_cache()
-            if i == 0:
-                logger.info(f"First generated result: {generate_result[0]}")
-        return generate_result
-
     def extract_anwer(self, answer):
         return re.sub(r"<think>.*</think>", "", answer, flags=re.DOTALL).strip()
 
 
 class Qwen3Vllm(CommonModelVllm):
-    def __init__(self, plm, think_mode):
-        super().__init__(plm)
+    def __init__(self, plm, think_mode, bucket_by_length=True, group_by_prefix=False):
+        super().__init__(plm, bucket_by_length, group_by_prefix)
         self.think_mode = think_mode
 
-    def batch_generate(
-        self, data, temperature=0.0, system="", top_p=0.8, batch_size=16
-    ):
-        sampling_params = SamplingParams(
-            temperature=temperature, top_p=top_p, max_tokens=800
-        )
-        if isinstance(data[0], str):
-            data = list(map(self.process_special_token, range(len(data))))
-        elif isinstance(data[0], list):
-            data = self.tokenizer.apply_chat_template(
-                data, tokenize=False, add_generation_prompt=True, enable_thinking=self.think_mode
-            )
-        else:
-            raise ValueError(
-                "data must be a list of strings or a list of lists"
-            )
-
-        generate_result = []
-
-        for i in tqdm(range(0, len(data), batch_size)):
-            model_inputs = data[i : i + batch_size]
-            generated_ids = self.model.generate(model_inputs, sampling_params)
-
-            for output in generated_ids:
-                generate_result.append(output.outputs[0].text)
-            torch.cuda.empty_cache()
-            if i == 0:
-                logger.info(f"First generated result: {generate_result[0]}")
-        return generate_result
+    def chat_template_kwargs(self) -> Dict[str, Any]:
+        return {"enable_thinking": self.think_mode}
 
 
 class HiragVllm(CommonModelVllm):
-    def __init__(self, plm, think_mode):
-        super().__init__(plm)
+    def __init__(self, plm, think_mode, bucket_by_length=True, group_by_prefix=False):
+        super().__init__(plm, bucket_by_length, group_by_prefix)
         self.think_mode = think_mode
 
-    def batch_generate(
-        self, data, temperature=0.0, system="", top_p=0.8, batch_size=16
-    ):
-        sampling_params = SamplingParams(
-            temperature=temperature, top_p=top_p, max_tokens=800
-        )
-        if isinstance(data[0], str):
-            data = list(map(self.process_special_token, range(len(data))))
-        elif isinstance(data[0], list):
-            data = self.tokenizer.apply_chat_template(
-                data, tokenize=False, add_generation_prompt=True, add_think_prompt=self.think_mode
-            )
-        else:
-            raise ValueError(
-                "data must be a list of strings or a list of lists"
-            )
-
-        generate_result = []
-
-        for i in tqdm(range(0, len(data), batch_size)):
-            model_inputs = data[i : i + batch_size]
-            generated_ids = self.model.generate(model_inputs, sampling_params)
-
-            for output in generated_ids:
-                generate_result.append(output.outputs[0].text)
-            torch.cuda.empty_cache()
-            if i == 0:
-                logger.info(f"First generated result: {generate_result[0]}")
-        return generate_result 
\ No newline at end of file
+    def chat_template_kwargs(self) -> Dict[str, Any]:
+        return {"add_think_prompt": self.think_mode}
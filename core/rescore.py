@@ -0,0 +1,187 @@
+"""
+Rescoring of existing result files without running a model.
+
+The prompt is by far the largest field of a result line and is never needed
+for scoring, so only id, answer and prediction are decoded (see
+`extract_scoring_fields`) and the new label is spliced into the raw line.
+Compact result files keep their header line.
+"""
+
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .eval import checkanswer_acc, save_scores, score_eval_results, scores_path_of
+from .eval_types import EvalResult, EvalResults
+from .logger import get_logger
+from .result_format import extract_scoring_fields, is_header_line
+
+logger = get_logger()
+
+RESULT_FILE_PATTERN = "*_eval_result_*.jsonl"
+
+
+def find_result_files(paths: List[str]) -> List[str]:
+    """Expand directories into the result files they contain, keeping files as given."""
+    result_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            result_files.extend(sorted(glob.glob(os.path.join(path, RESULT_FILE_PATTERN))))
+        else:
+            result_files.append(path)
+    return result_files
+
+
+def iter_scoring_fields(input_path: str) -> Iterator[Tuple[str, str, str, int, int]]:
+    """
+    Stream the scoring fields of a result file.
+
+    Yields:
+        (id, answer, prediction, label, label_start) per result, see
+        `extract_scoring_fields` for label_start
+    """
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line or is_header_line(line):
+                continue
+            result_id, answer, prediction, label_start = extract_scoring_fields(line)
+            label = int(line[label_start:-1]) if label_start >= 0 else json.loads(line)["label"]
+            yield result_id, answer, prediction, label, label_start
+
+
+def rescore_file(
+    input_path: str,
+    output_path: Optional[str] = None,
+    is_infer_model: bool = False,
+    normalize: str = "lower",
+    engine: str = "substring",
+    bootstrap_resamples: int = 1000,
+    score_workers: int = 1,
+) -> Dict:
+    """
+    Re-apply `checkanswer_acc` to a result file and rewrite its labels and scores.
+
+    Args:
+        input_path: result file written by `EvalResults.save_to_jsonl`
+        output_path: rescored result file, defaults to rewriting `input_path`
+        is_infer_model: strip ``<think>...</think>`` blocks before matching
+        normalize: answer and prediction normalization, see `checkanswer_acc`
+        engine: scoring engine, see `checkanswer_acc`
+        bootstrap_resamples: bootstrap resamples for the score confidence intervals (0 disables)
+        score_workers: processes scoring chunks of the file's rows, see `checkanswer_acc`
+    Returns:
+        summary with the output paths, row counts and new scores
+    """
+    output_path = output_path or input_path
+    ids: List[str] = []
+    answers: List[str] = []
+    predictions: List[str] = []
+    old_labels: List[int] = []
+    label_starts: List[int] = []
+    for result_id, answer, prediction, label, label_start in iter_scoring_fields(input_path):
+        ids.append(result_id)
+        answers.append(answer)
+        predictions.append(prediction)
+        old_labels.append(label)
+        label_starts.append(label_start)
+
+    if not ids:
+        logger.warning(f"No results in {input_path}, skipping")
+        return {"input_path": input_path, "output_path": None, "num_results": 0}
+
+    _, labels = checkanswer_acc(
+        predictions,
+        answers,
+        is_infer_model=is_infer_model,
+        normalize=normalize,
+        engine=engine,
+        num_workers=score_workers,
+    )
+
+    # Second pass: copy each line and splice in the new label
+    tmp_path = f"{output_path}.tmp"
+    with open(input_path, "r", encoding="utf-8") as f_in, open(
+        tmp_path, "w", encoding="utf-8"
+    ) as f_out:
+        rows = iter(zip(labels, label_starts))
+        for line in f_in:
+            line = line.rstrip("\n")
+            if not line:
+                continue
+            if is_header_line(line):
+                f_out.write(line + "\n")
+                continue
+            label, label_start = next(rows)
+            if label_start >= 0:
+                f_out.write(f"{line[:label_start]}{label}}}\n")
+            else:
+                data = json.loads(line)
+                data["label"] = label
+                f_out.write(json.dumps(data, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, output_path)
+
+    eval_results = EvalResults()
+    for result_id, answer, prediction, label in zip(ids, answers, predictions, labels):
+        eval_results.add_result(
+            EvalResult(
+                id=result_id, query="", prompt="", answer=answer, prediction=prediction, label=label
+            )
+        )
+    score_eval_results(eval_results, bootstrap_resamples)
+    # Overwrite the scores file eval.py wrote, keeping the per-config name of a sweep
+    per_config_scores = os.path.exists(scores_path_of(input_path, per_config_scores=True))
+    scores_path = scores_path_of(output_path, per_config_scores)
+    save_scores(eval_results, scores_path)
+
+    num_changed = sum(old != new for old, new in zip(old_labels, labels))
+    logger.info(
+        f"Rescored \033[34m{len(labels)} eval_results\033[0m ({num_changed} labels changed) to \033[31m{output_path}\033[0m"
+    )
+    return {
+        "input_path": input_path,
+        "output_path": output_path,
+        "scores_path": scores_path,
+        "num_results": len(labels),
+        "num_changed": num_changed,
+        "acc_scores": eval_results.acc_scores,
+        "acc_scores_by_rag_class_all": eval_results.acc_scores_by_rag_class_all,
+    }
+
+
+def rescore_files(
+    input_paths: List[str],
+    output_dir: Optional[str] = None,
+    num_workers: int = 1,
+    **options,
+) -> List[Dict]:
+    """
+    Rescore several result files, one process per file when `num_workers` > 1.
+
+    Args:
+        input_paths: result files
+        output_dir: directory of the rescored files, defaults to rewriting in place
+        num_workers: number of files rescored in parallel
+        options: passed to `rescore_file`
+    Returns:
+        one summary per file, in input order
+    """
+    output_paths = [
+        os.path.join(output_dir, os.path.basename(path)) if output_dir else path
+        for path in input_paths
+    ]
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    if num_workers <= 1 or len(input_paths) <= 1:
+        return [
+            rescore_file(path, output_path, **options)
+            for path, output_path in zip(input_paths, output_paths)
+        ]
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = [
+            executor.submit(rescore_file, path, output_path, **options)
+            for path, output_path in zip(input_paths, output_paths)
+        ]
+        return [future.result() for future in futures]
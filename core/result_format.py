@@ -0,0 +1,206 @@
+"""
+Compact result files.
+
+A full result file stores every rendered prompt, system prompt and docs
+included, which makes it larger than the dataset. A compact result file
+starts with a header line naming the dataset and prompt config with their
+SHA-256 hashes. Each row's ``prompt`` is a descriptor: sample id, placeholder
+index, chosen noise doc indices per level and the doc permutation, see
+`DataPreprocess.compact_descriptor`.
+
+Rows of both formats have the keys id, query, prompt, answer, prediction,
+label in that order, so fields can be taken from a line without decoding the
+prompt: `extract_scoring_fields` locates the top-level ``"answer"`` key from
+the end of the line. A quote inside a JSON string is always escaped, so the
+unescaped key pattern can only match at the top level.
+
+`EvalResults.load_from_jsonl` wraps compact prompts in `LazyPrompt`, which
+keeps the descriptor as raw JSON and loads the dataset and renders the
+prompt the first time it is accessed.
+"""
+
+import hashlib
+import json
+from collections.abc import Sequence
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from .logger import get_logger
+
+logger = get_logger()
+
+COMPACT_FORMAT = "prgb-compact-v1"
+
+HEADER_PREFIX = '{"format": '
+ID_PREFIX = '{"id": '
+QUERY_KEY = ', "query": '
+PROMPT_KEY = ', "prompt": '
+ANSWER_KEY = ', "answer": '
+PREDICTION_KEY = ', "prediction": '
+LABEL_KEY = ', "label": '
+
+_decoder = json.JSONDecoder()
+
+
+def prompt_config_hash(prompt_config: Dict) -> str:
+    """SHA-256 of a prompt config, independent of key order and formatting."""
+    canonical = json.dumps(prompt_config, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def compact_header(ragdata) -> Dict[str, str]:
+    """Header of a compact result file for prompts generated by `ragdata`."""
+    from .snapshot import file_hash
+
+    return {
+        "format": COMPACT_FORMAT,
+        "data_path": ragdata.data_path,
+        "dataset_sha256": file_hash(ragdata.data_path),
+        "prompt_config_path": ragdata.prompt_config_path,
+        "prompt_config_sha256": prompt_config_hash(ragdata.prompt_config),
+    }
+
+
+def is_header_line(line: str) -> bool:
+    """Whether a result file line is a compact header rather than a result."""
+    return line.startswith(HEADER_PREFIX)
+
+
+def extract_scoring_fields(line: str) -> Tuple[str, str, str, int]:
+    """
+    Extract the fields needed for scoring from one result line.
+
+    Args:
+        line: one line of a result file, without the trailing newline
+    Returns:
+        (id, answer, prediction, label_start), where `line[:label_start]` is
+        everything before the label value
+    """
+    answer_pos = line.rfind(ANSWER_KEY)
+    if line.startswith(ID_PREFIX) and answer_pos != -1:
+        try:
+            result_id, _ = _decoder.raw_decode(line, len(ID_PREFIX))
+            answer, end = _decoder.raw_decode(line, answer_pos + len(ANSWER_KEY))
+            if line.startswith(PREDICTION_KEY, end):
+                prediction, end = _decoder.raw_decode(line, end + len(PREDICTION_KEY))
+                if line.startswith(LABEL_KEY, end) and line.endswith("}"):
+                    return result_id, answer, prediction, end + len(LABEL_KEY)
+        except json.JSONDecodeError:
+            pass
+
+    # Unexpected layout: parse the whole line
+    data = json.loads(line)
+    return data["id"], data["answer"], data["prediction"], -1
+
+
+def split_result_line(line: str) -> Optional[Tuple[str, str, str, str, str, int]]:
+    """
+    Split a result line into its fields without decoding the prompt.
+
+    Returns:
+        (id, query, raw prompt JSON, answer, prediction, label), or None if
+        the line does not have the layout written by `save_to_jsonl`
+    """
+    result_id, answer, prediction, label_start = extract_scoring_fields(line)
+    if label_start < 0:
+        return None
+    try:
+        _, end = _decoder.raw_decode(line, len(ID_PREFIX))
+        if not line.startswith(QUERY_KEY, end):
+            return None
+        query, end = _decoder.raw_decode(line, end + len(QUERY_KEY))
+    except json.JSONDecodeError:
+        return None
+    if not line.startswith(PROMPT_KEY, end):
+        return None
+    prompt_end = line.rfind(ANSWER_KEY)
+    label = int(line[label_start:-1])
+    return result_id, query, line[end + len(PROMPT_KEY) : prompt_end], answer, prediction, label
+
+
+class CompactPromptRenderer:
+    """Renders the compact prompts of one result file.
+
+    The dataset is opened lazily (byte-offset index) on the first render, and
+    its hash and the prompt config's hash must match the header.
+    """
+
+    def __init__(
+        self,
+        header: Dict[str, str],
+        data_path: Optional[str] = None,
+        prompt_config_path: Optional[str] = None,
+    ):
+        if header.get("format") != COMPACT_FORMAT:
+            raise ValueError(f"Unknown result format: {header.get('format')}")
+        self.header = header
+        self.data_path = data_path or header["data_path"]
+        self.prompt_config_path = prompt_config_path or header["prompt_config_path"]
+        self._ragdata = None
+
+    def _load(self):
+        from .data import DataPreprocess
+        from .snapshot import file_hash
+
+        if file_hash(self.data_path) != self.header["dataset_sha256"]:
+            raise ValueError(
+                f"{self.data_path} does not match the dataset the results were generated from"
+            )
+        ragdata = DataPreprocess(self.data_path, self.prompt_config_path, lazy=True)
+        if prompt_config_hash(ragdata.prompt_config) != self.header["prompt_config_sha256"]:
+            raise ValueError(
+                f"{self.prompt_config_path} does not match the prompt config the results were generated with"
+            )
+        return ragdata
+
+    def __call__(self, descriptor: Dict[str, Any]) -> List[Dict[str, str]]:
+        if self._ragdata is None:
+            self._ragdata = self._load()
+        return self._ragdata.render_compact(descriptor)
+
+
+class LazyPrompt(Sequence):
+    """A prompt held as a compact descriptor and rendered on first access.
+
+    Behaves like the list of chat messages it renders to.
+    """
+
+    __slots__ = ("_descriptor", "_renderer", "_messages")
+
+    def __init__(
+        self,
+        descriptor: Union[str, Dict[str, Any]],
+        renderer: Callable[[Dict[str, Any]], List[Dict[str, str]]],
+    ):
+        """
+        Args:
+            descriptor: compact descriptor, or its JSON text decoded on first use
+            renderer: renders a descriptor, e.g. a `CompactPromptRenderer`
+        """
+        self._descriptor = descriptor
+        self._renderer = renderer
+        self._messages: Optional[List[Dict[str, str]]] = None
+
+    @property
+    def descriptor(self) -> Dict[str, Any]:
+        if isinstance(self._descriptor, str):
+            self._descriptor = json.loads(self._descriptor)
+        return self._descriptor
+
+    def render(self) -> List[Dict[str, str]]:
+        if self._messages is None:
+            self._messages = self._renderer(self.descriptor)
+        return self._messages
+
+    def __getitem__(self, i):
+        return self.render()[i]
+
+    def __len__(self) -> int:
+        return len(self.render())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, LazyPrompt):
+            other = other.render()
+        return self.render() == other
+
+    def __repr__(self) -> str:
+        return f"LazyPrompt({self._descriptor})"
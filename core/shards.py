@@ -0,0 +1,112 @@
+"""
+Static sharding of an evaluation across nodes.
+
+Samples are assigned to shards by a stable hash of their id, so every node
+computes the same partition without coordination. Each shard writes its own
+result file; `merge_shard_results` combines them in dataset order so that
+scoring and saving them gives the files of a single-node run.
+"""
+
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from .eval_types import EvalResults
+from .logger import get_logger
+from .result_format import is_header_line
+
+logger = get_logger()
+
+
+def shard_of(sample_id: str, num_shards: int) -> int:
+    """Return the shard a sample id belongs to."""
+    digest = hashlib.sha256(sample_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % num_shards
+
+
+def shard_suffix(shard_index: int, num_shards: int) -> str:
+    """File name suffix of a shard's outputs, empty when not sharded."""
+    if num_shards <= 1:
+        return ""
+    return f".shard{shard_index}-of-{num_shards}"
+
+
+def shard_output_name(path: str) -> str:
+    """File name of a shard's result file with its shard suffix removed."""
+    name = os.path.basename(path)
+    return re.sub(r"\.shard\d+-of-\d+(?=\.jsonl$)", "", name)
+
+
+def read_result_header(path: str) -> Optional[Dict[str, str]]:
+    """Compact header of a result file, or None for a full result file."""
+    with open(path, "r", encoding="utf-8") as f:
+        first_line = f.readline()
+    return json.loads(first_line) if is_header_line(first_line) else None
+
+
+def merge_shard_results(
+    input_paths: List[str], data_path: Optional[str] = None
+) -> Tuple[EvalResults, Optional[Dict[str, str]]]:
+    """Merge per-shard result files into the results of a single-node run.
+
+    Results are put back in dataset order (each sample's results keep their
+    order within its shard), so rows and error lists match a single-node run.
+    Scores are left to `core.eval.score_eval_results`.
+
+    Args:
+        input_paths: result files written by each shard
+        data_path: dataset the shards were run on, giving the sample order;
+                   defaults to the dataset named in a compact header
+    Returns:
+        (merged results, compact header shared by the inputs or None)
+
+    Raises:
+        ValueError: If a sample id appears in more than one shard, or the
+            inputs mix result formats or datasets
+    """
+    headers = [read_result_header(path) for path in input_paths]
+    header = headers[0]
+    for path, other in zip(input_paths[1:], headers[1:]):
+        if other != header:
+            raise ValueError(
+                f"{path} and {input_paths[0]} have different result formats or datasets, "
+                "merge shards saved with the same --result-format"
+            )
+
+    results = []
+    seen_ids = {}
+    for path in input_paths:
+        shard_results = EvalResults.load_from_jsonl(path)
+        shard_ids = {r.id for r in shard_results.results}
+        for idx in shard_ids:
+            if idx in seen_ids:
+                raise ValueError(
+                    f"Sample {idx} appears in both {seen_ids[idx]} and {path}"
+                )
+            seen_ids[idx] = path
+        results.extend(shard_results.results)
+
+    data_path = data_path or (header or {}).get("data_path")
+    if data_path is not None:
+        from .data import LazyRagDataset
+
+        position = {idx: i for i, idx in enumerate(LazyRagDataset(data_path).ids)}
+        missing = [idx for idx in seen_ids if idx not in position]
+        if missing:
+            raise ValueError(f"Sample {missing[0]} is not in {data_path}")
+        # Stable: results of one sample keep their order
+        results.sort(key=lambda r: position[r.id])
+    else:
+        logger.warning(
+            "No dataset given, merged results keep shard order instead of dataset order"
+        )
+
+    merged = EvalResults()
+    for result in results:
+        merged.add_result(result)
+    logger.info(
+        f"Merged \033[34m{len(merged.results)} eval_results\033[0m from {len(input_paths)} shards"
+    )
+    return merged, header
@@ -0,0 +1,254 @@
+"""
+Columnar snapshot cache for parsed benchmark datasets.
+
+Parsing the benchmark JSONL through ``json.loads`` and ``RagData.from_dict`` on
+every run dominates startup for repeated evaluations. A snapshot stores the
+parsed dataset as a set of ``.npy`` columns inside ``<data_path>.snapshot/``:
+
+- ``text.npy``: UTF-8 bytes of every distinct string, NUL separated
+- ``records.npy``: (id, query) string indices per sample
+- ``<field>_offsets.npy`` / ``<field>_values.npy``: ragged doc lists
+- ``ph_*.npy``: ragged placeholder dicts and answers
+
+The snapshot is keyed by the SHA-256 of the source file and rebuilt whenever it
+is stale. Columns are opened with ``mmap_mode="r"``.
+"""
+
+import gc
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .data import PlaceholderItem, RagData
+from .logger import get_logger
+
+logger = get_logger()
+
+SNAPSHOT_VERSION = 1
+
+DOC_FIELDS = (
+    "golden_doc",
+    "noise_doc_level1",
+    "noise_doc_level2",
+    "noise_doc_level3",
+)
+
+
+def file_hash(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """Return the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _StringPool:
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.strings: List[str] = []
+
+    def add(self, text: str) -> int:
+        idx = self.index.get(text)
+        if idx is None:
+            idx = len(self.strings)
+            self.index[text] = idx
+            self.strings.append(text)
+        return idx
+
+
+def write_snapshot(
+    data_list: List[RagData], snapshot_dir: str, source_hash: str
+) -> None:
+    """Write a list of RagData objects as a columnar snapshot."""
+    pool = _StringPool()
+    records = np.empty((len(data_list), 2), dtype=np.int64)
+    doc_offsets = {k: [0] for k in DOC_FIELDS}
+    doc_values = {k: [] for k in DOC_FIELDS}
+    ph_offsets, ph_kv_offsets = [0], [0]
+    ph_keys, ph_values, ph_answer = [], [], []
+
+    for i, data in enumerate(data_list):
+        records[i] = (pool.add(data.id), pool.add(data.query))
+        for k in DOC_FIELDS:
+            doc_values[k].extend(pool.add(doc) for doc in getattr(data, k))
+            doc_offsets[k].append(len(doc_values[k]))
+        item = data.placeholder_item
+        for placeholder, answer in zip(item.placeholders, item.answer):
+            for key, value in placeholder.items():
+                ph_keys.append(pool.add(key))
+                ph_values.append(pool.add(value))
+            ph_kv_offsets.append(len(ph_keys))
+            ph_answer.append(pool.add(answer))
+        ph_offsets.append(len(ph_answer))
+
+    text = "\0".join(pool.strings)
+    if text.count("\0") != len(pool.strings) - 1:
+        raise ValueError("Strings containing NUL characters cannot be snapshotted")
+
+    columns = {
+        "text": np.frombuffer(text.encode("utf-8"), dtype=np.uint8),
+        "records": records,
+        "ph_offsets": np.asarray(ph_offsets, dtype=np.int64),
+        "ph_kv_offsets": np.asarray(ph_kv_offsets, dtype=np.int64),
+        "ph_keys": np.asarray(ph_keys, dtype=np.int64),
+        "ph_values": np.asarray(ph_values, dtype=np.int64),
+        "ph_answer": np.asarray(ph_answer, dtype=np.int64),
+    }
+    for k in DOC_FIELDS:
+        columns[f"{k}_offsets"] = np.asarray(doc_offsets[k], dtype=np.int64)
+        columns[f"{k}_values"] = np.asarray(doc_values[k], dtype=np.int64)
+
+    # A unique temp dir per writer, so shards cold-loading the same file at
+    # once do not write into each other's snapshot
+    parent, name = os.path.split(os.path.abspath(snapshot_dir))
+    tmp_dir = tempfile.mkdtemp(prefix=f"{name}.tmp", dir=parent)
+    os.chmod(tmp_dir, 0o755)
+    try:
+        _write_columns(tmp_dir, columns, source_hash, len(data_list))
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+        try:
+            os.replace(tmp_dir, snapshot_dir)
+        except OSError:
+            # Another writer installed the same snapshot in between
+            if read_snapshot_meta(snapshot_dir) is None:
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _write_columns(tmp_dir: str, columns: Dict[str, np.ndarray], source_hash: str, num_records: int):
+    for name, column in columns.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), column)
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "version": SNAPSHOT_VERSION,
+                "source_hash": source_hash,
+                "num_records": num_records,
+            },
+            f,
+        )
+
+
+def read_snapshot_meta(snapshot_dir: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(snapshot_dir, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def read_snapshot(snapshot_dir: str) -> List[RagData]:
+    """Rebuild RagData objects from a columnar snapshot."""
+    # Only acyclic containers are created here, so pausing the cyclic GC avoids
+    # repeated full traversals while hundreds of thousands of objects are built.
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _read_snapshot(snapshot_dir)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _read_snapshot(snapshot_dir: str) -> List[RagData]:
+
+    def column(name: str) -> np.ndarray:
+        return np.load(os.path.join(snapshot_dir, f"{name}.npy"), mmap_mode="r")
+
+    pool = np.array(
+        column("text").tobytes().decode("utf-8").split("\0"), dtype=object
+    )
+
+    def strings(name: str) -> List[str]:
+        return pool[column(name)].tolist()
+
+    def ragged(offsets: List[int], values: List) -> List[List]:
+        return [values[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+
+    docs = {}
+    for k in DOC_FIELDS:
+        docs[k] = ragged(column(f"{k}_offsets").tolist(), strings(f"{k}_values"))
+
+    keys, values = strings("ph_keys"), strings("ph_values")
+    kv_offsets = column("ph_kv_offsets").tolist()
+    placeholders = [
+        dict(zip(keys[a:b], values[a:b]))
+        for a, b in zip(kv_offsets[:-1], kv_offsets[1:])
+    ]
+    answers = strings("ph_answer")
+    ph_offsets = column("ph_offsets").tolist()
+    records = pool[column("records")].tolist()
+
+    data_list = []
+    for i, (idx, query) in enumerate(records):
+        a, b = ph_offsets[i], ph_offsets[i + 1]
+        data_list.append(
+            RagData(
+                id=idx,
+                query=query,
+                golden_doc=docs["golden_doc"][i],
+                noise_doc_level1=docs["noise_doc_level1"][i],
+                noise_doc_level2=docs["noise_doc_level2"][i],
+                noise_doc_level3=docs["noise_doc_level3"][i],
+                placeholder_item=PlaceholderItem(
+                    placeholders=placeholders[a:b], answer=answers[a:b]
+                ),
+            )
+        )
+    return data_list
+
+
+def load_with_snapshot(
+    data_path: str, snapshot_dir: Optional[str] = None
+) -> List[RagData]:
+    """Load a RagData JSONL file through its snapshot cache.
+
+    The snapshot is used when its source hash matches the current content of
+    ``data_path``; otherwise the file is parsed and the snapshot rebuilt.
+
+    Args:
+        data_path: path of the benchmark JSONL file
+        snapshot_dir: snapshot directory, defaults to ``<data_path>.snapshot``
+    Returns:
+        data_list: list of RagData
+    """
+    snapshot_dir = snapshot_dir or f"{data_path}.snapshot"
+    start_time = time.time()
+    source_hash = file_hash(data_path)
+
+    meta = read_snapshot_meta(snapshot_dir)
+    if (
+        meta is not None
+        and meta.get("version") == SNAPSHOT_VERSION
+        and meta.get("source_hash") == source_hash
+    ):
+        try:
+            data_list = read_snapshot(snapshot_dir)
+            logger.info(
+                f"Warm load: \033[34m{len(data_list)} benchmark items\033[0m from snapshot \033[31m{snapshot_dir}\033[0m in {time.time() - start_time:.2f}s"
+            )
+            return data_list
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read snapshot {snapshot_dir}, rebuilding: {e}")
+    elif meta is not None:
+        logger.info(f"Snapshot {snapshot_dir} is stale, rebuilding")
+
+    data_list = RagData.from_jsonl(data_path)
+    parse_time = time.time() - start_time
+    try:
+        write_snapshot(data_list, snapshot_dir, source_hash)
+    except (OSError, ValueError) as e:
+        # The parsed data is still valid, e.g. when a string contains NUL
+        logger.warning(f"Could not write snapshot {snapshot_dir}: {e}")
+    logger.info(
+        f"Cold load: parsed {len(data_list)} benchmark items in {parse_time:.2f}s, snapshot written in {time.time() - start_time - parse_time:.2f}s"
+    )
+    return data_list
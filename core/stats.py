@@ -0,0 +1,246 @@
+"""
+Confidence intervals and significance tests for evaluation scores.
+
+Scores are means over sample ids of each id's mean label, so the bootstrap
+resamples sample ids: each resample draws every class's ids with
+replacement and recomputes the overall and per-class means. Resamples are
+drawn as one index matrix per chunk and reduced with NumPy, so a thousand
+resamples over ten thousand ids take a fraction of a second.
+
+Two result files are compared with a paired bootstrap over the ids they share
+and with McNemar's test over their paired labels.
+"""
+
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .logger import get_logger
+
+logger = get_logger()
+
+# Upper bound on the elements of one resample index matrix
+MAX_CHUNK_ELEMENTS = 1 << 22
+
+# McNemar's test is exact (binomial) below this many discordant pairs
+MCNEMAR_EXACT_BELOW = 25
+
+
+def bootstrap_means(
+    scores: np.ndarray,
+    groups: Optional[np.ndarray] = None,
+    num_groups: int = 0,
+    num_resamples: int = 1000,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Bootstrap the overall and per-group means of per-id scores.
+
+    Resampling is stratified by group: each resample draws every group's ids
+    with replacement and keeps the group sizes, which are fixed by the
+    benchmark's composition.
+
+    Args:
+        scores: score of each sample id
+        groups: group code of each sample id, in [0, num_groups); None for a single group
+        num_groups: number of groups
+        num_resamples: number of bootstrap resamples
+        seed: seed of the resampling generator
+    Returns:
+        means: array of shape (num_resamples, 1 + num_groups), the overall mean
+               followed by each group's mean
+    """
+    rng = np.random.default_rng(seed)
+    if groups is None:
+        strata = [scores]
+    else:
+        strata = [scores[groups == group] for group in range(num_groups)]
+    num_ids = len(scores)
+    sums = np.zeros((num_resamples, len(strata)))
+    chunk = max(1, MAX_CHUNK_ELEMENTS // max(num_ids, 1))
+    for start in range(0, num_resamples, chunk):
+        size = min(chunk, num_resamples - start)
+        for group, stratum in enumerate(strata):
+            if len(stratum):
+                idx = rng.integers(0, len(stratum), size=(size, len(stratum)))
+                sums[start : start + size, group] = stratum[idx].sum(axis=1)
+
+    means = np.empty((num_resamples, 1 + num_groups))
+    means[:, 0] = sums.sum(axis=1) / max(num_ids, 1)
+    if groups is not None:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means[:, 1:] = sums / np.array([len(stratum) for stratum in strata])
+    return means
+
+
+def percentile_interval(samples: np.ndarray, confidence: float = 0.95) -> Tuple[float, float]:
+    """Percentile bootstrap interval."""
+    alpha = (1 - confidence) / 2 * 100
+    low, high = np.nanpercentile(samples, [alpha, 100 - alpha])
+    return float(low), float(high)
+
+
+def bootstrap_p_value(samples: np.ndarray) -> float:
+    """Two-sided bootstrap p-value of a difference being zero."""
+    samples = samples[~np.isnan(samples)]
+    if not len(samples):
+        return 1.0
+    tail = min(np.mean(samples <= 0), np.mean(samples >= 0))
+    return float(min(1.0, 2 * tail))
+
+
+def bootstrap_confidence_intervals(
+    scores: np.ndarray,
+    groups: np.ndarray,
+    group_names: Sequence[str],
+    num_resamples: int = 1000,
+    confidence: float = 0.95,
+    seed: int = 0,
+) -> Dict:
+    """
+    Confidence intervals of the overall and per-group scores.
+
+    Args:
+        scores: score of each sample id
+        groups: group code of each sample id, indexing `group_names`
+        group_names: name of each group, e.g. the rag_class_all classes
+        num_resamples: number of bootstrap resamples
+        confidence: confidence level of the intervals
+        seed: seed of the resampling generator
+    Returns:
+        {"confidence", "num_resamples", "overall": [low, high],
+         "by_rag_class": {name: [low, high]}}, groups sorted by name
+    """
+    means = bootstrap_means(scores, groups, len(group_names), num_resamples, seed)
+    return {
+        "confidence": confidence,
+        "num_resamples": num_resamples,
+        "overall": list(percentile_interval(means[:, 0], confidence)),
+        "by_rag_class": {
+            name: list(percentile_interval(means[:, 1 + code], confidence))
+            for code, name in sorted(enumerate(group_names), key=lambda item: item[1])
+        },
+    }
+
+
+def mcnemar_test(labels_a: Sequence[int], labels_b: Sequence[int]) -> Dict:
+    """
+    McNemar's test of two paired label sequences.
+
+    Uses the exact binomial test below `MCNEMAR_EXACT_BELOW` discordant pairs,
+    else the chi-square statistic with continuity correction.
+
+    Returns:
+        {"only_a_correct", "only_b_correct", "statistic", "p_value", "exact"}
+    """
+    labels_a = np.asarray(labels_a, dtype=bool)
+    labels_b = np.asarray(labels_b, dtype=bool)
+    only_a = int(np.sum(labels_a & ~labels_b))
+    only_b = int(np.sum(~labels_a & labels_b))
+    discordant = only_a + only_b
+    exact = discordant < MCNEMAR_EXACT_BELOW
+    if discordant == 0:
+        statistic, p_value = 0.0, 1.0
+    elif exact:
+        statistic = float(min(only_a, only_b))
+        tail = sum(
+            math.factorial(discordant) // (math.factorial(k) * math.factorial(discordant - k))
+            for k in range(min(only_a, only_b) + 1)
+        )
+        p_value = min(1.0, 2 * tail / 2**discordant)
+    else:
+        statistic = (abs(only_a - only_b) - 1) ** 2 / discordant
+        # Survival function of the chi-square distribution with one degree of freedom
+        p_value = math.erfc(math.sqrt(statistic / 2))
+    return {
+        "only_a_correct": only_a,
+        "only_b_correct": only_b,
+        "statistic": statistic,
+        "p_value": p_value,
+        "exact": exact,
+    }
+
+
+def _labels_by_id(input_path: str) -> Dict[str, List[int]]:
+    from .rescore import iter_scoring_fields
+
+    labels: Dict[str, List[int]] = {}
+    for result_id, _, _, label, _ in iter_scoring_fields(input_path):
+        labels.setdefault(result_id, []).append(label)
+    return labels
+
+
+def compare_result_files(
+    path_a: str,
+    path_b: str,
+    num_resamples: int = 10000,
+    confidence: float = 0.95,
+    seed: int = 0,
+) -> Dict:
+    """
+    Paired comparison of two result files over the sample ids they share.
+
+    The paired bootstrap resamples shared ids and reports the score difference
+    (b - a) overall and per rag_class_all. McNemar's test pairs the labels of
+    each shared id in file order, which matches placeholder variants when
+    both runs used the same prompts (e.g. ``--rng-mode per_sample``).
+
+    Returns:
+        summary with both scores, the difference, its interval and p-values
+    """
+    from .eval_types import RAG_CLASS_ALL, rag_class_of
+
+    labels_a = _labels_by_id(path_a)
+    labels_b = _labels_by_id(path_b)
+    shared = sorted(set(labels_a) & set(labels_b))
+    if not shared:
+        raise ValueError(f"{path_a} and {path_b} share no sample ids")
+    if len(shared) < max(len(labels_a), len(labels_b)):
+        logger.warning(
+            f"Comparing the {len(shared)} shared sample ids of {len(labels_a)} and {len(labels_b)}"
+        )
+
+    scores_a = np.array([np.mean(labels_a[i]) for i in shared])
+    scores_b = np.array([np.mean(labels_b[i]) for i in shared])
+    class_codes: Dict[str, int] = {}
+    groups = np.array(
+        [
+            class_codes.setdefault(RAG_CLASS_ALL.get(rag_class_of(i), "infer"), len(class_codes))
+            for i in shared
+        ],
+        dtype=np.int64,
+    )
+    diffs = bootstrap_means(scores_b - scores_a, groups, len(class_codes), num_resamples, seed)
+
+    paired_a: List[int] = []
+    paired_b: List[int] = []
+    for i in shared:
+        pairs = list(zip(labels_a[i], labels_b[i]))
+        paired_a.extend(a for a, _ in pairs)
+        paired_b.extend(b for _, b in pairs)
+
+    by_rag_class = {}
+    for name, code in sorted(class_codes.items()):
+        in_class = groups == code
+        by_rag_class[name] = {
+            "score_a": float(scores_a[in_class].mean()),
+            "score_b": float(scores_b[in_class].mean()),
+            "diff": float((scores_b - scores_a)[in_class].mean()),
+            "interval": list(percentile_interval(diffs[:, 1 + code], confidence)),
+            "p_value": bootstrap_p_value(diffs[:, 1 + code]),
+        }
+    return {
+        "path_a": path_a,
+        "path_b": path_b,
+        "num_ids": len(shared),
+        "score_a": float(scores_a.mean()),
+        "score_b": float(scores_b.mean()),
+        "diff": float((scores_b - scores_a).mean()),
+        "confidence": confidence,
+        "num_resamples": num_resamples,
+        "interval": list(percentile_interval(diffs[:, 0], confidence)),
+        "p_value": bootstrap_p_value(diffs[:, 0]),
+        "by_rag_class": by_rag_class,
+        "mcnemar": mcnemar_test(paired_a, paired_b),
+    }
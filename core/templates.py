@@ -0,0 +1,53 @@
+import re
+from typing import Dict, List
+
+
+class GoldenDocTemplate:
+    """Golden docs of a sample precompiled for placeholder substitution.
+
+    Each doc is split once into literal segments and placeholder slots using a
+    single regex alternation over every placeholder key of the sample (longest
+    key first). Rendering a placeholder variant is then one ``join`` per doc,
+    and values containing another placeholder's key are never substituted again.
+    """
+
+    __slots__ = ("segments", "slots")
+
+    def __init__(self, golden_docs: List[str], placeholders: List[Dict[str, str]]):
+        keys = sorted(
+            {k for placeholder in placeholders for k in placeholder if k},
+            key=len,
+            reverse=True,
+        )
+        self.segments: List[List[str]] = []
+        self.slots: List[range] = []
+        if not keys:
+            self.segments = [[doc] for doc in golden_docs]
+            self.slots = [range(0) for _ in golden_docs]
+            return
+
+        pattern = re.compile("(" + "|".join(map(re.escape, keys)) + ")")
+        for doc in golden_docs:
+            # With a capturing group, odd positions hold the matched keys.
+            parts = pattern.split(doc)
+            self.segments.append(parts)
+            self.slots.append(range(1, len(parts), 2))
+
+    def render(self, placeholder: Dict[str, str]) -> List[str]:
+        """Render the golden docs for one placeholder variant.
+
+        Args:
+            placeholder: mapping from placeholder key to its value
+        Returns:
+            golden_docs_ready: List[str], golden docs with placeholders replaced
+        """
+        golden_docs_ready = []
+        for parts, slots in zip(self.segments, self.slots):
+            if not slots:
+                golden_docs_ready.append(parts[0])
+                continue
+            parts = parts[:]
+            for i in slots:
+                parts[i] = placeholder.get(parts[i], parts[i])
+            golden_docs_ready.append("".join(parts))
+        return golden_docs_ready
@@ -57,6 +57,66 @@ Examples:
         help="Path to the model or API key"
     )
 
+    parser.add_argument(
+        "--api-backend",
+        type=str,
+        default="threads",
+        choices=["threads", "async"],
+        help="API client: 'threads' sends requests from a pool of at most 10 threads; 'async' keeps up to --max-concurrency requests in flight on one event loop"
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=None,
+        help="Maximum API requests in flight (default: 256 with --api-backend async, at most 10 threads otherwise)"
+    )
+    parser.add_argument(
+        "--requests-per-second",
+        type=float,
+        default=None,
+        help="Maximum API requests per second, including retries (default: --batch-size)"
+    )
+    parser.add_argument(
+        "--tokens-per-minute",
+        type=int,
+        default=None,
+        help="Maximum API tokens per minute; prompts are charged an estimate when sent and reconciled with the usage the response reports"
+    )
+    parser.add_argument(
+        "--adaptive-rate",
+        action="store_true",
+        help="Adapt API concurrency and request rate to the endpoint: additive increase while healthy, multiplicative decrease on 429/5xx or rising latency; --requests-per-second (or --batch-size) is the initial rate and --max-concurrency (default 256) the ceiling"
+    )
+    parser.add_argument(
+        "--connect-timeout",
+        type=float,
+        default=10.0,
+        help="Seconds to wait for an API connection to open"
+    )
+    parser.add_argument(
+        "--read-timeout",
+        type=float,
+        default=600.0,
+        help="Seconds to wait for an API response between received bytes"
+    )
+    parser.add_argument(
+        "--cache-path",
+        type=str,
+        default=None,
+        help="SQLite file caching model responses by (model, messages, temperature, top_p, backend); re-runs only send uncached prompts (default: no cache)"
+    )
+    parser.add_argument(
+        "--cache-max-size-mb",
+        type=float,
+        default=1024,
+        help="Size of the cached responses above which the least recently used are evicted, in MiB (0: unbounded)"
+    )
+    parser.add_argument(
+        "--cache-all-temperatures",
+        action="store_true",
+        help="Also cache sampled calls; by default only temperature 0 responses are cached"
+    )
+
     # Data configuration
     parser.add_argument(
         "--data-path",
@@ -71,6 +131,43 @@ Examples:
         help="Number of evaluation iterations. For each query, randomly select n different placeholders to run evaluation. Each placeholder represents a different version of the same query with different variable substitutions."
     )
 
+    parser.add_argument(
+        "--rng-mode",
+        type=str,
+        choices=["legacy", "per_sample"],
+        default="legacy",
+        help="legacy: shared generators, reproduces published numbers; per_sample: generators seeded from (random_seed, sample id, placeholder index), independent of sample order and subset"
+    )
+    parser.add_argument(
+        "--num-workers",
+        type=int,
+        default=1,
+        help="Number of processes rendering prompts (requires --rng-mode per_sample)"
+    )
+    parser.add_argument(
+        "--lazy-load",
+        action="store_true",
+        help="Read samples on demand through a byte-offset index (<data-path>.idx) instead of loading the whole dataset"
+    )
+    parser.add_argument(
+        "--snapshot-cache",
+        action="store_true",
+        help="Load the dataset through a columnar snapshot (<data-path>.snapshot/) keyed by the file's content hash"
+    )
+
+    parser.add_argument(
+        "--num-shards",
+        type=int,
+        default=1,
+        help="Split the dataset into this many shards by a stable hash of the sample id"
+    )
+    parser.add_argument(
+        "--shard-index",
+        type=int,
+        default=0,
+        help="Index of the shard evaluated by this run, in [0, num-shards)"
+    )
+
     # Output configuration
     parser.add_argument(
         "--output-path",
@@ -86,6 +183,12 @@ Examples:
         default='{"noise_doc_level1":4,"noise_doc_level2":4,"noise_doc_level3":1}',
         help="Noise configuration as JSON string"
     )
+    parser.add_argument(
+        "--noise-sweep",
+        type=str,
+        default=None,
+        help='Evaluate several noise configs with one model load: a JSON list of configs, or a grid such as \'{"noise_doc_level1":[0,2,4],"noise_doc_level2":[0,4],"noise_doc_level3":[0,1]}\'; overrides --noise-config'
+    )
     parser.add_argument(
         "--shuffle",
         type=bool,
@@ -104,6 +207,67 @@ Examples:
         default=0.7,
         help="Temperature for text generation"
     )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Render prompts lazily and stream them to the model through bounded queues, scoring each prediction as it returns"
+    )
+    parser.add_argument(
+        "--prompt-layout",
+        type=str,
+        default="shuffled",
+        choices=["shuffled", "prefix_shared"],
+        help="Doc layout: 'shuffled' mixes golden and noise docs; 'prefix_shared' puts a sample's shared noise docs first so its variants share a cacheable prefix"
+    )
+    parser.add_argument(
+        "--deferred-prompts",
+        action="store_true",
+        help="Keep prompts as doc-id descriptors into a deduplicated doc store and render them only when sent or saved"
+    )
+    parser.add_argument(
+        "--result-format",
+        type=str,
+        default="full",
+        choices=["full", "compact"],
+        help="full: result files store rendered prompts; compact: prompt descriptors re-rendered from the dataset on load"
+    )
+    parser.add_argument(
+        "--no-length-bucketing",
+        action="store_true",
+        help="Dispatch vLLM batches in input order instead of bucketing prompts by token length"
+    )
+    parser.add_argument(
+        "--answer-normalize",
+        type=str,
+        default="lower",
+        choices=["lower", "none", "nfkc_lower"],
+        help="Normalization applied to answers and predictions before matching"
+    )
+    parser.add_argument(
+        "--scoring-engine",
+        type=str,
+        default="substring",
+        choices=["substring", "automaton"],
+        help="How answer terms are found in predictions: one substring scan per term, or one Aho-Corasick pass over all terms"
+    )
+    parser.add_argument(
+        "--score-workers",
+        type=int,
+        default=1,
+        help="Number of processes scoring predictions; small result sets are scored in-process"
+    )
+    parser.add_argument(
+        "--score-log-interval",
+        type=float,
+        default=60.0,
+        help="Seconds between log lines with the running accuracy per class while predictions complete (0 to disable)"
+    )
+    parser.add_argument(
+        "--bootstrap-resamples",
+        type=int,
+        default=1000,
+        help="Bootstrap resamples for the confidence intervals of the scores (0 to disable)"
+    )
     parser.add_argument(
         "--custom_config",
         type=str,
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+API Backend Benchmark
+
+This script sends the same requests through the threaded API backend and the
+asyncio backends to a local fake OpenAI-compatible server that answers every
+chat completion after a configurable latency. The server records how many
+requests it held at once, which shows the threaded backend stopping at ten
+in-flight requests while the asyncio backends keep up to --max-concurrency.
+
+The rate_limited and saturated scenarios compare fixed limits with the
+adaptive `AIMDController` against a server that answers 429 above a request
+rate, or slows down beyond a number of requests in flight, and print the
+limits the controller converges to. The token_limited scenario sends prompts
+of very different sizes to a server with a tokens-per-minute quota and
+compares a request-rate limit with a `RequestLimiter` that also limits
+tokens per minute.
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+
+from core.models.api_models import APIModel
+from core.models.async_api_models import (
+    AIOHTTP_AVAILABLE,
+    ASYNC_OPENAI_AVAILABLE,
+    AsyncAPIModel,
+    AsyncOpenAIModel,
+)
+from core.models.rate_control import AIMDController, RequestLimiter, estimate_tokens
+
+
+class FakeOpenAIServer:
+    """Minimal HTTP/1.1 chat completions server on its own event loop thread.
+
+    Supports keep-alive connections and sleeps `latency` seconds (times a
+    random factor in [1 - jitter, 1 + jitter]) before each response. With a
+    `capacity`, latency grows in proportion to the requests in flight beyond
+    it, as on a saturated inference server.
+    """
+
+    def __init__(self, latency=0.5, jitter=0.0, capacity=0, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.capacity = capacity
+        self.host = host
+        self.port = port
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.writers = set()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.requests = 0
+        self.rejected = 0
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/v1/chat/completions"
+
+    def start(self):
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.server = self.loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+            )
+            self.port = self.server.sockets[0].getsockname()[1]
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        async def shutdown():
+            self.server.close()
+            for writer in list(self.writers):
+                writer.close()
+            await asyncio.sleep(0.1)
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    def admit(self):
+        """Return None to serve a request, or (status, headers, payload) to reject it."""
+        return None
+
+    async def respond(self, body):
+        """Return (status, headers, payload) for one request body."""
+        content = body["messages"][-1]["content"]
+        payload = {
+            "choices": [{"message": {"role": "assistant", "content": f"echo: {content[-16:]}"}}],
+            "usage": {
+                "prompt_tokens": len(content) // 4,
+                "completion_tokens": 4,
+                "total_tokens": len(content) // 4 + 4,
+            },
+        }
+        return 200, {}, payload
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self.writers.add(writer)
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                headers = {}
+                for line in head.decode("latin-1").split("\r\n")[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                body = json.loads(await reader.readexactly(int(headers.get("content-length", 0))))
+
+                self.requests += 1
+                rejection = self.admit()
+                if rejection is not None:
+                    self.rejected += 1
+                    status, extra_headers, payload = rejection
+                else:
+                    self.in_flight += 1
+                    self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                    try:
+                        factor = 1 + random.uniform(-self.jitter, self.jitter)
+                        if self.capacity:
+                            factor *= max(1.0, self.in_flight / self.capacity)
+                        await asyncio.sleep(self.latency * factor)
+                        status, extra_headers, payload = await self.respond(body)
+                    finally:
+                        self.in_flight -= 1
+
+                data = json.dumps(payload).encode("utf-8")
+                lines = [f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}"]
+                lines += ["Content-Type: application/json", f"Content-Length: {len(data)}"]
+                lines += [f"{name}: {value}" for name, value in extra_headers.items()]
+                writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + data)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+
+class RateLimitedServer(FakeOpenAIServer):
+    """Fake server answering 429 with Retry-After above `max_rps` requests per second."""
+
+    def __init__(self, max_rps=50.0, retry_after=1, **kwargs):
+        super().__init__(**kwargs)
+        self.max_rps = max_rps
+        self.retry_after = retry_after
+        self.tokens = max_rps
+        self.last_refill = time.monotonic()
+
+    def admit(self):
+        now = time.monotonic()
+        self.tokens = min(self.max_rps, self.tokens + (now - self.last_refill) * self.max_rps)
+        self.last_refill = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return None
+        payload = {"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}}
+        return 429, {"Retry-After": str(self.retry_after)}, payload
+
+
+class TokenLimitedServer(FakeOpenAIServer):
+    """Fake server answering 429 once `max_tpm` prompt tokens were used in the last minute."""
+
+    def __init__(self, max_tpm=60000, retry_after=1, **kwargs):
+        self.max_tpm = max_tpm
+        self.retry_after = retry_after
+        super().__init__(**kwargs)
+
+    def reset_stats(self):
+        # Every run starts with a full quota
+        super().reset_stats()
+        self.budget = self.max_tpm
+        self.last_refill = time.monotonic()
+
+    def admit_tokens(self, tokens):
+        now = time.monotonic()
+        self.budget = min(self.max_tpm, self.budget + (now - self.last_refill) * self.max_tpm / 60)
+        self.last_refill = now
+        if self.budget >= tokens:
+            self.budget -= tokens
+            return None
+        payload = {"error": {"message": "Token rate limit exceeded", "type": "rate_limit_error"}}
+        return 429, {"Retry-After": str(self.retry_after)}, payload
+
+    async def respond(self, body):
+        rejection = self.admit_tokens(len(body["messages"][-1]["content"]) // 4 + 4)
+        if rejection is not None:
+            self.rejected += 1
+            return rejection
+        return await super().respond(body)
+
+
+def make_requests(num_requests, varied=False):
+    """Prompts of about 100 tokens, or between 20 and 2000 tokens if `varied`."""
+    rng = random.Random(0)
+    return [
+        [{
+            "role": "user",
+            "content": f"Question {i}: " + "context " * (rng.choice([10, 50, 1000]) if varied else 50),
+        }]
+        for i in range(num_requests)
+    ]
+
+
+def run_backend(name, model, server, data, args):
+    server.reset_stats()
+    start = time.perf_counter()
+    predictions = model.batch_generate(data, temperature=0.0, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - start
+    errors = sum(str(p).startswith("Error") for p in predictions)
+    print(
+        f"{name:<18} {elapsed:8.2f}s {len(data) / elapsed:10.1f} req/s "
+        f"{server.max_in_flight:>10} {server.connections:>12} {server.rejected:>6} {errors:>7}"
+    )
+
+
+def print_header():
+    print(
+        f"{'backend':<18} {'time':>9} {'throughput':>14} {'in-flight':>10} "
+        f"{'connections':>12} {'429s':>6} {'errors':>7}"
+    )
+
+
+def print_history(controller, step=2.0):
+    """Limits chosen by an adaptive controller, sampled every `step` seconds."""
+    samples = []
+    next_time = 0.0
+    for elapsed, concurrency, rate in controller.history:
+        if elapsed >= next_time:
+            samples.append(f"{elapsed:.0f}s: {concurrency}/{rate:.0f}")
+            next_time = elapsed + step
+    _, concurrency, rate = controller.history[-1]
+    samples.append(f"final: {concurrency}/{rate:.0f}")
+    print(f"{'':<18} concurrency/rate {', '.join(samples)}")
+
+
+def compare_backends(args):
+    """Threaded vs asyncio backends against a server with fixed latency."""
+    server = FakeOpenAIServer(args.latency, args.jitter).start()
+    data = make_requests(args.num_requests)
+    print(
+        f"{args.num_requests} requests, {args.latency}s latency (+/-{args.jitter:.0%}), "
+        f"max concurrency {args.max_concurrency}"
+    )
+    print_header()
+
+    model_kwargs = {"url": server.url, "api_key": "fake", "model": "fake"}
+    run_backend("threads", APIModel(**model_kwargs), server, data, args)
+    if AIOHTTP_AVAILABLE:
+        model = AsyncAPIModel(max_concurrency=args.max_concurrency, **model_kwargs)
+        run_backend("async (aiohttp)", model, server, data, args)
+    else:
+        print("async (aiohttp)    skipped: pip install aiohttp")
+    if ASYNC_OPENAI_AVAILABLE:
+        model = AsyncOpenAIModel(
+            max_concurrency=args.max_concurrency,
+            **dict(model_kwargs, url=server.url.rsplit("/chat/completions", 1)[0]),
+        )
+        run_backend("async (openai)", model, server, data, args)
+    else:
+        print("async (openai)     skipped: pip install -U openai")
+    server.stop()
+
+
+def compare_rate_control(args, server, description):
+    """Fixed vs adaptive limits against a server that pushes back."""
+    data = make_requests(args.num_requests)
+    print(f"{args.num_requests} requests, {args.latency}s latency, {description}")
+    print_header()
+
+    model_kwargs = {"url": server.url, "api_key": "fake", "model": "fake", "retry_delay": 0.5}
+    backends = [("threads", APIModel, {})]
+    if AIOHTTP_AVAILABLE:
+        backends.append(("async", AsyncAPIModel, {"max_concurrency": args.max_concurrency}))
+    for name, model_class, kwargs in backends:
+        run_backend(f"{name} fixed", model_class(**model_kwargs, **kwargs), server, data, args)
+        model = model_class(**model_kwargs, **kwargs)
+        model.rate_controller = AIMDController(
+            initial_concurrency=min(10, args.max_concurrency),
+            initial_rate=10,
+            max_concurrency=args.max_concurrency,
+            log_interval=float("inf"),
+        )
+        run_backend(f"{name} adaptive", model, server, data, args)
+        print_history(model.rate_controller)
+    server.stop()
+
+
+def compare_token_limits(args):
+    """Request-rate limit alone vs request and token limits against a token quota."""
+    server = TokenLimitedServer(
+        max_tpm=args.server_tpm, latency=args.latency, jitter=args.jitter
+    ).start()
+    data = make_requests(args.num_requests, varied=True)
+    total = sum(estimate_tokens(messages) for messages in data)
+    print(
+        f"{args.num_requests} requests of varying size (~{total} tokens), {args.latency}s latency, "
+        f"429 above {args.server_tpm} tokens/min"
+    )
+    print_header()
+
+    model_kwargs = {"url": server.url, "api_key": "fake", "model": "fake", "retry_delay": 0.5}
+    backends = [("threads", APIModel, {})]
+    if AIOHTTP_AVAILABLE:
+        backends.append(("async", AsyncAPIModel, {"max_concurrency": args.max_concurrency}))
+    for name, model_class, kwargs in backends:
+        model = model_class(**model_kwargs, **kwargs)
+        model.rate_controller = RequestLimiter(requests_per_second=args.server_rps)
+        run_backend(f"{name} rps", model, server, data, args)
+        model = model_class(**model_kwargs, **kwargs)
+        model.rate_controller = RequestLimiter(
+            requests_per_second=args.server_rps, tokens_per_minute=args.server_tpm
+        )
+        run_backend(f"{name} rps+tpm", model, server, data, args)
+    server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API backend and rate control benchmark")
+    parser.add_argument(
+        "--scenario",
+        choices=["latency", "rate_limited", "saturated", "token_limited"],
+        default="latency",
+        help="latency: threaded vs asyncio backends; rate_limited: fixed vs adaptive limits "
+        "against a server returning 429 above --server-rps; saturated: against a server "
+        "whose latency grows beyond --server-capacity requests in flight; token_limited: "
+        "request-rate vs token limits against a server returning 429 above --server-tpm",
+    )
+    parser.add_argument("--num-requests", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.5, help="Server latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Relative latency jitter")
+    parser.add_argument(
+        "--batch-size", type=int, default=10000, help="QPS limit passed to batch_generate"
+    )
+    parser.add_argument("--max-concurrency", type=int, default=256)
+    parser.add_argument("--server-rps", type=float, default=50.0)
+    parser.add_argument("--server-capacity", type=int, default=32)
+    parser.add_argument("--server-tpm", type=int, default=300000)
+    args = parser.parse_args()
+
+    if args.scenario == "latency":
+        compare_backends(args)
+    elif args.scenario == "token_limited":
+        compare_token_limits(args)
+    elif args.scenario == "rate_limited":
+        server = RateLimitedServer(max_rps=args.server_rps, latency=args.latency, jitter=args.jitter)
+        compare_rate_control(args, server.start(), f"429 above {args.server_rps:.0f} req/s")
+    else:
+        server = FakeOpenAIServer(args.latency, args.jitter, capacity=args.server_capacity)
+        compare_rate_control(
+            args, server.start(), f"latency grows beyond {args.server_capacity} in flight"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Data Pipeline Benchmark
+
+This script measures dataset loading time for the plain JSONL parser and the
+columnar snapshot cache (cold build vs warm load), the cost of per-sample
+field access used during prompt generation, golden doc placeholder
+substitution on large synthetic docs, the memory held by rendered versus
+deferred prompts, and the size and load time of full versus compact result
+files.
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import random
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict
+
+from core.data import DataPreprocess, RagData
+from core.eval_types import EvalResult, EvalResults
+from core.result_format import compact_header
+from core.snapshot import DOC_FIELDS, load_with_snapshot
+from core.templates import GoldenDocTemplate
+
+NOISE_FIELDS = ("noise_doc_level1", "noise_doc_level2", "noise_doc_level3")
+
+
+def timeit(func, *args, repeat=1, **kwargs):
+    """Return the result of the last call and the best wall time over `repeat` calls."""
+    best = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start_time)
+    return result, best
+
+
+def benchmark_loading(data_path, repeat):
+    """Compare JSONL parsing with cold and warm snapshot loads."""
+    snapshot_dir = f"{data_path}.snapshot"
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+    _, cold_time = timeit(load_with_snapshot, data_path)
+    # Time each loader without the other's result alive, since the number of
+    # live objects affects garbage collection cost.
+    _, warm_time = timeit(load_with_snapshot, data_path, repeat=repeat)
+    data_list, jsonl_time = timeit(RagData.from_jsonl, data_path, repeat=repeat)
+    assert load_with_snapshot(data_path) == data_list, "snapshot content differs from JSONL"
+
+    print(f"\nLoading {len(data_list)} samples from {data_path}")
+    print(f"- JSONL parse:          {jsonl_time:.3f}s")
+    print(f"- Snapshot cold build:  {cold_time:.3f}s")
+    print(f"- Snapshot warm load:   {warm_time:.3f}s ({jsonl_time / warm_time:.1f}x faster than JSONL)")
+
+
+def benchmark_field_access(data_path, repeat):
+    """Compare the former asdict-based field lookup with direct slot access."""
+    data_list = RagData.from_jsonl(data_path)
+
+    def asdict_lookup():
+        for sample in data_list:
+            for k in NOISE_FIELDS:
+                asdict(sample).get(k)
+
+    def slot_lookup():
+        for sample in data_list:
+            for k in NOISE_FIELDS:
+                sample(k)
+
+    _, asdict_time = timeit(asdict_lookup, repeat=repeat)
+    _, slot_time = timeit(slot_lookup, repeat=repeat)
+    lookups = len(data_list) * len(NOISE_FIELDS)
+
+    docs = [doc for sample in data_list for k in DOC_FIELDS for doc in sample(k)]
+    distinct_objects = len({id(doc) for doc in docs})
+
+    print(f"\nField access over {lookups} noise-level lookups")
+    print(f"- asdict lookup:        {asdict_time * 1e6 / lookups:.2f}us per lookup")
+    print(f"- slot lookup:          {slot_time * 1e6 / lookups:.2f}us per lookup ({asdict_time / slot_time:.0f}x faster)")
+    print(f"- doc strings:          {len(docs)} references, {distinct_objects} objects after interning")
+
+
+def benchmark_deferred_prompts(data_path, prompt_config_path, num_iterations=3):
+    """Compare the memory held by rendered prompts and by deferred descriptors."""
+    noise_config = {"noise_doc_level1": 4, "noise_doc_level2": 4, "noise_doc_level3": 1}
+    peaks = {}
+    for deferred in (False, True):
+        ragdata = DataPreprocess(data_path, prompt_config_path)
+        tracemalloc.start()
+        outputs = ragdata.generate_input(
+            num_iterations, noise_config, shuffle=True, deferred=deferred
+        )
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peaks[deferred] = (current, peak)
+        if deferred:
+            store = ragdata.doc_store
+            rendered_chars = sum(
+                len(doc) for p in outputs[2] for doc in map(store.__getitem__, p.doc_ids)
+            )
+        del outputs
+
+    print(f"\nPrompts for {data_path}, {num_iterations} iterations per sample")
+    print(f"- rendered prompts:     {peaks[False][0] / 2**20:.1f}MB retained, {peaks[False][1] / 2**20:.1f}MB peak")
+    print(f"- deferred prompts:     {peaks[True][0] / 2**20:.1f}MB retained, {peaks[True][1] / 2**20:.1f}MB peak")
+    print(f"- doc store:            {len(store)} docs, {store.total_chars()} chars for {rendered_chars} chars referenced ({rendered_chars / store.total_chars():.1f}x dedup)")
+
+
+def benchmark_result_formats(data_path, prompt_config_path, num_iterations=3):
+    """Compare the size and load time of full and compact result files."""
+    noise_config = {"noise_doc_level1": 4, "noise_doc_level2": 4, "noise_doc_level3": 1}
+    ragdata = DataPreprocess(data_path, prompt_config_path)
+    ids, queries, prompts, answers = ragdata.generate_input(
+        num_iterations, noise_config, shuffle=True, deferred=True
+    )
+    eval_results = EvalResults()
+    for idx, query, prompt, answer in zip(ids, queries, prompts, answers):
+        eval_results.add_result(
+            EvalResult(id=idx, query=query, prompt=prompt, answer=answer, prediction=answer, label=1)
+        )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        full_path = os.path.join(tmp_dir, "full.jsonl")
+        compact_path = os.path.join(tmp_dir, "compact.jsonl")
+        eval_results.save_to_jsonl(full_path, prompt_renderer=ragdata.render)
+        eval_results.save_to_jsonl(
+            compact_path,
+            prompt_renderer=ragdata.compact_descriptor,
+            header=compact_header(ragdata),
+        )
+        full, full_time = timeit(EvalResults.load_from_jsonl, full_path)
+        compact, compact_time = timeit(EvalResults.load_from_jsonl, compact_path)
+        _, render_time = timeit(lambda: [r.prompt.render() for r in compact.results])
+        assert all(
+            a.prompt == b.prompt for a, b in zip(full.results, compact.results)
+        ), "compact prompts render differently"
+        full_size = os.path.getsize(full_path)
+        compact_size = os.path.getsize(compact_path)
+
+    print(f"\nResult files for {data_path}, {len(ids)} results")
+    print(f"- full:                 {full_size / 2**20:.1f}MB, loaded in {full_time:.3f}s")
+    print(f"- compact:              {compact_size / 2**20:.1f}MB, loaded in {compact_time:.3f}s ({full_size / compact_size:.1f}x smaller, {full_time / compact_time:.1f}x faster)")
+    print(f"- rendering all compact prompts on access: {render_time:.3f}s")
+
+
+def replace_golden_docs(golden_docs, placeholder):
+    """Former substitution: one str.replace per placeholder key and doc."""
+    golden_docs_ready = []
+    for gold_doc in golden_docs:
+        for k, v in placeholder.items():
+            gold_doc = gold_doc.replace(k, v)
+        golden_docs_ready.append(gold_doc)
+    return golden_docs_ready
+
+
+def benchmark_substitution(num_keys, doc_chars, num_docs, num_variants, repeat):
+    """Compare str.replace chains with a compiled template on large golden docs."""
+    rng = random.Random(0)
+    keys = [f"[PLACEHOLDER_{i}]" for i in range(num_keys)]
+    words = ["lorem", "ipsum", "dolor", "sit", "amet"] + keys
+    golden_docs = []
+    for _ in range(num_docs):
+        doc, size = [], 0
+        while size < doc_chars:
+            word = rng.choice(words)
+            doc.append(word)
+            size += len(word) + 1
+        golden_docs.append(" ".join(doc))
+    placeholders = [
+        {k: f"value_{j}_{i}" for i, k in enumerate(keys)} for j in range(num_variants)
+    ]
+
+    def replace_all():
+        return [replace_golden_docs(golden_docs, p) for p in placeholders]
+
+    def template_all():
+        template = GoldenDocTemplate(golden_docs, placeholders)
+        return [template.render(p) for p in placeholders]
+
+    expected, replace_time = timeit(replace_all, repeat=repeat)
+    rendered, template_time = timeit(template_all, repeat=repeat)
+    assert rendered == expected, "template output differs from str.replace"
+
+    print(f"\nSubstitution of {num_keys} keys in {num_docs} docs of {doc_chars} chars, {num_variants} variants")
+    print(f"- str.replace chain:    {replace_time * 1e3:.1f}ms")
+    print(f"- compiled template:    {template_time * 1e3:.1f}ms ({replace_time / template_time:.1f}x speedup, compile included)")
+
+
+def main():
+    """Main function for argument parsing and execution."""
+    parser = argparse.ArgumentParser(description="PRGB Data Pipeline Benchmark")
+    parser.add_argument(
+        "--data-path",
+        type=str,
+        default="data/zh.jsonl",
+        help="Path to the evaluation dataset"
+    )
+    parser.add_argument(
+        "--prompt-config",
+        type=str,
+        default="config/api_prompt_config_ch.json",
+        help="Prompt config used for the deferred prompt benchmark"
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of timed runs, the best one is reported"
+    )
+    args = parser.parse_args()
+
+    benchmark_loading(args.data_path, args.repeat)
+    benchmark_field_access(args.data_path, args.repeat)
+    benchmark_deferred_prompts(args.data_path, args.prompt_config)
+    benchmark_result_formats(args.data_path, args.prompt_config)
+    benchmark_substitution(
+        num_keys=50, doc_chars=200000, num_docs=4, num_variants=5, repeat=args.repeat
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+EvalResults Scoring Benchmark
+
+This script compares `EvalResults.calculate_scores`, which aggregates
+columnar id codes and labels with NumPy, against the former pandas path,
+which built a DataFrame holding every field of every result. It checks that
+both give bit-identical scores and reports time and peak traced memory.
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import random
+import time
+import tracemalloc
+
+import pandas as pd
+
+from core.eval_types import RAG_CLASS_ALL, EvalResult, EvalResults
+
+RAG_CLASSES = [
+    "filter", "combination_v1", "combination_v2", "combination_v3",
+    "multihop", "counterfactual", "deductive",
+]
+
+
+def pandas_calculate_scores(results):
+    """Former `calculate_scores`: a DataFrame of every result field, grouped by pandas."""
+    df = pd.DataFrame(
+        [
+            {
+                "id": r.id, "query": r.query, "prompt": r.prompt, "answer": r.answer,
+                "prediction": r.prediction, "label": r.label, "rag_class": r.rag_class,
+            }
+            for r in results
+        ]
+    )
+    id_scores = df.groupby("id")["label"].mean()
+    id_scores_df = pd.DataFrame(
+        {"score": id_scores, "rag_class": df.groupby("id")["rag_class"].first()}
+    )
+    id_scores_df["rag_class_all"] = id_scores_df["rag_class"].apply(
+        lambda x: RAG_CLASS_ALL.get(x, "infer")
+    )
+    by_class = id_scores_df.groupby("rag_class")["score"].mean().to_dict()
+    by_class_all = id_scores_df.groupby("rag_class_all")["score"].mean().to_dict()
+    return id_scores.mean(), by_class, by_class_all
+
+
+def make_results(num_samples, placeholders, prompt_chars, seed=0):
+    """Synthetic results with a distinct prompt and prediction string per result."""
+    rng = random.Random(seed)
+    eval_results = EvalResults()
+    for sample in range(num_samples):
+        result_id = f"{rng.choice(RAG_CLASSES)}-{sample}"
+        for _ in range(rng.randint(1, placeholders)):
+            eval_results.add_result(
+                EvalResult(
+                    id=result_id,
+                    query=f"question {sample}",
+                    prompt="".join(rng.choices("abcdefgh ", k=prompt_chars)),
+                    answer=f"answer {sample}",
+                    prediction=f"prediction {rng.random()}",
+                    label=rng.randint(0, 1),
+                )
+            )
+    return eval_results
+
+
+def measure(fn):
+    """Run `fn` twice: timed, then traced, as tracing slows Python code down.
+
+    Returns:
+        (result, elapsed seconds, peak traced MiB)
+    """
+    start_time = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start_time
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+def main():
+    """Main function for argument parsing and execution."""
+    parser = argparse.ArgumentParser(description="PRGB EvalResults Scoring Benchmark")
+    parser.add_argument("--num-samples", type=int, default=100000, help="Number of sample ids")
+    parser.add_argument("--placeholders", type=int, default=3, help="Maximum results per sample id")
+    parser.add_argument("--prompt-chars", type=int, default=200, help="Characters in each synthetic prompt")
+    args = parser.parse_args()
+
+    eval_results = make_results(args.num_samples, args.placeholders, args.prompt_chars)
+    print(f"Scoring {len(eval_results.results)} results of {args.num_samples} sample ids")
+
+    expected, pandas_time, pandas_peak = measure(
+        lambda: pandas_calculate_scores(eval_results.results)
+    )
+
+    def columnar():
+        eval_results.calculate_scores(True)
+        return (
+            eval_results.acc_scores,
+            eval_results.acc_scores_by_rag_class,
+            eval_results.acc_scores_by_rag_class_all,
+        )
+
+    scores, columnar_time, columnar_peak = measure(columnar)
+    assert scores == expected, "columnar scores differ from the pandas path"
+
+    print(f"- pandas DataFrame:  {pandas_time:.3f}s, peak {pandas_peak:.1f} MiB")
+    print(
+        f"- columnar NumPy:    {columnar_time:.3f}s, peak {columnar_peak:.1f} MiB "
+        f"({pandas_time / columnar_time:.1f}x faster, {pandas_peak / max(columnar_peak, 1e-9):.1f}x less memory)"
+    )
+
+
+if __name__ == "__main__":
+    main()
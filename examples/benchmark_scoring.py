@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Scoring Benchmark
+
+This script measures `checkanswer_acc` on a large synthetic result set and
+compares it with the former evaluator, which re-tokenized every answer
+expression and rebuilt its postfix form for every prediction. It then compares
+the substring and Aho-Corasick automaton engines on long ``<think>`` outputs
+as the number of terms per answer grows.
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import random
+import time
+
+from core.answer_match import AHOCORASICK_AVAILABLE
+from core.eval import checkanswer_acc
+
+FILLER_WORDS = [
+    "the", "so", "therefore", "we", "need", "to", "check", "document", "which",
+    "says", "answer", "because", "first", "then", "wait", "maybe", "所以", "文档",
+]
+
+
+def legacy_evaluate_expression(expr, prediction):
+    """Former evaluator: parse the expression on every call, no short-circuit."""
+    if not any(op in expr for op in ["&", "|", "(", ")"]):
+        return expr.strip() in prediction
+
+    tokens = []
+    current = ""
+    for char in expr:
+        if char in ["&", "|", "(", ")"]:
+            if current:
+                tokens.append(current.strip())
+                current = ""
+            tokens.append(char)
+        else:
+            current += char
+    if current:
+        tokens.append(current.strip())
+
+    def precedence(op):
+        if op == "&":
+            return 2
+        if op == "|":
+            return 1
+        return 0
+
+    output = []
+    operators = []
+    for token in tokens:
+        if token in ["&", "|"]:
+            while (
+                operators
+                and operators[-1] != "("
+                and precedence(operators[-1]) >= precedence(token)
+            ):
+                output.append(operators.pop())
+            operators.append(token)
+        elif token == "(":
+            operators.append(token)
+        elif token == ")":
+            while operators and operators[-1] != "(":
+                output.append(operators.pop())
+            if operators and operators[-1] == "(":
+                operators.pop()
+        else:
+            output.append(token)
+    while operators:
+        output.append(operators.pop())
+
+    stack = []
+    for token in output:
+        if token in ["&", "|"]:
+            b = stack.pop()
+            a = stack.pop()
+            stack.append(a and b if token == "&" else a or b)
+        else:
+            stack.append(token in prediction)
+    return stack[0] if stack else False
+
+
+def legacy_checkanswer_acc(predictions, answers):
+    labels = []
+    for predict, answer in zip(predictions, answers):
+        labels.append(int(legacy_evaluate_expression(answer.lower(), predict.lower())))
+    return labels
+
+
+def make_result_set(num_rows, num_answers, seed=0):
+    """Synthetic predictions and answer expressions with realistic shapes."""
+    rng = random.Random(seed)
+    words = [f"Term{i}" for i in range(2000)] + ["北京", "上海", "阿司匹林", "1998年"]
+
+    def expression():
+        shape = rng.random()
+        a, b, c, d = rng.sample(words, 4)
+        if shape < 0.4:
+            return a
+        if shape < 0.7:
+            return f"{a}&{b}"
+        if shape < 0.9:
+            return f"({a}|{b})&({c}|{d})"
+        return f"{a}&{b}&{c}|{d}"
+
+    answer_pool = [expression() for _ in range(num_answers)]
+    answers = [rng.choice(answer_pool) for _ in range(num_rows)]
+    predictions = [
+        " ".join(rng.choice(words) for _ in range(rng.randint(5, 60)))
+        for _ in range(num_rows)
+    ]
+    return predictions, answers
+
+
+def benchmark_engines(num_rows, think_words, terms_per_answer, seed=0):
+    """Compare scoring engines on long reasoning outputs."""
+    rng = random.Random(seed)
+    entities = [f"Entity{i}" for i in range(5000)]
+    predictions = [
+        "<think>"
+        + " ".join(rng.choice(FILLER_WORDS) for _ in range(think_words))
+        + "</think>"
+        + rng.choice(entities)
+        for _ in range(num_rows)
+    ]
+    backend = "pyahocorasick" if AHOCORASICK_AVAILABLE else "regex fallback"
+    avg_chars = sum(map(len, predictions)) / num_rows
+    print(f"\nEngines on {num_rows} predictions of {avg_chars:.0f} chars, automaton backend: {backend}")
+    print(f"{'terms/answer':<14}{'substring (s)':>15}{'automaton (s)':>15}")
+    for num_terms in terms_per_answer:
+        answers = ["|".join(rng.sample(entities, num_terms)) for _ in range(num_rows)]
+        timings = []
+        for engine in ("substring", "automaton"):
+            start_time = time.perf_counter()
+            _, labels = checkanswer_acc(predictions, answers, engine=engine)
+            timings.append(time.perf_counter() - start_time)
+            if engine == "substring":
+                expected = labels
+        assert labels == expected, "automaton engine disagrees with substring engine"
+        print(f"{num_terms:<14}{timings[0]:>15.3f}{timings[1]:>15.3f}")
+
+
+def main():
+    """Main function for argument parsing and execution."""
+    parser = argparse.ArgumentParser(description="PRGB Scoring Benchmark")
+    parser.add_argument("--num-rows", type=int, default=1000000, help="Number of scored rows")
+    parser.add_argument("--num-answers", type=int, default=20000, help="Number of distinct answer expressions")
+    parser.add_argument("--num-long-rows", type=int, default=2000, help="Number of long reasoning outputs for the engine comparison")
+    parser.add_argument("--think-words", type=int, default=2000, help="Words in each <think> block")
+    args = parser.parse_args()
+
+    predictions, answers = make_result_set(args.num_rows, args.num_answers)
+    print(f"Scoring {len(predictions)} rows with {len(set(answers))} distinct answers")
+
+    start_time = time.perf_counter()
+    expected = legacy_checkanswer_acc(predictions, answers)
+    legacy_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    _, labels = checkanswer_acc(predictions, answers)
+    compiled_time = time.perf_counter() - start_time
+    assert labels == expected, "compiled matcher disagrees with the former evaluator"
+
+    print(f"- former evaluator:     {legacy_time:.2f}s")
+    print(f"- checkanswer_acc:      {compiled_time:.2f}s ({legacy_time / compiled_time:.1f}x speedup)")
+
+    benchmark_engines(args.num_long_rows, args.think_words, terms_per_answer=(2, 8, 32, 64))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from core import answer_match
+from core.answer_match import AutomatonScorer, TermAutomaton, match_answer
+from core.eval import checkanswer_acc
+
+ALPHABET = "abAB北京 "
+
+MALFORMED = [
+    "  ",
+    "a|  ",
+    "(ab",
+    "ab)",
+    "a)|(b",
+    "(a|b",
+    "a b|北京",
+    "()",
+]
+
+
+def random_term(rng):
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(1, 3)))
+
+
+def random_expression(rng, depth=0):
+    if depth >= 2 or rng.random() < 0.4:
+        return random_term(rng)
+    left = random_expression(rng, depth + 1)
+    right = random_expression(rng, depth + 1)
+    expr = f"{left}{rng.choice('&|')}{right}"
+    return f"({expr})" if rng.random() < 0.5 else expr
+
+
+def random_cases(seed, num_cases=2000):
+    rng = random.Random(seed)
+    answers = [random_expression(rng) for _ in range(num_cases)] + MALFORMED
+    predictions = [
+        "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 12)))
+        for _ in answers
+    ]
+    return predictions, answers
+
+
+@pytest.fixture(params=["ahocorasick", "regex"])
+def term_backend(request, monkeypatch):
+    if request.param == "ahocorasick":
+        if not answer_match.AHOCORASICK_AVAILABLE:
+            pytest.skip("pyahocorasick is not installed")
+    else:
+        monkeypatch.setattr(answer_match, "AHOCORASICK_AVAILABLE", False)
+    return request.param
+
+
+@pytest.mark.parametrize("normalize", ["lower", "none", "nfkc_lower"])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_automaton_labels_match_substring_engine(term_backend, normalize, seed):
+    predictions, answers = random_cases(seed)
+    _, substring_labels = checkanswer_acc(
+        predictions, answers, normalize=normalize, engine="substring"
+    )
+    automaton_labels = AutomatonScorer(answers, normalize=normalize).labels(
+        predictions, answers
+    )
+    assert automaton_labels == substring_labels
+    assert 0 < sum(substring_labels) < len(substring_labels)
+
+
+def test_checkanswer_acc_engines_agree(term_backend):
+    predictions, answers = random_cases(3)
+    assert checkanswer_acc(predictions, answers, engine="automaton") == checkanswer_acc(
+        predictions, answers, engine="substring"
+    )
+
+
+def test_term_automaton_finds_overlapping_and_prefix_terms(term_backend):
+    terms = ["a", "ab", "aba", "b", "北京", "京"]
+    automaton = TermAutomaton(terms)
+    for text in ["", "abab", "xaba", "北京a", "bb", "京北"]:
+        expected = {automaton.term_ids[term] for term in terms if term in text}
+        assert automaton.find(text) == expected
+
+
+def test_missing_operand_raises_in_both_engines(term_backend):
+    answer = "a&"
+    with pytest.raises(IndexError):
+        match_answer(answer, "a")
+    with pytest.raises(IndexError):
+        AutomatonScorer([answer]).match(answer, "a")
@@ -0,0 +1,116 @@
+import itertools
+import types
+
+import pytest
+
+from core import cache as cache_module
+from core.cache import EVICTION_TARGET, ResponseCache, cache_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Distinct, increasing timestamps so the LRU order is deterministic
+    ticks = itertools.count(1)
+    monkeypatch.setattr(
+        cache_module, "time", types.SimpleNamespace(time=lambda: float(next(ticks)))
+    )
+
+
+@pytest.fixture
+def make_cache(tmp_path, clock):
+    caches = []
+
+    def make(**kwargs):
+        cache = ResponseCache(str(tmp_path / "responses.sqlite"), **kwargs)
+        caches.append(cache)
+        return cache
+
+    yield make
+    for cache in caches:
+        cache.close()
+
+
+def entry_size(key, response):
+    return len(key) + len(response.encode("utf-8"))
+
+
+def test_cache_key_covers_every_field():
+    base = cache_key("m", [{"role": "user", "content": "q"}], 0, 0.8, "api")
+    assert base == cache_key("m", [{"content": "q", "role": "user"}], 0.0, 0.8, "api")
+    assert base != cache_key("m2", [{"role": "user", "content": "q"}], 0, 0.8, "api")
+    assert base != cache_key("m", [{"role": "user", "content": "q2"}], 0, 0.8, "api")
+    assert base != cache_key("m", [{"role": "user", "content": "q"}], 0.5, 0.8, "api")
+    assert base != cache_key("m", [{"role": "user", "content": "q"}], 0, 0.9, "api")
+    assert base != cache_key("m", [{"role": "user", "content": "q"}], 0, 0.8, "vllm")
+
+
+def test_hits_and_misses_are_counted(make_cache):
+    cache = make_cache()
+    cache.put_many([("a", "答案一"), ("b", "answer two")])
+    assert cache.get_many(["a", "x", "b", "y", "a"]) == [
+        "答案一",
+        None,
+        "answer two",
+        None,
+        "答案一",
+    ]
+    assert cache.get("z") is None
+    stats = cache.stats()
+    assert stats["hits"] == 3
+    assert stats["misses"] == 3
+    assert stats["stores"] == 2
+    assert stats["entries"] == 2
+    assert stats["bytes"] == entry_size("a", "答案一") + entry_size("b", "answer two")
+
+
+def test_replaced_entries_are_not_counted_twice(make_cache):
+    cache = make_cache()
+    cache.put("a", "short")
+    cache.put("a", "a much longer response")
+    cache.put_many([("b", "first"), ("b", "second")])
+    assert cache.get_many(["a", "b"]) == ["a much longer response", "second"]
+    assert cache.total_bytes == cache._stored_bytes()
+    assert cache.total_bytes == entry_size("a", "a much longer response") + entry_size(
+        "b", "second"
+    )
+
+
+def test_least_recently_used_entries_are_evicted(make_cache):
+    response = "x" * 99
+    cache = make_cache(max_bytes=1000)
+    cache.put_many([(f"{i}", response) for i in range(9)])
+    assert cache.stats()["evicted"] == 0
+    # Using the oldest entry makes "1" the least recently used
+    assert cache.get("0") == response
+
+    cache.put_many([("9", response), ("10", response)])
+    stats = cache.stats()
+    assert stats["bytes"] <= 1000 * EVICTION_TARGET
+    assert stats["bytes"] == cache._stored_bytes()
+    assert stats["evicted"] == 11 - stats["entries"]
+    assert cache.get("1") is None
+    assert cache.get("0") == response
+    assert cache.get("10") == response
+
+
+def test_replacing_entries_does_not_trigger_eviction(make_cache):
+    cache = make_cache(max_bytes=1000)
+    entries = [(f"{i}", "x" * 99) for i in range(9)]
+    for _ in range(3):
+        cache.put_many(entries)
+    assert cache.stats()["evicted"] == 0
+    assert cache.stats()["entries"] == 9
+
+
+def test_entries_persist_across_instances(make_cache):
+    cache = make_cache()
+    cache.put("a", "response")
+    reopened = make_cache()
+    assert reopened.get("a") == "response"
+    assert reopened.total_bytes == entry_size("a", "response")
+
+
+def test_only_deterministic_calls_are_cacheable_by_default(make_cache):
+    assert make_cache().cacheable(0)
+    assert not make_cache().cacheable(0.7)
+    assert make_cache(all_temperatures=True).cacheable(0.7)
@@ -0,0 +1,90 @@
+import json
+import random
+
+import pytest
+
+from core import eval as core_eval
+from core.eval import checkanswer_acc
+from core.eval_types import EvalResult, EvalResults
+from core.rescore import rescore_file
+
+TERMS = ["北京", "上海", "beijing", "Shanghai", "42", "answer"]
+
+
+def random_rows(num_rows, seed=0):
+    rng = random.Random(seed)
+    answers = []
+    predictions = []
+    for _ in range(num_rows):
+        left, right = rng.sample(TERMS, 2)
+        answers.append(rng.choice([left, f"{left}|{right}", f"({left}&{right})"]))
+        words = rng.sample(TERMS, rng.randint(0, 3))
+        if rng.random() < 0.3:
+            words.insert(0, "<think>" + rng.choice(TERMS) + "</think>")
+        predictions.append(" ".join(words))
+    return predictions, answers
+
+
+@pytest.fixture
+def parallel_threshold(monkeypatch):
+    monkeypatch.setattr(core_eval, "PARALLEL_SCORING_MIN_ROWS", 100)
+
+
+@pytest.mark.parametrize("engine", ["substring", "automaton"])
+@pytest.mark.parametrize("is_infer_model", [False, True])
+def test_parallel_scoring_matches_serial(parallel_threshold, engine, is_infer_model):
+    # Several chunks of 1000 rows, the last one partial
+    predictions, answers = random_rows(4500)
+    options = {"is_infer_model": is_infer_model, "engine": engine}
+    serial = checkanswer_acc(predictions, answers, **options)
+    parallel = checkanswer_acc(predictions, answers, num_workers=3, **options)
+    assert parallel == serial
+    assert 0 < len(serial[0]) < len(predictions)
+
+
+def test_small_inputs_are_scored_in_process(monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("a process pool was started")
+
+    monkeypatch.setattr(core_eval, "ProcessPoolExecutor", no_pool)
+    predictions, answers = random_rows(core_eval.PARALLEL_SCORING_MIN_ROWS - 1)
+    errors, labels = checkanswer_acc(predictions, answers, num_workers=4)
+    assert errors == [i for i, label in enumerate(labels) if not label]
+    assert len(labels) == len(predictions)
+
+
+def write_results(path, predictions, answers):
+    eval_results = EvalResults()
+    for i, (prediction, answer) in enumerate(zip(predictions, answers)):
+        eval_results.add_result(
+            EvalResult(
+                id=f"{i}_filter_golden",
+                query="",
+                prompt="",
+                answer=answer,
+                prediction=prediction,
+                label=0,
+            )
+        )
+    eval_results.save_to_jsonl(str(path))
+
+
+def read_labels(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["label"] for line in f if line.strip()]
+
+
+def test_rescore_file_scores_rows_in_parallel(parallel_threshold, tmp_path):
+    predictions, answers = random_rows(2500, seed=1)
+    serial_path = tmp_path / "serial" / "m_eval_result_0.jsonl"
+    parallel_path = tmp_path / "parallel" / "m_eval_result_0.jsonl"
+    for path in (serial_path, parallel_path):
+        path.parent.mkdir()
+        write_results(path, predictions, answers)
+
+    serial = rescore_file(str(serial_path), bootstrap_resamples=0)
+    parallel = rescore_file(str(parallel_path), bootstrap_resamples=0, score_workers=2)
+    assert read_labels(parallel_path) == read_labels(serial_path)
+    assert read_labels(serial_path) == checkanswer_acc(predictions, answers)[1]
+    assert parallel["acc_scores"] == serial["acc_scores"]
+    assert parallel["num_changed"] == serial["num_changed"] > 0
@@ -0,0 +1,263 @@
+import heapq
+import types
+
+import pytest
+
+from core.models import rate_control
+from core.models.rate_control import AIMDController, RequestLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(
+        rate_control, "time", types.SimpleNamespace(monotonic=fake, time=fake)
+    )
+    return fake
+
+
+def run_for(limiter, clock, seconds, estimated_tokens=0, used_tokens=None):
+    """Send requests as fast as the limiter allows, each finishing at once."""
+    end = clock.now + seconds
+    sent = 0
+    while clock.now < end:
+        ticket, wait = limiter.try_acquire(estimated_tokens)
+        if ticket is None:
+            # Rounding can leave a wait too small to move the clock
+            clock.advance(max(wait, 1e-6))
+            continue
+        limiter.release(ticket, latency=0.01, used_tokens=used_tokens)
+        sent += 1
+    return sent
+
+
+def test_rate_is_bounded_with_one_second_burst(clock):
+    limiter = RequestLimiter(requests_per_second=5)
+    sent = run_for(limiter, clock, 10)
+    # A full bucket of 5 requests, then 5 per second
+    assert 50 <= sent <= 55
+    assert limiter.bound == "rate"
+    assert limiter.summary()["success"] == sent
+
+
+def test_concurrency_is_bounded(clock):
+    limiter = RequestLimiter(max_concurrency=2)
+    first, _ = limiter.try_acquire()
+    second, _ = limiter.try_acquire()
+    third, wait = limiter.try_acquire()
+    assert first is not None and second is not None
+    assert third is None and wait > 0
+    assert limiter.bound == "concurrency"
+    limiter.release(first, latency=0.1)
+    ticket, _ = limiter.try_acquire()
+    assert ticket is not None
+
+
+def test_tokens_per_minute_is_bounded(clock):
+    limiter = RequestLimiter(tokens_per_minute=600)
+    sent = run_for(limiter, clock, 60, estimated_tokens=100)
+    # A full minute of budget (6 requests), then one request every 10 seconds
+    assert 11 <= sent <= 12
+    assert limiter.bound == "tokens"
+
+
+def test_token_wait_matches_missing_budget(clock):
+    limiter = RequestLimiter(tokens_per_minute=600)
+    first, _ = limiter.try_acquire(400)
+    ticket, wait = limiter.try_acquire(300)
+    assert first is not None
+    assert ticket is None
+    assert wait == pytest.approx(10.0)
+
+
+def test_throttled_request_refunds_its_estimate(clock):
+    limiter = RequestLimiter(tokens_per_minute=600)
+    first, _ = limiter.try_acquire(400)
+    assert limiter.try_acquire(300)[0] is None
+    limiter.release(first, throttled=True)
+    ticket, _ = limiter.try_acquire(300)
+    assert ticket is not None
+    summary = limiter.summary()
+    assert summary["throttled"] == 1
+    assert summary["estimated_tokens"] == 0
+    assert summary["used_tokens"] == 0
+
+
+def test_used_tokens_are_reconciled_with_the_estimate(clock):
+    limiter = RequestLimiter(tokens_per_minute=1000)
+    ticket, _ = limiter.try_acquire(100)
+    limiter.release(ticket, latency=0.1, used_tokens=300)
+    assert limiter.token_budget == pytest.approx(700)
+    ticket, _ = limiter.try_acquire(100)
+    limiter.release(ticket, latency=0.1)
+    assert limiter.token_budget == pytest.approx(600)
+    summary = limiter.summary()
+    assert summary["estimated_tokens"] == 200
+    assert summary["used_tokens"] == 400
+
+
+def test_underestimated_tokens_slow_down_requests(clock):
+    limiter = RequestLimiter(tokens_per_minute=600)
+    sent = run_for(limiter, clock, 60, estimated_tokens=50, used_tokens=100)
+    # The reported usage, not the estimate, bounds the rate: about 11 requests, not 22
+    assert 11 <= sent <= 13
+    assert limiter.summary()["used_tokens"] == 100 * sent
+
+
+def test_prompt_above_quota_waits_for_full_budget(clock):
+    limiter = RequestLimiter(tokens_per_minute=1000)
+    ticket, _ = limiter.try_acquire(2000)
+    assert ticket is not None
+    ticket, wait = limiter.try_acquire(2000)
+    assert ticket is None
+    # Budget is at -1000 and the request needs the full minute's 1000
+    assert wait == pytest.approx(120.0)
+
+
+def test_retry_after_pauses_all_requests(clock):
+    limiter = RequestLimiter(requests_per_second=100)
+    ticket, _ = limiter.try_acquire()
+    limiter.release(ticket, throttled=True, retry_after=2.0)
+    ticket, wait = limiter.try_acquire()
+    assert ticket is None
+    assert wait == pytest.approx(2.0)
+    clock.advance(wait)
+    assert limiter.try_acquire()[0] is not None
+
+
+class RateLimitedServer:
+    """Stand-in endpoint answering 429 above `rate` requests per second or
+    `concurrency` requests in flight, with an optional Retry-After."""
+
+    def __init__(self, clock, rate, concurrency, latency=0.2, retry_after=None):
+        self.clock = clock
+        self.rate = rate
+        self.concurrency = concurrency
+        self.latency = latency
+        self.retry_after = retry_after
+        self.accepted = []
+        self.in_flight = 0
+        self.rejected = []
+
+    def send(self):
+        """Return (accepted, seconds until the response)."""
+        now = self.clock.now
+        recent = [t for t in self.accepted[-int(self.rate) - 1 :] if t > now - 1.0]
+        if len(recent) >= self.rate or self.in_flight >= self.concurrency:
+            self.rejected.append(now)
+            return False, 0.01
+        self.accepted.append(now)
+        self.in_flight += 1
+        return True, self.latency
+
+
+def simulate(limiter, server, clock, seconds):
+    """Send requests through `limiter` to `server` for `seconds` of fake time.
+
+    Returns the times at which requests were sent.
+    """
+    end = clock.now + seconds
+    pending = []  # (finish time, ticket, accepted, latency)
+    sent = []
+    while clock.now < end:
+        ticket, wait = limiter.try_acquire()
+        if ticket is not None:
+            accepted, latency = server.send()
+            sent.append(clock.now)
+            heapq.heappush(pending, (clock.now + latency, ticket, accepted, latency))
+            continue
+        wake = clock.now + max(wait, 1e-6)
+        while pending and pending[0][0] <= wake:
+            finish, ticket, accepted, latency = heapq.heappop(pending)
+            clock.now = max(clock.now, finish)
+            if accepted:
+                server.in_flight -= 1
+                limiter.release(ticket, latency=latency)
+            else:
+                limiter.release(ticket, throttled=True, retry_after=server.retry_after)
+        clock.now = wake
+    return sent
+
+
+def decreases(history):
+    """(before, after) pairs of the limit changes that lowered the rate."""
+    return [
+        (before, after)
+        for before, after in zip(history, history[1:])
+        if after[2] < before[2]
+    ]
+
+
+def test_aimd_settles_near_the_server_rate_limit(clock):
+    server = RateLimitedServer(clock, rate=20, concurrency=1000)
+    controller = AIMDController(initial_concurrency=4, initial_rate=2, log_interval=1e9)
+    simulate(controller, server, clock, 60)
+    first_minute = len(server.accepted)
+    simulate(controller, server, clock, 60)
+    accepted = len(server.accepted) - first_minute
+
+    # AIMD saws between half the limit and the limit
+    assert 0.6 * 20 * 60 <= accepted <= 20 * 60
+    rates = [rate for time, _, rate in controller.history if time >= 60]
+    assert rates and 0.4 * 20 <= min(rates) and max(rates) <= 1.5 * 20
+    assert controller.summary()["throttled"] < 0.1 * len(server.accepted)
+    assert 10 <= controller.rate <= 30
+
+
+def test_aimd_settles_near_the_server_concurrency_limit(clock):
+    server = RateLimitedServer(clock, rate=1000, concurrency=16, latency=0.5)
+    controller = AIMDController(initial_concurrency=2, initial_rate=1000, log_interval=1e9)
+    simulate(controller, server, clock, 120)
+    concurrencies = [concurrency for time, concurrency, _ in controller.history if time >= 60]
+    assert concurrencies and 0.4 * 16 <= min(concurrencies) and max(concurrencies) <= 1.5 * 16
+    # Half the limit or more in flight, each request taking 0.5s
+    recent = [t for t in server.accepted if t >= clock.now - 60]
+    assert len(recent) >= 0.5 * 16 / 0.5 * 60
+
+
+def test_aimd_cuts_are_multiplicative(clock):
+    server = RateLimitedServer(clock, rate=20, concurrency=1000)
+    controller = AIMDController(initial_concurrency=4, initial_rate=2, log_interval=1e9)
+    simulate(controller, server, clock, 60)
+    cuts = decreases(controller.history)
+    assert len(cuts) == controller.num_decreases > 0
+    for (_, concurrency_before, rate_before), (_, concurrency_after, rate_after) in cuts:
+        assert rate_after == pytest.approx(max(rate_before * 0.5, controller.min_rate))
+        assert concurrency_after <= max(concurrency_before * 0.5, controller.min_concurrency)
+
+
+def test_aimd_cuts_once_per_burst_of_throttled_requests(clock):
+    controller = AIMDController(initial_concurrency=8, initial_rate=100, log_interval=1e9)
+    tickets = []
+    for _ in range(8):
+        tickets.append(controller.try_acquire()[0])
+        clock.advance(0.02)
+    assert None not in tickets
+    for ticket in tickets:
+        controller.release(ticket, throttled=True)
+    assert controller.num_decreases == 1
+    assert int(controller.concurrency) == 4
+    assert controller.rate == pytest.approx(50)
+
+
+def test_aimd_honours_retry_after(clock):
+    server = RateLimitedServer(clock, rate=20, concurrency=1000, retry_after=2.0)
+    controller = AIMDController(initial_concurrency=4, initial_rate=2, log_interval=1e9)
+    sent = simulate(controller, server, clock, 60)
+    assert server.rejected
+    for rejected in server.rejected:
+        # Responses to the 429 arrive 0.01s after it was sent, then nothing
+        # is sent until the Retry-After has passed
+        paused = [t for t in sent if rejected + 0.01 < t < rejected + 0.01 + 2.0]
+        assert not paused
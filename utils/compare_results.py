@@ -0,0 +1,66 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.stats import compare_result_files
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description="Test whether the score difference between two PRGB result files is significant"
+    )
+    parser.add_argument("result_a", type=str, help="Baseline result file (*_eval_result_*.jsonl)")
+    parser.add_argument("result_b", type=str, help="Result file compared with the baseline")
+    parser.add_argument(
+        "--num_resamples", type=int, default=10000, help="Paired bootstrap resamples"
+    )
+    parser.add_argument(
+        "--confidence", type=float, default=0.95, help="Confidence level of the intervals"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the resampling generator")
+    parser.add_argument(
+        "--output_path", type=str, default=None, help="Optional JSON file for the full comparison"
+    )
+    return parser.parse_args()
+
+
+def print_comparison(comparison):
+    confidence = comparison["confidence"]
+    low, high = comparison["interval"]
+    print(f"Shared sample ids: {comparison['num_ids']}")
+    print(
+        f"\033[1macc_scores\033[0m a={comparison['score_a']:.4f} b={comparison['score_b']:.4f} "
+        f"diff={comparison['diff']:+.4f} {confidence:.0%} CI [{low:+.4f}, {high:+.4f}] "
+        f"p={comparison['p_value']:.4f}"
+    )
+    for name, row in comparison["by_rag_class"].items():
+        low, high = row["interval"]
+        print(
+            f"\033[34m{name}:\033[0m a={row['score_a']:.4f} b={row['score_b']:.4f} "
+            f"diff={row['diff']:+.4f} {confidence:.0%} CI [{low:+.4f}, {high:+.4f}] p={row['p_value']:.4f}"
+        )
+    mcnemar = comparison["mcnemar"]
+    print(
+        f"McNemar ({'exact' if mcnemar['exact'] else 'chi-square'}): "
+        f"only a correct={mcnemar['only_a_correct']} only b correct={mcnemar['only_b_correct']} "
+        f"p={mcnemar['p_value']:.4f}"
+    )
+
+
+if __name__ == "__main__":
+    args = get_args()
+    comparison = compare_result_files(
+        args.result_a,
+        args.result_b,
+        num_resamples=args.num_resamples,
+        confidence=args.confidence,
+        seed=args.seed,
+    )
+    print_comparison(comparison)
+    if args.output_path:
+        with open(args.output_path, "w", encoding="utf-8") as f:
+            json.dump(comparison, f, ensure_ascii=False, indent=2)
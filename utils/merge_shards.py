@@ -0,0 +1,68 @@
+import argparse
+import os
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.eval import save_eval_results, score_eval_results
+from core.logger import get_logger
+from core.shards import merge_shard_results, shard_output_name
+
+logger = get_logger()
+
+RESULT_INFIX = "_eval_result_"
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description="Merge per-shard PRGB result files into the result and scores files of a single-node run"
+    )
+    parser.add_argument(
+        "--inputs",
+        type=str,
+        nargs="+",
+        required=True,
+        help="Result files written by each shard (*_eval_result_*.shardK-of-N.jsonl)",
+    )
+    parser.add_argument(
+        "--output_path",
+        type=str,
+        required=True,
+        help="Directory of the merged {model}_eval_result_{noise_config}.jsonl and {model}_eval_scores.jsonl",
+    )
+    parser.add_argument(
+        "--data_path",
+        type=str,
+        default=None,
+        help="Dataset the shards were run on, giving the result order; defaults to the dataset in a compact header",
+    )
+    parser.add_argument(
+        "--bootstrap-resamples",
+        type=int,
+        default=1000,
+        help="Bootstrap resamples for the score confidence intervals, as in eval.py (0 disables)",
+    )
+    return parser.parse_args()
+
+
+def merge_shards(inputs, output_path, data_path=None, bootstrap_resamples=1000):
+    names = {shard_output_name(path) for path in inputs}
+    if len(names) != 1 or RESULT_INFIX not in next(iter(names)):
+        raise ValueError(f"Inputs are not shards of one result file: {sorted(names)}")
+    # {model}_eval_result_{noise_config}.jsonl, as written by save_eval_results
+    model_name, noise_config = next(iter(names))[: -len(".jsonl")].split(RESULT_INFIX, 1)
+
+    eval_results, header = merge_shard_results(inputs, data_path)
+    score_eval_results(eval_results, bootstrap_resamples)
+    os.makedirs(output_path, exist_ok=True)
+    save_eval_results(eval_results, output_path, model_name, noise_config, header=header)
+    logger.info(
+        f"Successfully merged \033[32m{len(inputs)} shards\033[0m to \033[31m{output_path}\033[0m"
+    )
+
+
+if __name__ == "__main__":
+    args = get_args()
+    merge_shards(args.inputs, args.output_path, args.data_path, args.bootstrap_resamples)
@@ -0,0 +1,90 @@
+import argparse
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.answer_match import NORMALIZERS
+from core.rescore import find_result_files, rescore_files
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description="Rescore existing PRGB result files without running a model"
+    )
+    parser.add_argument(
+        "--inputs",
+        type=str,
+        nargs="+",
+        required=True,
+        help="Result files, or directories searched for *_eval_result_*.jsonl",
+    )
+    parser.add_argument(
+        "--output_dir",
+        type=str,
+        default=None,
+        help="Directory of the rescored files, defaults to rewriting the inputs in place",
+    )
+    parser.add_argument(
+        "--inference-mode",
+        type=bool,
+        default=False,
+        help="Strip <think>...</think> blocks before matching",
+    )
+    parser.add_argument(
+        "--answer-normalize",
+        type=str,
+        default="lower",
+        choices=list(NORMALIZERS),
+        help="Normalization applied to answers and predictions before matching",
+    )
+    parser.add_argument(
+        "--scoring-engine",
+        type=str,
+        default="substring",
+        choices=["substring", "automaton"],
+        help="Answer matching engine",
+    )
+    parser.add_argument(
+        "--bootstrap-resamples",
+        type=int,
+        default=1000,
+        help="Bootstrap resamples for the score confidence intervals, as in eval.py (0 disables)",
+    )
+    parser.add_argument(
+        "--score-workers",
+        type=int,
+        default=1,
+        help="Number of processes scoring the rows of each result file",
+    )
+    parser.add_argument(
+        "--num_workers",
+        type=int,
+        default=1,
+        help="Number of result files rescored in parallel",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_args()
+    input_paths = find_result_files(args.inputs)
+    if not input_paths:
+        sys.exit(f"No result files found in {args.inputs}")
+    summaries = rescore_files(
+        input_paths,
+        output_dir=args.output_dir,
+        num_workers=args.num_workers,
+        is_infer_model=args.inference_mode,
+        normalize=args.answer_normalize,
+        engine=args.scoring_engine,
+        bootstrap_resamples=args.bootstrap_resamples,
+        score_workers=args.score_workers,
+    )
+    for summary in summaries:
+        if summary["num_results"]:
+            print(
+                f"{summary['output_path']}: acc_scores {summary['acc_scores']:.4f}, "
+                f"{summary['num_changed']}/{summary['num_results']} labels changed"
+            )